@@ -1,4 +1,8 @@
 from backend.utils.anon_user import AnonymousUser
+from backend.utils.database import check_database, configure_database, setup_engine
+from backend.utils.metrics import init_metrics
+from backend.utils.query_stats import init_query_stats
+from backend.utils.replicas import RoutingSession
 import config
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
@@ -8,7 +12,7 @@ from password_strength import PasswordPolicy
 from logging.config import dictConfig as logging_config
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
 password_policy = PasswordPolicy.from_names(**config.PASSWORD_POLICY)
@@ -22,9 +26,18 @@ def create_app(config_object=config, overrides=None):
     if overrides:
         app.config.update(overrides)
 
+    configure_database(app)
     db.init_app(app=app)
     migrate.init_app(app=app, db=db)
     login_manager.init_app(app=app)
+    init_metrics(app)
+
+    with app.app_context():
+        for key, engine in db.engines.items():
+            setup_engine(engine, app.extensions['database_settings'].get(key))
+            if app.config.get('DB_CHECK_ON_STARTUP'):
+                check_database(engine)
+        init_query_stats(app, db.engines.values())
 
     from backend.users.models import User
     from backend.recipes.models import (
@@ -38,9 +51,11 @@ def create_app(config_object=config, overrides=None):
         recipe_tag_association,
     )
 
+    from backend.users.cache import load_cached_user
+
     @login_manager.user_loader
     def user_loader(user_id: str):
-        return User.query.get(int(user_id))
+        return load_cached_user(int(user_id))
     login_manager.anonymous_user = AnonymousUser
 
     from backend.users.routes import user_bp
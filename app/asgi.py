@@ -0,0 +1,17 @@
+"""The ASGI entry point of the app, e.g. `uvicorn asgi:app --workers 4` from the `app` directory.
+The recipe and user reads run in the event loop with an async engine, the other
+routes unchanged, in a pool of `ASGI_THREADS` threads per process."""
+from app_factory import create_app
+from backend.utils.asgi import AsyncViewsASGI
+import config
+
+
+def create_asgi_app(config_object=config, overrides=None) -> AsyncViewsASGI:
+    import backend.recipes.async_views
+    import backend.users.async_views
+
+    flask_app = create_app(config_object=config_object, overrides=overrides)
+    return AsyncViewsASGI(flask_app, threads=flask_app.config['ASGI_THREADS'])
+
+
+app = create_asgi_app()
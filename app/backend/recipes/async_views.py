@@ -0,0 +1,98 @@
+"""The async versions of the recipe reads, served by `AsyncViewsASGI` in the
+ASGI mode. They answer like the views of the same endpoints in `routes.py`."""
+from flask import Response, abort, request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from werkzeug.http import is_resource_modified
+from backend.utils.asgi import async_view
+from backend.utils.errors import create_error_response
+from backend.utils.misc import set_validators
+from backend.utils.pagination import (
+    async_keyset_paginate,
+    async_paginate,
+    batch_meta,
+    get_count_mode,
+    get_cursor_args,
+    get_ids_arg,
+    is_batch_request,
+    is_cursor_request,
+    pagination_meta,
+)
+from backend.utils.serialization import list_response, schema_response
+from backend.recipes.fieldsets import get_recipe_fieldset
+from backend.recipes.helpers import recipe_etag
+from backend.recipes.models import Recipe
+from backend.recipes.schemas import RecipeSchema
+
+
+def _visible(load=()):
+    return select(Recipe).where(Recipe.is_visible).options(*load)
+
+
+@async_view('recipes.get_recipe_list')
+async def get_recipe_list(session: AsyncSession):
+    try:
+        fieldset = get_recipe_fieldset(request.args)
+    except ValueError as error:
+        return create_error_response(str(error), status_code=400)
+
+    if is_batch_request():
+        try:
+            ids = get_ids_arg()
+        except ValueError as error:
+            return create_error_response(str(error), status_code=400)
+
+        recipes = {recipe.id: recipe for recipe in
+                   await session.scalars(_visible(fieldset.load()).where(Recipe.id.in_(ids)))}
+
+        return list_response(fieldset.schema(), [recipes[id] for id in ids if id in recipes],
+                             "recipe_list", batch_meta(ids, recipes))
+
+    if is_cursor_request():
+        cursor, limit = get_cursor_args()
+        key_columns = (Recipe.created_on, Recipe.id)
+        try:
+            page = await async_keyset_paginate(session, _visible(fieldset.load(*key_columns)),
+                                               columns=key_columns,
+                                               cursor=cursor,
+                                               limit=limit)
+        except ValueError:
+            abort(400)
+
+        return list_response(fieldset.schema(), page.items, "recipe_list", page.to_dict())
+
+    try:
+        page = int(request.args.get('page', 0))
+        per_page = int(request.args.get('per-page', 5))
+        count_mode = get_count_mode()
+    except ValueError:
+        abort(400)
+
+    pagination = await async_paginate(session, _visible(fieldset.load()),
+                                      count_key='recipes',
+                                      count_mode=count_mode,
+                                      page=page,
+                                      per_page=per_page,
+                                      max_per_page=25)
+
+    return list_response(fieldset.schema(), pagination.items, "recipe_list", pagination_meta(pagination))
+
+
+@async_view('recipes.get_recipe')
+async def get_recipe(session: AsyncSession, id: int):
+    if request.if_none_match or request.if_modified_since:
+        last_updated = await session.scalar(
+            select(Recipe.last_updated).where(Recipe.id == id, Recipe.is_visible))
+        if last_updated is None:
+            abort(404)
+
+        etag = recipe_etag(id, last_updated)
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_updated):
+            return set_validators(Response(status=304), etag, last_updated)
+
+    recipe = await session.scalar(_visible(Recipe.schema_load()).where(Recipe.id == id))
+    if not recipe:
+        abort(404)
+
+    response = schema_response(RecipeSchema, recipe)
+    return set_validators(response, recipe_etag(recipe.id, recipe.last_updated), recipe.last_updated)
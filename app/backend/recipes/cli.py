@@ -1,7 +1,13 @@
+import json
 import click
-from sqlalchemy import delete, func
-from backend.recipes.models import PeriodType
+from pydantic import ValidationError
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import SQLAlchemyError
+from backend.recipes.helpers import insert_recipes, invalidate_period_types
+from backend.recipes.models import PeriodType, RecipeTag
 from backend.recipes.routes import recipes_bp
+from backend.recipes.schemas import RecipeCreate
+from backend.users.models import User
 from backend.utils.misc import slugify
 from app_factory import db
 
@@ -22,6 +28,7 @@ def create_recipe_type(name: str):
     )
     db.session.add(recipe_type)
     db.session.commit()
+    invalidate_period_types()
 
     click.echo('The Recipe Type has been successfully created.')
     return True
@@ -29,11 +36,12 @@ def create_recipe_type(name: str):
 
 @recipes_bp.cli.command('deleterecipetype', help='Delete a Recipe Type.')
 @click.argument('id')
-def create_recipe_type(id: int):
+def delete_recipe_type(id: int):
     if id == "all":
         # Delete all
         db.session.execute(delete(PeriodType))
         db.session.commit()
+        invalidate_period_types()
         click.echo('All Recipe Types have been successfully deleted.')
         return True
     
@@ -44,6 +52,108 @@ def create_recipe_type(id: int):
 
     db.session.delete(recipe_type)
     db.session.commit()
+    invalidate_period_types()
 
     click.echo('The Recipe Type has been successfully deleted.')
-    return True
\ No newline at end of file
+    return True
+
+
+def _read_import_record(line: str, default_author_id: int | None, known_tags: set[int],
+                        known_period_types: set[int], known_users: set[int]) -> dict:
+    """Validates a JSON Lines record with `RecipeCreate` and against the IDs
+    existing in the database, and returns it as a row for `bulk_create_recipes`.
+    Raises `ValueError` describing what is wrong."""
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as error:
+        raise ValueError(f'Invalid JSON: {error.msg}.')
+    if not isinstance(record, dict):
+        raise ValueError('The record is not a JSON object.')
+
+    author_id = record.pop('author_id', default_author_id)
+    if author_id is None:
+        raise ValueError('No author_id is given, either in the record or with --author-id.')
+    # `bool` is a subclass of `int`, but `true` is no user ID
+    if not isinstance(author_id, int) or isinstance(author_id, bool):
+        raise ValueError(f'author_id must be an integer, got {author_id!r}.')
+    if author_id not in known_users:
+        raise ValueError(f'Unknown author: {author_id}.')
+
+    try:
+        schema = RecipeCreate(**record)
+    except ValidationError as error:
+        raise ValueError('; '.join(f"{'.'.join(map(str, e['loc'])) or 'record'}: {e['msg']}"
+                                   for e in error.errors(include_url=False)))
+
+    if schema.period_type_id not in known_period_types:
+        raise ValueError(f'Unknown period type: {schema.period_type_id}.')
+    unknown_tags = set(schema.tags or ()) - known_tags
+    if unknown_tags:
+        raise ValueError(f'Unknown tags: {sorted(unknown_tags)}.')
+
+    # The author is a computed field, which needs a request to be dumped
+    row = schema.model_dump(exclude={'author_id'})
+    row['author_id'] = author_id
+    return row
+
+
+def _import_batch(rows: list[dict], number: int, first_line: int, last_line: int) -> int:
+    """Inserts a batch of the import in its own transaction, and returns the number
+    of the imported recipes. A failed batch is rolled back and reported."""
+    try:
+        insert_recipes(rows)
+    except SQLAlchemyError as error:
+        db.session.rollback()
+        reason = str(getattr(error, 'orig', None) or error).splitlines()[0]
+        click.echo(f'Batch {number} (lines {first_line}-{last_line}) failed, '
+                   f'{len(rows)} recipes were skipped: {reason}', err=True)
+        return 0
+
+    click.echo(f'Batch {number} (lines {first_line}-{last_line}): {len(rows)} recipes imported.')
+    return len(rows)
+
+
+@recipes_bp.cli.command('import', help='Import Recipes from a JSON Lines file.')
+@click.argument('file', type=click.File('r', encoding='utf-8'))
+@click.option('--batch-size', default=500, show_default=True, type=click.IntRange(min=1),
+              help='The number of recipes inserted per transaction.')
+@click.option('--author-id', type=int, default=None,
+              help='The author of the records that have no author_id.')
+def import_recipes(file, batch_size: int, author_id: int | None):
+    known_tags = set(db.session.scalars(select(RecipeTag.id)))
+    known_period_types = set(db.session.scalars(select(PeriodType.id)))
+    known_users = set(db.session.scalars(select(User.id)))
+
+    # The file is read line by line, so that only one batch is held in memory
+    batch: list[dict] = []
+    batch_number = 0
+    first_line = 1
+    imported = invalid = failed = 0
+    line_number = 0
+
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            batch.append(_read_import_record(line, author_id, known_tags, known_period_types, known_users))
+        except ValueError as error:
+            click.echo(f'Line {line_number}: {error}', err=True)
+            invalid += 1
+
+        if len(batch) >= batch_size:
+            batch_number += 1
+            batch_imported = _import_batch(batch, batch_number, first_line, line_number)
+            imported += batch_imported
+            failed += len(batch) - batch_imported
+            batch = []
+            first_line = line_number + 1
+
+    if batch:
+        batch_number += 1
+        batch_imported = _import_batch(batch, batch_number, first_line, line_number)
+        imported += batch_imported
+        failed += len(batch) - batch_imported
+
+    click.echo(f'{imported} recipes imported, {invalid} invalid records '
+               f'and {failed} recipes of the failed batches skipped.')
+    return True
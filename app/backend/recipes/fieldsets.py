@@ -0,0 +1,71 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Mapping
+from pydantic import BaseModel, ConfigDict, create_model
+from sqlalchemy.orm.interfaces import ORMOption
+from backend.recipes.models import Recipe
+from backend.recipes.schemas import RecipeSchema
+
+
+RECIPE_COLUMNS = ('id', 'name', 'slug', 'calories', 'cooking_time', 'ingredients', 'text', 'like_count')
+"""The recipe columns that can be requested with `?fields=`."""
+RECIPE_RELATIONSHIPS = ('author', 'period_type', 'tags')
+"""The recipe relationships that can be requested with `?include=`."""
+SUMMARY_COLUMNS = tuple(name for name in RECIPE_COLUMNS if name != 'text')
+"""The columns of the list views by default: everything but the long `text`."""
+
+
+class RecipeFieldsetBase(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+
+@dataclass(frozen=True)
+class RecipeFieldset:
+    """The columns and relationships of the recipes to load and serialize."""
+    fields: tuple[str, ...] = SUMMARY_COLUMNS
+    include: tuple[str, ...] = RECIPE_RELATIONSHIPS
+
+    def load(self, *key_columns) -> tuple[ORMOption, ...]:
+        """Loader options for the fieldset. `key_columns` are loaded as well,
+        e.g. the columns of the keyset pagination."""
+        fields = dict.fromkeys((*self.fields, *(column.key for column in key_columns)))
+        return Recipe.fieldset_load(tuple(fields), self.include)
+
+    def schema(self, base: type[BaseModel] = RecipeFieldsetBase) -> type[BaseModel]:
+        """Returns the schema serializing the fieldset, with the fields of `base` first."""
+        return _build_schema(self.fields + self.include, base)
+
+
+@lru_cache(maxsize=256)
+def _build_schema(names: tuple[str, ...], base: type[BaseModel]) -> type[BaseModel]:
+    fields = {name: (RecipeSchema.model_fields[name].annotation, RecipeSchema.model_fields[name])
+              for name in names}
+    return create_model(f'{base.__name__}Fieldset', __base__=base, **fields)
+
+
+def _parse_names(value: str, allowed: tuple[str, ...], arg: str) -> tuple[str, ...]:
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown {arg}: {', '.join(unknown)}. "
+                         f"Allowed are: {', '.join(allowed)}.")
+    # Keep the declared order, so that equal requests share the cached schemas
+    return tuple(name for name in allowed if name in names)
+
+
+def get_recipe_fieldset(args: Mapping[str, str]) -> RecipeFieldset:
+    """Reads the `fields` and `include` query arguments. Without them, the summary
+    fieldset is returned; `fields` alone doesn't include any relationships.
+    The `id` is always included. Raises `ValueError` on unknown names."""
+    if 'fields' not in args and 'include' not in args:
+        return RecipeFieldset()
+
+    fields = SUMMARY_COLUMNS
+    if 'fields' in args:
+        fields = _parse_names(args['fields'], RECIPE_COLUMNS, 'fields')
+        if 'id' not in fields:
+            fields = ('id', *fields)
+    include = ()
+    if 'include' in args:
+        include = _parse_names(args['include'], RECIPE_RELATIONSHIPS, 'include')
+    return RecipeFieldset(fields=fields, include=include)
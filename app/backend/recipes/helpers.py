@@ -1,15 +1,197 @@
-from backend.recipes.schemas import RecipeCreate
-from backend.recipes.models import Recipe
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from backend.recipes.ingredients import index_ingredients, tokenize_ingredients
+from backend.recipes.schemas import PeriodTypeSchema, RecipeCreate
+from backend.recipes.models import Like, PeriodType, Recipe, RecipeIngredient, recipe_tag_association, utc_now
+from backend.utils.cache import get_version_stamp
+from backend.utils.replicas import on_primary
+from backend.utils.misc import (
+    SLUG_ATTEMPTS, allocate_slug, allocate_slugs, commit_with_unique_slug, is_slug_conflict
+)
 from app_factory import db
 
 
+PERIOD_TYPES_STAMP = 'period_types'
+
+
 def create_recipe_instance(recipe_schema: RecipeCreate, commit=True):
     recipe_data: dict = recipe_schema.model_dump()
     
     new_recipe = Recipe(**recipe_data)
+    index_ingredients(new_recipe)
     
     if commit:
-        db.session.add(new_recipe)
-        db.session.commit()
+        commit_with_unique_slug(db, new_recipe, new_recipe.name)
+    else:
+        new_recipe.slug = allocate_slug(new_recipe.name, Recipe)
     
-    return new_recipe
\ No newline at end of file
+    return new_recipe
+
+
+def bulk_create_recipes(recipe_rows: list[dict]) -> list[int]:
+    """Inserts the recipes with executemany-style statements, along with their tag
+    associations and ingredient tokens, and returns their IDs in the same order.
+    Each row holds the `Recipe` columns, including a unique `slug`, and a `tags`
+    list of tag IDs.
+    Doesn't commit, so that the caller decides the transaction boundaries."""
+    recipe_tags = [set(row.get('tags') or []) for row in recipe_rows]
+    rows = [{key: value for key, value in row.items() if key != 'tags'} for row in recipe_rows]
+
+    # Without RETURNING, which SQLite can only do one row at a time when the order matters,
+    # so the IDs are looked up by the unique slugs
+    db.session.execute(insert(Recipe), rows)
+    slugs = [row['slug'] for row in rows]
+    ids_by_slug = dict(db.session.execute(select(Recipe.slug, Recipe.id).where(Recipe.slug.in_(slugs))).all())
+    recipe_ids = [ids_by_slug[slug] for slug in slugs]
+
+    tag_rows = [{'recipe_id': recipe_id, 'tag_id': tag_id}
+                for recipe_id, tags in zip(recipe_ids, recipe_tags)
+                for tag_id in tags]
+    if tag_rows:
+        db.session.execute(insert(recipe_tag_association), tag_rows)
+
+    token_rows = [{'recipe_id': recipe_id, 'token': token}
+                  for recipe_id, row in zip(recipe_ids, rows)
+                  for token in tokenize_ingredients(row['ingredients'])]
+    if token_rows:
+        db.session.execute(insert(RecipeIngredient), token_rows)
+
+    return recipe_ids
+
+
+def insert_recipes(recipe_rows: list[dict], attempts: int = SLUG_ATTEMPTS) -> list[tuple[int, str]]:
+    """Allocates the slugs of the recipes in one batch, inserts them with
+    `bulk_create_recipes` and commits. If a concurrent writer takes some of the
+    slugs, the whole batch is retried with new ones; other integrity errors are
+    raised at once. Returns `(id, slug)` per row."""
+    for attempt in range(attempts):
+        slugs = allocate_slugs([row['name'] for row in recipe_rows], Recipe)
+        try:
+            recipe_ids = bulk_create_recipes([{**row, 'slug': slug}
+                                              for row, slug in zip(recipe_rows, slugs)])
+            db.session.commit()
+            return list(zip(recipe_ids, slugs))
+        except IntegrityError as error:
+            db.session.rollback()
+            if attempt == attempts - 1 or not is_slug_conflict(error, Recipe):
+                raise
+
+
+def bulk_update_recipes(recipe_changes: list[dict]):
+    """Updates the recipes with executemany-style statements by their primary keys.
+    Each change holds the `id`, the changed `Recipe` columns and optionally a new
+    `tags` list of tag IDs. The tag associations and the ingredient tokens of the
+    changed recipes are replaced as a whole.
+    Doesn't commit, so that the caller decides the transaction boundaries."""
+    now = utc_now()
+    rows = [{key: value for key, value in change.items() if key != 'tags'} | {'last_updated': now}
+            for change in recipe_changes]
+    db.session.execute(update(Recipe), rows)
+
+    tag_changes = {change['id']: set(change['tags'] or [])
+                   for change in recipe_changes if 'tags' in change}
+    if tag_changes:
+        db.session.execute(delete(recipe_tag_association)
+                           .where(recipe_tag_association.c.recipe_id.in_(tag_changes)))
+        tag_rows = [{'recipe_id': recipe_id, 'tag_id': tag_id}
+                    for recipe_id, tags in tag_changes.items()
+                    for tag_id in tags]
+        if tag_rows:
+            db.session.execute(insert(recipe_tag_association), tag_rows)
+
+    ingredient_changes = {row['id']: row['ingredients'] for row in rows if 'ingredients' in row}
+    if ingredient_changes:
+        db.session.execute(delete(RecipeIngredient)
+                           .where(RecipeIngredient.recipe_id.in_(ingredient_changes)))
+        token_rows = [{'recipe_id': recipe_id, 'token': token}
+                      for recipe_id, ingredients in ingredient_changes.items()
+                      for token in tokenize_ingredients(ingredients)]
+        if token_rows:
+            db.session.execute(insert(RecipeIngredient), token_rows)
+
+
+def like_recipe(recipe_id: int, user_id: int) -> bool:
+    """Adds a like of the user to the recipe and increments `Recipe.like_count`
+    in the same transaction. Returns `False` if the recipe is already liked."""
+    try:
+        db.session.add(Like(user_id=user_id, recipe_id=recipe_id))
+        db.session.flush()
+    except IntegrityError:
+        # Guarded by the unique constraint, so concurrent requests can't like twice
+        db.session.rollback()
+        return False
+
+    db.session.execute(update(Recipe)
+                       .where(Recipe.id == recipe_id)
+                       .values(like_count=Recipe.like_count + 1))
+    db.session.commit()
+    return True
+
+
+def unlike_recipe(recipe_id: int, user_id: int) -> bool:
+    """Removes a like of the user from the recipe and decrements `Recipe.like_count`
+    in the same transaction. Returns `False` if the recipe wasn't liked."""
+    result = db.session.execute(delete(Like)
+                                .where(Like.user_id == user_id, Like.recipe_id == recipe_id))
+    if not result.rowcount:
+        db.session.rollback()
+        return False
+
+    db.session.execute(update(Recipe)
+                       .where(Recipe.id == recipe_id)
+                       .values(like_count=Recipe.like_count - 1))
+    db.session.commit()
+    return True
+
+
+def recipe_etag(recipe_id: int, last_updated: datetime) -> str:
+    """Returns the strong ETag of a recipe, which changes with every update of it."""
+    return f'{recipe_id}-{last_updated.replace(tzinfo=timezone.utc).timestamp():.6f}'
+
+
+def touch_tagged_recipes(tag_id: int):
+    """Bumps `Recipe.last_updated` of the recipes with the tag, as their serialized
+    form changes along with the tag. Doesn't commit."""
+    tagged = select(recipe_tag_association.c.recipe_id).where(recipe_tag_association.c.tag_id == tag_id)
+    db.session.execute(update(Recipe).where(Recipe.id.in_(tagged)).values(last_updated=utc_now())
+                       .execution_options(synchronize_session=False))
+
+
+@dataclass(frozen=True)
+class PeriodTypeSnapshot:
+    """All the serialized period types at the given version of the table."""
+    version: str
+    items: list[dict]
+    by_id: dict[int, dict]
+    etag: str
+
+
+def get_period_types() -> PeriodTypeSnapshot:
+    """Returns all the period types, read through a process-wide cache that
+    is reloaded once the `period_types` version stamp changes."""
+    version = get_version_stamp(PERIOD_TYPES_STAMP).read()
+    snapshot: PeriodTypeSnapshot | None = current_app.extensions.get(PERIOD_TYPES_STAMP)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    # Read from the primary, as a lagging replica would pin stale data to the new version
+    with on_primary(db.session):
+        items = [PeriodTypeSchema.model_validate(rtype).model_dump()
+                 for rtype in PeriodType.query.order_by(PeriodType.id)]
+    etag = hashlib.sha1(f'{version}:{json.dumps(items)}'.encode()).hexdigest()
+    snapshot = PeriodTypeSnapshot(version=version,
+                                  items=items,
+                                  by_id={item['id']: item for item in items},
+                                  etag=etag)
+    current_app.extensions[PERIOD_TYPES_STAMP] = snapshot
+    return snapshot
+
+
+def invalidate_period_types():
+    """Makes every worker process reload the period types on the next read."""
+    get_version_stamp(PERIOD_TYPES_STAMP).bump()
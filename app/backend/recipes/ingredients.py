@@ -0,0 +1,95 @@
+import re
+from flask import current_app
+from sqlalchemy import case, func, select
+from backend.recipes.models import Recipe, RecipeIngredient
+from app_factory import db
+
+
+MAX_QUERY_INGREDIENTS = 32
+
+_WORD_RE = re.compile(r'[^\W\d_]+', re.UNICODE)
+
+STOP_WORDS = frozenset({
+    'a', 'an', 'and', 'or', 'of', 'to', 'for', 'with', 'without', 'the', 'some', 'few',
+    'fresh', 'large', 'small', 'medium', 'chopped', 'sliced', 'diced', 'minced', 'optional',
+    'g', 'kg', 'mg', 'ml', 'l', 'oz', 'lb', 'lbs', 'cup', 'cups', 'tbsp', 'tsp', 'pinch',
+    'gram', 'grams', 'spoon', 'spoons', 'tablespoon', 'tablespoons', 'teaspoon', 'teaspoons',
+    'piece', 'pieces', 'slice', 'slices', 'clove', 'cloves', 'can', 'cans', 'taste',
+})
+
+
+def normalize_token(word: str) -> str:
+    """Lowercases the `word` and strips the common English plural endings."""
+    word = word.lower()
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 4 and word.endswith('oes'):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def tokenize_ingredients(text: str) -> set[str]:
+    """Splits the free-text ingredients into a set of normalized tokens,
+    dropping quantities, units and stop words."""
+    tokens = set()
+    for word in _WORD_RE.findall(text or ''):
+        if len(word) < 2 or word.lower() in STOP_WORDS:
+            continue
+        tokens.add(normalize_token(word))
+    return tokens
+
+
+def index_ingredients(recipe: Recipe):
+    """Brings the ingredient tokens of the `recipe` in line with its `ingredients`.
+    The changes are written with the next flush of the session."""
+    tokens = tokenize_ingredients(recipe.ingredients)
+    existing = {item.token: item for item in recipe.ingredient_tokens}
+
+    for token in existing.keys() - tokens:
+        recipe.ingredient_tokens.remove(existing[token])
+    for token in sorted(tokens - existing.keys()):
+        recipe.ingredient_tokens.append(RecipeIngredient(token=token))
+
+
+def _candidate_tokens(tokens: set[str]) -> set[str]:
+    """Returns the `tokens` found in at most `INGREDIENT_COMMON_TOKEN_RECIPES`
+    recipes, or the rarest token if every one is more common."""
+    max_recipes = current_app.config['INGREDIENT_COMMON_TOKEN_RECIPES']
+    ordered = sorted(tokens)
+    # Counting stops past the limit, so a common token reads at most that many index entries
+    counts = db.session.execute(select(*(
+        select(func.count()).select_from(
+            select(RecipeIngredient.recipe_id).where(RecipeIngredient.token == token)
+            .limit(max_recipes + 1).subquery()
+        ).scalar_subquery()
+        for token in ordered
+    ))).one()
+    rare = {token for token, count in zip(ordered, counts) if count <= max_recipes}
+    return rare or {min(zip(counts, ordered))[1]}
+
+
+def rank_recipes_by_ingredients(tokens: set[str], limit: int, offset: int = 0) -> list[tuple[int, int, int]]:
+    """Returns `(recipe_id, matched, total)` of the visible recipes sharing any of
+    the `tokens`, ranked by the number of matched ingredients and then by the share
+    of the recipe ingredients covered.
+
+    Every candidate recipe is counted before the page is cut, so the cost grows
+    with the number of recipes matching the candidate tokens. The tokens of more
+    than `INGREDIENT_COMMON_TOKEN_RECIPES` recipes, like salt, don't add candidates
+    unless every token is that common; they still count towards the matches."""
+    matched = func.sum(case((RecipeIngredient.token.in_(tokens), 1), else_=0))
+    total = func.count(RecipeIngredient.token)
+    candidates = select(RecipeIngredient.recipe_id).where(RecipeIngredient.token.in_(_candidate_tokens(tokens)))
+
+    statement = (
+        select(RecipeIngredient.recipe_id, matched, total)
+        .join(Recipe, Recipe.id == RecipeIngredient.recipe_id)
+        .where(Recipe.is_visible, RecipeIngredient.recipe_id.in_(candidates))
+        .group_by(RecipeIngredient.recipe_id)
+        .order_by(matched.desc(), (matched * 1.0 / total).desc(), RecipeIngredient.recipe_id)
+        .limit(limit)
+        .offset(offset)
+    )
+    return [tuple(row) for row in db.session.execute(statement)]
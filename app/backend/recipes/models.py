@@ -1,27 +1,38 @@
-from datetime import datetime
+from datetime import datetime, timezone
 import enum
-from typing import List, TYPE_CHECKING
+from typing import List, TYPE_CHECKING, Sequence
 from app_factory import db
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Column, ForeignKey, Integer, Table
+from sqlalchemy.orm import Mapped, mapped_column, relationship, joinedload, load_only, selectinload
+from sqlalchemy.orm.interfaces import ORMOption
+from sqlalchemy import DDL, Column, ForeignKey, Index, Integer, PrimaryKeyConstraint, Table, UniqueConstraint, event, text
 if TYPE_CHECKING:
     from app.backend.users.models import User   
 
 
+# The primary keys start with `recipe_id`, as recipes load their tags and mixes
+# far more often than the other way round; the reverse lookups are indexed separately
 recipe_tag_association = Table(
     'recipe_recipe_tag_association',
     db.metadata,
-    Column('tag_id', Integer, ForeignKey('recipe_tag.id')),
-    Column('recipe_id', Integer, ForeignKey('recipe.id'))
+    Column('tag_id', Integer, ForeignKey('recipe_tag.id'), nullable=False, index=True),
+    Column('recipe_id', Integer, ForeignKey('recipe.id'), nullable=False),
+    PrimaryKeyConstraint('recipe_id', 'tag_id', name='pk_recipe_recipe_tag_association'),
 )
 
 recipe_mix_association = Table(
     'recipe_recipe_mix_association',
     db.metadata,
-    Column('mix_id', Integer, ForeignKey('recipe_mix.id')),
-    Column('recipe_id', Integer, ForeignKey('recipe.id'))
+    Column('mix_id', Integer, ForeignKey('recipe_mix.id'), nullable=False, index=True),
+    Column('recipe_id', Integer, ForeignKey('recipe.id'), nullable=False),
+    PrimaryKeyConstraint('recipe_id', 'mix_id', name='pk_recipe_recipe_mix_association'),
 )
 
+
+def utc_now() -> datetime:
+    """Returns the current UTC time without the zone, as the `DateTime` columns store it."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class PeriodType(db.Model):
     """Model representing a type of the meal depending on the time period (e.g., breakfast, lunch, dinner)."""
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -38,15 +49,26 @@ class RecipeTag(db.Model):
 
 
 class Recipe(db.Model):
+    __table_args__ = (
+        # Serves `visible()` ordered by the creation date, and its counts
+        Index('ix_recipe_visible_created_on_id', 'created_on', 'id',
+              sqlite_where=text('is_visible = 1'),
+              postgresql_where=text('is_visible')),
+        # Serves the most liked recipes without aggregating the likes
+        Index('ix_recipe_visible_like_count', 'like_count', 'id',
+              sqlite_where=text('is_visible = 1'),
+              postgresql_where=text('is_visible')),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column()
     slug: Mapped[str] = mapped_column(unique=True, name='slug')
-    author_id: Mapped[int] = mapped_column(ForeignKey('user.id'))
+    author_id: Mapped[int] = mapped_column(ForeignKey('user.id'), index=True)
     author: Mapped["User"] = relationship(back_populates='recipes')
     calories: Mapped[int] = mapped_column()
     cooking_time: Mapped[int] = mapped_column()
     
-    period_type_id: Mapped[int] = mapped_column(ForeignKey('period_type.id'))
+    period_type_id: Mapped[int] = mapped_column(ForeignKey('period_type.id'), index=True)
     period_type: Mapped[PeriodType] = relationship(back_populates='recipes')
     
     ingredients: Mapped[str] = mapped_column()
@@ -57,16 +79,55 @@ class Recipe(db.Model):
     
     created_on: Mapped[datetime] = mapped_column(default=datetime.now)
     published_on: Mapped[datetime] = mapped_column(nullable=True)
-    last_updated: Mapped[datetime] = mapped_column(default=datetime.now, onupdate=datetime.now)
+    last_updated: Mapped[datetime] = mapped_column(default=utc_now, onupdate=utc_now)
+    """In UTC. Also bumped when the tags change, as it versions the serialized recipe."""
     
     tags: Mapped[List[RecipeTag]] = relationship(secondary=recipe_tag_association, back_populates='recipes')
     mixes: Mapped[List['RecipeMix']] = relationship(secondary=recipe_mix_association, back_populates='recipes')
     applications: Mapped[List['RecipePublicationApplication']] = relationship(back_populates='recipe')
     likes: Mapped[List['Like']] = relationship(back_populates='recipe')
+    like_count: Mapped[int] = mapped_column(default=0, server_default='0')
+    """The number of `likes`, kept up to date in the same transaction as them."""
+    ingredient_tokens: Mapped[List['RecipeIngredient']] = relationship(back_populates='recipe',
+                                                                       cascade='all, delete-orphan')
     
     @classmethod
-    def visible(cls):
-        return db.session.query(cls).filter_by(is_visible=True)
+    def visible(cls, load: Sequence[ORMOption] = ()):
+        """Returns a query of the visible recipes. `load` is an optional sequence
+        of loader options applied to the query, e.g. `Recipe.schema_load()`."""
+        query = db.session.query(cls).filter(cls.is_visible)
+        if load:
+            query = query.options(*load)
+        return query
+
+    @classmethod
+    def schema_load(cls) -> tuple[ORMOption, ...]:
+        """Loader options for the relationships serialized by `RecipeSchema`,
+        so that a page of recipes is loaded in a fixed number of queries."""
+        return (
+            joinedload(cls.author),
+            joinedload(cls.period_type),
+            selectinload(cls.tags),
+        )
+
+    @classmethod
+    def fieldset_load(cls, fields: Sequence[str], include: Sequence[str]) -> tuple[ORMOption, ...]:
+        """Loader options fetching only the columns named in `fields` and the
+        relationships named in `include`; the rest are neither loaded nor joined."""
+        options = [load_only(*(getattr(cls, name) for name in fields))]
+        if 'author' in include:
+            author_class = cls.author.property.mapper.class_
+            options.append(joinedload(cls.author).load_only(author_class.id, author_class.name))
+        if 'period_type' in include:
+            options.append(joinedload(cls.period_type))
+        if 'tags' in include:
+            options.append(selectinload(cls.tags))
+        return tuple(options)
+
+    @classmethod
+    def author_load(cls) -> tuple[ORMOption, ...]:
+        """Loader options for the routes that only check the recipe ownership."""
+        return (joinedload(cls.author),)
     
     def __repr__(self):
         return f"<Recipe: id={self.id}, author_id={self.author_id}>"
@@ -76,7 +137,7 @@ class RecipeMix(db.Model):
     """A model representing a mix of several recipes."""
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column()
-    author_id: Mapped[int] = mapped_column(ForeignKey('user.id'))
+    author_id: Mapped[int] = mapped_column(ForeignKey('user.id'), index=True)
     author: Mapped["User"] = relationship(back_populates='mixes')
     created_on: Mapped[datetime] = mapped_column(default=datetime.now)
     recipes: Mapped[List[Recipe]] = relationship(secondary=recipe_mix_association, back_populates='mixes')
@@ -90,19 +151,80 @@ class RecipePublicationApplication(db.Model):
         DECLINED = 2
     
     id: Mapped[int] = mapped_column(primary_key=True)
-    recipe_id: Mapped[int] = mapped_column(ForeignKey('recipe.id'))
+    recipe_id: Mapped[int] = mapped_column(ForeignKey('recipe.id'), index=True)
     recipe: Mapped[Recipe] = relationship(back_populates='applications')
     comment: Mapped[str] = mapped_column()
     created_on: Mapped[datetime] = mapped_column(default=datetime.now)
-    status: Mapped[int] = mapped_column(default=STATUSES.NOT_REVIEWED)
+    status: Mapped[int] = mapped_column(default=STATUSES.NOT_REVIEWED, index=True)
     last_reviewed_by: Mapped["User"] = relationship(back_populates='reviewed_applications')
-    last_reviewed_by_id: Mapped[int] = mapped_column(ForeignKey('user.id'))
+    last_reviewed_by_id: Mapped[int] = mapped_column(ForeignKey('user.id'), index=True)
 
 
 class Like(db.Model):
+    __table_args__ = (
+        # Also serves the lookups by `user_id`
+        UniqueConstraint('user_id', 'recipe_id', name='uq_like_user_id_recipe_id'),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('user.id'))
     user: Mapped["User"] = relationship(back_populates='liked')
-    recipe_id: Mapped[int] = mapped_column(ForeignKey('recipe.id'))
+    recipe_id: Mapped[int] = mapped_column(ForeignKey('recipe.id'), index=True)
     recipe: Mapped[Recipe] = relationship(back_populates='likes')
     created_on: Mapped[datetime] = mapped_column(default=datetime.now)
+
+
+class RecipeIngredient(db.Model):
+    """A normalized ingredient of a recipe. Rows with the same `token` form the
+    posting list of that ingredient, ordered by the primary key."""
+    token: Mapped[str] = mapped_column(primary_key=True)
+    recipe_id: Mapped[int] = mapped_column(ForeignKey('recipe.id'), primary_key=True, index=True)
+    recipe: Mapped[Recipe] = relationship(back_populates='ingredient_tokens')
+
+
+# Full-text search over the visible recipes, used by `backend.recipes.search`.
+# SQLite keeps an external-content FTS5 table in sync with triggers, while
+# PostgreSQL uses a generated `tsvector` column with a partial GIN index.
+RECIPE_FTS_DDL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS recipe_fts USING fts5("
+        "name, ingredients, text, content='recipe', content_rowid='id', tokenize='porter unicode61')",
+
+        "CREATE TRIGGER IF NOT EXISTS recipe_fts_insert AFTER INSERT ON recipe WHEN new.is_visible BEGIN "
+        "INSERT INTO recipe_fts(rowid, name, ingredients, text) VALUES (new.id, new.name, new.ingredients, new.text); "
+        "END",
+
+        "CREATE TRIGGER IF NOT EXISTS recipe_fts_delete AFTER DELETE ON recipe WHEN old.is_visible BEGIN "
+        "INSERT INTO recipe_fts(recipe_fts, rowid, name, ingredients, text) "
+        "VALUES ('delete', old.id, old.name, old.ingredients, old.text); "
+        "END",
+
+        "CREATE TRIGGER IF NOT EXISTS recipe_fts_update AFTER UPDATE OF name, ingredients, text, is_visible ON recipe BEGIN "
+        "INSERT INTO recipe_fts(recipe_fts, rowid, name, ingredients, text) "
+        "SELECT 'delete', old.id, old.name, old.ingredients, old.text WHERE old.is_visible; "
+        "INSERT INTO recipe_fts(rowid, name, ingredients, text) "
+        "SELECT new.id, new.name, new.ingredients, new.text WHERE new.is_visible; "
+        "END",
+    ],
+    'postgresql': [
+        "ALTER TABLE recipe ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(ingredients, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(\"text\", '')), 'C')) STORED",
+
+        "CREATE INDEX IF NOT EXISTS ix_recipe_search_vector ON recipe USING GIN (search_vector) WHERE is_visible",
+    ],
+}
+
+@event.listens_for(Recipe.tags, 'append')
+@event.listens_for(Recipe.tags, 'remove')
+def touch_recipe_on_tag_change(recipe: Recipe, tag, initiator):
+    recipe.last_updated = utc_now()
+
+
+for dialect, statements in RECIPE_FTS_DDL.items():
+    for statement in statements:
+        event.listen(Recipe.__table__, 'after_create', DDL(statement).execute_if(dialect=dialect))
+
+event.listen(Recipe.__table__, 'before_drop',
+             DDL("DROP TABLE IF EXISTS recipe_fts").execute_if(dialect='sqlite'))
@@ -1,13 +1,57 @@
+import math
 from logging import getLogger
 from flask.blueprints import Blueprint
-from flask import abort, json, jsonify, request
+from flask import Response, abort, current_app, request
+from flask_login import current_user
+from sqlalchemy import select
+from werkzeug.http import is_resource_modified
 from flask_login import login_required
 from pydantic import ValidationError
-from backend.utils.misc import safe_commit
+from backend.utils.misc import make_cacheable, safe_commit, set_validators
+from backend.utils.replicas import replica_reads
 from backend.utils.errors import ErrorCode, create_error_response
-from backend.recipes.helpers import create_recipe_instance
+from backend.utils.serialization import json_response, list_response, schema_response, to_schema
+from backend.utils.pagination import (
+    batch_meta,
+    get_count_mode,
+    get_cursor_args,
+    get_ids_arg,
+    invalidate_counts,
+    is_batch_request,
+    is_cursor_request,
+    keyset_paginate,
+    paginate,
+    pagination_meta,
+)
+from backend.recipes.helpers import (
+    bulk_update_recipes,
+    create_recipe_instance,
+    get_period_types,
+    insert_recipes,
+    like_recipe,
+    recipe_etag,
+    touch_tagged_recipes,
+    unlike_recipe,
+)
 from backend.recipes.models import PeriodType, Recipe, RecipeTag
-from backend.recipes.schemas import PeriodTypeSchema, RecipeCreate, RecipeUpdate, RecipeSchema, RecipeTagCreate, RecipeTagSchema, RecipeTagUpdate
+from backend.recipes.ingredients import (
+    MAX_QUERY_INGREDIENTS,
+    index_ingredients,
+    rank_recipes_by_ingredients,
+    tokenize_ingredients,
+)
+from backend.recipes.fieldsets import get_recipe_fieldset
+from backend.recipes.search import search_recipes
+from backend.recipes.schemas import (
+    RecipeBulkUpdate,
+    RecipeCreate,
+    RecipeMatchSchema,
+    RecipeSchema,
+    RecipeTagCreate,
+    RecipeTagSchema,
+    RecipeTagUpdate,
+    RecipeUpdate,
+)
 from app_factory import db
 from backend.utils.login import is_owner_or_superuser, superuser_only
 logger = getLogger(__name__)
@@ -26,51 +70,288 @@ def create_recipe():
     try:
         recipe_schema = RecipeCreate(**request.get_json())
     except ValidationError as error:
-        return jsonify({"errors": error.errors(include_url=False, include_context=False)}), 400
+        return json_response({"errors": error.errors(include_url=False, include_context=False)}, status=400)
 
     try:
         recipe = create_recipe_instance(recipe_schema)
     except Exception as e:
         logger.exception(e)
         return create_error_response(ErrorCode.UNKNOWN)
+    invalidate_counts('recipes')
 
-    response = RecipeSchema.model_validate(recipe).model_dump()
-    return jsonify(response)
+    return schema_response(RecipeSchema, recipe)
 
 
 @recipes_bp.route('/recipes', methods=['GET'])
+@replica_reads
 def get_recipe_list():
+    try:
+        fieldset = get_recipe_fieldset(request.args)
+    except ValueError as error:
+        return create_error_response(str(error), status_code=400)
+
+    if is_batch_request():
+        try:
+            ids = get_ids_arg()
+        except ValueError as error:
+            return create_error_response(str(error), status_code=400)
+
+        recipes = {recipe.id: recipe for recipe in Recipe.visible(load=fieldset.load())
+                   .filter(Recipe.id.in_(ids))}
+
+        return list_response(fieldset.schema(), [recipes[id] for id in ids if id in recipes],
+                             "recipe_list", batch_meta(ids, recipes))
+
+    if is_cursor_request():
+        cursor, limit = get_cursor_args()
+        key_columns = (Recipe.created_on, Recipe.id)
+        try:
+            page = keyset_paginate(Recipe.visible(load=fieldset.load(*key_columns)),
+                                   columns=key_columns,
+                                   cursor=cursor,
+                                   limit=limit)
+        except ValueError:
+            abort(400)
+
+        return list_response(fieldset.schema(), page.items, "recipe_list", page.to_dict())
+
     try:
         page = int(request.args.get('page', 0))
         per_page = int(request.args.get('per-page', 5))
+        count_mode = get_count_mode()
     except ValueError:
         abort(400)
 
-    pagination = Recipe.visible().paginate(page=page,
-                                           per_page=per_page,
-                                           max_per_page=25,
-                                           error_out=False)
+    pagination = paginate(Recipe.visible(load=fieldset.load()),
+                          count_key='recipes',
+                          count_mode=count_mode,
+                          page=page,
+                          per_page=per_page,
+                          max_per_page=25,
+                          error_out=False)
 
-    recipe_list = [RecipeSchema.model_validate(recipe).model_dump()
-                   for recipe in pagination.items]
+    return list_response(fieldset.schema(), pagination.items, "recipe_list", pagination_meta(pagination))
 
-    return jsonify({
-        "page": pagination.page,
-        "per_page": pagination.per_page,
-        "total": pagination.total,
-        "pages": pagination.pages,
+
+@recipes_bp.route('/recipes/search', methods=['GET'])
+@replica_reads
+def search_recipe_list():
+    try:
+        page = int(request.args.get('page', 0))
+        per_page = int(request.args.get('per-page', 5))
+        count_mode = get_count_mode()
+    except ValueError:
+        abort(400)
+    try:
+        fieldset = get_recipe_fieldset(request.args)
+    except ValueError as error:
+        return create_error_response(str(error), status_code=400)
+
+    text = request.args.get('q', '').strip()
+    query = search_recipes(text, load=fieldset.load())
+    if query is None:
+        return create_error_response('The search query is empty.', status_code=400)
+
+    pagination = paginate(query,
+                          count_key=f'recipes:search:{text.lower()}',
+                          count_mode=count_mode,
+                          page=page,
+                          per_page=per_page,
+                          max_per_page=25,
+                          error_out=False)
+
+    return list_response(fieldset.schema(), pagination.items, "recipe_list", pagination_meta(pagination))
+
+
+@recipes_bp.route('/recipes/top', methods=['GET'])
+@replica_reads
+def get_top_recipe_list():
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 25)
+    except ValueError:
+        abort(400)
+    try:
+        fieldset = get_recipe_fieldset(request.args)
+    except ValueError as error:
+        return create_error_response(str(error), status_code=400)
+
+    # Read in the order of `ix_recipe_visible_like_count`
+    recipes = (Recipe.visible(load=fieldset.load())
+               .order_by(Recipe.like_count.desc(), Recipe.id.desc())
+               .limit(limit))
+
+    return list_response(fieldset.schema(), recipes, "recipe_list", {"limit": limit})
+
+
+@recipes_bp.route('/recipes/by-ingredients', methods=['GET'])
+@replica_reads
+def get_recipe_list_by_ingredients():
+    try:
+        page = max(int(request.args.get('page', 0)), 1)
+        per_page = min(max(int(request.args.get('per-page', 5)), 1), 25)
+    except ValueError:
+        abort(400)
+    try:
+        fieldset = get_recipe_fieldset(request.args)
+    except ValueError as error:
+        return create_error_response(str(error), status_code=400)
+
+    tokens = tokenize_ingredients(request.args.get('ingredients', ''))
+    if not tokens:
+        return create_error_response('No ingredients were given.', status_code=400)
+    if len(tokens) > MAX_QUERY_INGREDIENTS:
+        return create_error_response(f'At most {MAX_QUERY_INGREDIENTS} ingredients can be given.',
+                                     status_code=400)
+
+    # One extra row tells if there is a next page
+    ranking = rank_recipes_by_ingredients(tokens, limit=per_page + 1, offset=(page - 1) * per_page)
+    has_next = len(ranking) > per_page
+    ranking = ranking[:per_page]
+
+    recipes = {recipe.id: recipe for recipe in Recipe.visible(load=fieldset.load())
+               .filter(Recipe.id.in_([recipe_id for recipe_id, _, _ in ranking]))}
+
+    schema, match_schema = fieldset.schema(), fieldset.schema(base=RecipeMatchSchema)
+    recipe_list = [match_schema(**dict(to_schema(schema, recipes[recipe_id])),
+                                matched_ingredients=matched,
+                                coverage=round(matched / total, 3))
+                   for recipe_id, matched, total in ranking if recipe_id in recipes]
+
+    return json_response({
+        "page": page,
+        "per_page": per_page,
+        "has_next": has_next,
+        "ingredients": sorted(tokens),
         "recipe_list": recipe_list
     })
 
 
+def _validate_bulk_items(schema_class: type[RecipeCreate] | type[RecipeBulkUpdate]):
+    """Validates every item of the JSON array of the request with `schema_class`,
+    and checks that the referenced tags and period types exist.
+    Returns the schemas and the errors by item index. Raises `ValueError` if
+    the request is not an array of a valid length."""
+    items = request.get_json()
+    max_items = current_app.config['RECIPE_BULK_MAX_ITEMS']
+    if not isinstance(items, list) or not items:
+        raise ValueError('A non-empty JSON array of recipes is expected.')
+    if len(items) > max_items:
+        raise ValueError(f'At most {max_items} recipes can be given.')
+
+    schemas, errors = {}, {}
+    for index, item in enumerate(items):
+        try:
+            schemas[index] = schema_class.model_validate(item)
+        except ValidationError as error:
+            errors[index] = error.errors(include_url=False, include_context=False)
+
+    tag_ids = {tag_id for schema in schemas.values() for tag_id in schema.tags or ()}
+    known_tags = set(db.session.scalars(select(RecipeTag.id).where(RecipeTag.id.in_(tag_ids))))
+    period_type_ids = {schema.period_type_id for schema in schemas.values()} - {None}
+    known_period_types = set(db.session.scalars(select(PeriodType.id)
+                                                .where(PeriodType.id.in_(period_type_ids))))
+    for index, schema in schemas.items():
+        unknown_tags = set(schema.tags or ()) - known_tags
+        if unknown_tags:
+            errors.setdefault(index, []).append({"loc": ["tags"], "msg": f"Unknown tags: {sorted(unknown_tags)}."})
+        if schema.period_type_id is not None and schema.period_type_id not in known_period_types:
+            errors.setdefault(index, []).append({"loc": ["period_type_id"], "msg": "Unknown period type."})
+
+    return schemas, errors
+
+
+def _bulk_error_response(item_count: int, errors: dict):
+    """Returns the per-item results of a bulk request that wrote nothing."""
+    results = []
+    for index in range(item_count):
+        result = {"index": index, "ok": index not in errors}
+        if index in errors:
+            result["errors"] = errors[index]
+        results.append(result)
+    return json_response({"results": results}, status=400)
+
+
+@recipes_bp.route('/recipes/bulk', methods=['POST'])
+@login_required
+def create_recipes_bulk():
+    try:
+        schemas, errors = _validate_bulk_items(RecipeCreate)
+    except ValueError as error:
+        return create_error_response(str(error), status_code=400)
+    if errors:
+        return _bulk_error_response(len(request.get_json()), errors)
+
+    rows = [schemas[index].model_dump() for index in range(len(schemas))]
+    try:
+        created = insert_recipes(rows)
+    except Exception as e:
+        logger.exception(e)
+        db.session.rollback()
+        return create_error_response(ErrorCode.UNKNOWN)
+    invalidate_counts('recipes')
+
+    return json_response({"results": [{"index": index, "ok": True, "id": recipe_id, "slug": slug}
+                                      for index, (recipe_id, slug) in enumerate(created)]})
+
+
+@recipes_bp.route('/recipes/bulk', methods=['PATCH'])
+@login_required
+def update_recipes_bulk():
+    try:
+        schemas, errors = _validate_bulk_items(RecipeBulkUpdate)
+    except ValueError as error:
+        return create_error_response(str(error), status_code=400)
+
+    ids = [schema.id for schema in schemas.values()]
+    authors = dict(db.session.execute(select(Recipe.id, Recipe.author_id)
+                                      .where(Recipe.id.in_(ids), Recipe.is_visible)).all())
+    seen_ids = set()
+    for index, schema in schemas.items():
+        if schema.id in seen_ids:
+            errors.setdefault(index, []).append({"loc": ["id"], "msg": "The recipe is given more than once."})
+        elif schema.id not in authors:
+            errors.setdefault(index, []).append({"loc": ["id"], "msg": "The recipe doesn't exist."})
+        elif not (current_user.is_superuser or authors[schema.id] == current_user.id):
+            errors.setdefault(index, []).append({"loc": ["id"], "msg": "The recipe can't be edited by this user."})
+        seen_ids.add(schema.id)
+    if errors:
+        return _bulk_error_response(len(request.get_json()), errors)
+
+    changes = [schemas[index].model_dump(exclude_unset=True) for index in range(len(schemas))]
+    try:
+        bulk_update_recipes(changes)
+        db.session.commit()
+    except Exception as e:
+        logger.exception(e)
+        db.session.rollback()
+        return create_error_response(ErrorCode.UNKNOWN)
+    # The changed texts may match other searches now
+    invalidate_counts('recipes:search')
+
+    return json_response({"results": [{"index": index, "ok": True, "id": change['id']}
+                                      for index, change in enumerate(changes)]})
+
+
 @recipes_bp.route('/recipes/<int:id>', methods=['GET'])
+@replica_reads
 def get_recipe(id: int):
-    recipe = Recipe.visible().filter_by(id=id).first()
+    if request.if_none_match or request.if_modified_since:
+        # Check the version with a single-column query before loading the recipe
+        last_updated = db.session.scalar(
+            select(Recipe.last_updated).where(Recipe.id == id, Recipe.is_visible))
+        if last_updated is None:
+            abort(404)
+
+        etag = recipe_etag(id, last_updated)
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_updated):
+            return set_validators(Response(status=304), etag, last_updated)
+
+    recipe = Recipe.visible(load=Recipe.schema_load()).filter_by(id=id).first()
     if not recipe:
         abort(404)
 
-    response = RecipeSchema.model_validate(recipe).model_dump()
-    return jsonify(response)
+    response = schema_response(RecipeSchema, recipe)
+    return set_validators(response, recipe_etag(recipe.id, recipe.last_updated), recipe.last_updated)
 
 
 @recipes_bp.route('/recipes/<int:id>', methods=['PUT'])
@@ -78,9 +359,9 @@ def edit_recipe(id: int):
     try:
         recipe_schema = RecipeUpdate(**request.get_json())
     except ValidationError as error:
-        return jsonify({"errors": error.errors(include_url=False, include_context=False)}), 400
+        return json_response({"errors": error.errors(include_url=False, include_context=False)}, status=400)
 
-    recipe = Recipe.visible().filter_by(id=id).first()
+    recipe = Recipe.visible(load=Recipe.schema_load()).filter_by(id=id).first()
     if not recipe:
         abort(404)
 
@@ -91,19 +372,20 @@ def edit_recipe(id: int):
     # Update the values of the DB model
     for key, value in new_data.items():
         setattr(recipe, key, value)
+    if 'ingredients' in new_data:
+        index_ingredients(recipe)
 
     errors = safe_commit(db, logger)
     if errors:
         return errors
+    invalidate_counts('recipes:search')
 
-    response = RecipeSchema.model_validate(recipe).model_dump()
-
-    return jsonify(response)
+    return schema_response(RecipeSchema, recipe)
 
 
 @recipes_bp.route('/recipes/<int:id>', methods=['DELETE'])
 def delete_recipe(id: int):
-    recipe = Recipe.visible().filter_by(id=id).first()
+    recipe = Recipe.visible(load=Recipe.author_load()).filter_by(id=id).first()
     if not recipe:
         abort(404)
 
@@ -114,43 +396,87 @@ def delete_recipe(id: int):
     errors = safe_commit(db, logger)
     if errors:
         return errors
+    invalidate_counts('recipes')
 
     return '', 204
 
 
+@recipes_bp.route('/recipes/<int:id>/like', methods=['POST'])
+@login_required
+def create_recipe_like(id: int):
+    if not db.session.scalar(select(Recipe.id).where(Recipe.id == id, Recipe.is_visible)):
+        abort(404)
+
+    try:
+        liked = like_recipe(recipe_id=id, user_id=current_user.id)
+    except Exception as e:
+        logger.exception(e)
+        db.session.rollback()
+        return create_error_response(ErrorCode.UNKNOWN)
+
+    like_count = db.session.scalar(select(Recipe.like_count).where(Recipe.id == id))
+    return json_response({"liked": True, "like_count": like_count}, status=201 if liked else 200)
+
+
+@recipes_bp.route('/recipes/<int:id>/like', methods=['DELETE'])
+@login_required
+def delete_recipe_like(id: int):
+    if not db.session.scalar(select(Recipe.id).where(Recipe.id == id, Recipe.is_visible)):
+        abort(404)
+
+    try:
+        unlike_recipe(recipe_id=id, user_id=current_user.id)
+    except Exception as e:
+        logger.exception(e)
+        db.session.rollback()
+        return create_error_response(ErrorCode.UNKNOWN)
+
+    like_count = db.session.scalar(select(Recipe.like_count).where(Recipe.id == id))
+    return json_response({"liked": False, "like_count": like_count})
+
+
 @recipes_bp.route('/recipe-tags', methods=['GET'])
+@replica_reads
 def get_recipe_tag_list():
+    if is_cursor_request():
+        cursor, limit = get_cursor_args()
+        try:
+            # Tags have no creation date, so the ID alone is the key
+            page = keyset_paginate(RecipeTag.query,
+                                   columns=(RecipeTag.id,),
+                                   cursor=cursor,
+                                   limit=limit)
+        except ValueError:
+            abort(400)
+
+        return list_response(RecipeTagSchema, page.items, "recipe_tag_list", page.to_dict())
+
     try:
         page = int(request.args.get('page', 0))
         per_page = int(request.args.get('per-page', 5))
+        count_mode = get_count_mode()
     except ValueError:
         abort(400)
 
-    pagination = RecipeTag.query.paginate(page=page,
-                                          per_page=per_page,
-                                          max_per_page=25,
-                                          error_out=False)
+    pagination = paginate(RecipeTag.query,
+                          count_key='recipe_tags',
+                          count_mode=count_mode,
+                          page=page,
+                          per_page=per_page,
+                          max_per_page=25,
+                          error_out=False)
 
-    tag_list = [RecipeTagSchema.model_validate(tag).model_dump()
-                for tag in pagination.items]
-
-    return jsonify({
-        "page": pagination.page,
-        "per_page": pagination.per_page,
-        "total": pagination.total,
-        "pages": pagination.pages,
-        "recipe_tag_list": tag_list
-    })
+    return list_response(RecipeTagSchema, pagination.items, "recipe_tag_list", pagination_meta(pagination))
 
 
 @recipes_bp.route('/recipe-tags/<int:id>', methods=['GET'])
+@replica_reads
 def get_recipe_tag(id: int):
     tag = RecipeTag.query.filter_by(id=id).first()
     if not tag:
         abort(404)
 
-    response = RecipeTagSchema.model_validate(tag).model_dump()
-    return jsonify(response)
+    return schema_response(RecipeTagSchema, tag)
 
 
 @recipes_bp.route('/recipe-tags', methods=['POST'])
@@ -159,7 +485,7 @@ def create_recipe_tag():
     try:
         schema = RecipeTagCreate(**request.get_json())
     except ValidationError as error:
-        return jsonify({"errors": error.errors(include_url=False, include_context=False)}), 400
+        return json_response({"errors": error.errors(include_url=False, include_context=False)}, status=400)
 
     new_tag = RecipeTag(**schema.model_dump())
 
@@ -167,10 +493,9 @@ def create_recipe_tag():
     errors = safe_commit(db, logger)
     if errors:
         return errors
+    invalidate_counts('recipe_tags')
 
-    response = RecipeTagSchema.model_validate(new_tag).model_dump()
-
-    return jsonify(response)
+    return schema_response(RecipeTagSchema, new_tag)
 
 
 @recipes_bp.route('/recipe-tags/<int:id>', methods=['PUT'])
@@ -179,21 +504,20 @@ def update_recipe_tag(id: int):
     try:
         schema = RecipeTagUpdate(**request.get_json())
     except ValidationError as error:
-        return jsonify({"errors": error.errors(include_url=False, include_context=False)}), 400
+        return json_response({"errors": error.errors(include_url=False, include_context=False)}, status=400)
 
     tag = RecipeTag.query.filter_by(id=id).first_or_404()
 
     new_data = schema.model_dump(exclude_unset=True)
     for key, value in new_data.items():
         setattr(tag, key, value)
+    touch_tagged_recipes(tag.id)
 
     errors = safe_commit(db, logger)
     if errors:
         return errors
 
-    response = RecipeTagSchema.model_validate(tag).model_dump()
-
-    return jsonify(response)
+    return schema_response(RecipeTagSchema, tag)
 
 
 @recipes_bp.route('/recipe-tags/<int:id>', methods=['DELETE'])
@@ -203,47 +527,50 @@ def delete_recipe_tag(id: int):
     if not tag:
         abort(404)
 
+    touch_tagged_recipes(tag.id)
     db.session.delete(tag)
     errors = safe_commit(db, logger)
     if errors:
         return errors
+    invalidate_counts('recipe_tags')
 
     return '', 204
 
 
 @recipes_bp.route('/recipe-types/', methods=['GET'])
+@replica_reads
 def get_recipe_type_list():
-    # todo: cache aggresively
     try:
-        page = int(request.args.get('page', 0))
-        per_page = int(request.args.get('per-page', 10))
+        page = max(int(request.args.get('page', 0)), 1)
+        per_page = min(max(int(request.args.get('per-page', 10)), 1), 25)
     except ValueError:
         abort(400)
 
-    pagination = PeriodType.query.paginate(page=page,
-                                           per_page=per_page,
-                                           max_per_page=25,
-                                           error_out=False)
+    period_types = get_period_types()
+    total = len(period_types.items)
+    type_list = period_types.items[(page - 1) * per_page:page * per_page]
 
-    tag_list = [PeriodTypeSchema.model_validate(rtype).model_dump()
-                for rtype in pagination.items]
-
-    return jsonify({
-        "page": pagination.page,
-        "per_page": pagination.per_page,
-        "total": pagination.total,
-        "pages": pagination.pages,
-        "period_type_list": tag_list
+    response = json_response({
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "pages": math.ceil(total / per_page),
+        "period_type_list": type_list
     })
+    return make_cacheable(response,
+                          etag=f'{period_types.etag}-{page}-{per_page}',
+                          max_age=current_app.config['REFERENCE_DATA_MAX_AGE'])
 
 
 @recipes_bp.route('/recipe-types/<int:id>', methods=['GET'])
+@replica_reads
 def get_recipe_type(id: int):
-    rtype = PeriodType.visible().filter_by(id=id).first()
+    period_types = get_period_types()
+    rtype = period_types.by_id.get(id)
     if not rtype:
         abort(404)
 
-    response = PeriodTypeSchema.model_validate(rtype).model_dump()
-    return jsonify(response)
-
+    return make_cacheable(json_response(rtype),
+                          etag=f'{period_types.etag}-{id}',
+                          max_age=current_app.config['REFERENCE_DATA_MAX_AGE'])
 
@@ -1,8 +1,8 @@
 from typing import Optional
 import flask_login
-from pydantic import BaseModel, ConfigDict, Field, computed_field, model_validator
+from pydantic import BaseModel, ConfigDict, Field, computed_field, field_validator, model_validator
 from backend.recipes.models import PeriodType, Recipe, RecipeTag
-from backend.utils.misc import generate_unique_slug, slugify
+from backend.utils.misc import slugify
 from backend.users.schemas import UserSchema
 
 
@@ -68,11 +68,6 @@ class RecipeCreate(BaseModel):
     period_type_id: int
     tags: Optional[list[int]] = Field(default_factory=list)
     
-    @computed_field
-    @property
-    def slug(self) -> str:
-        return generate_unique_slug(self.name, Recipe)
-    
     @computed_field
     @property
     def author_id(self) -> int:
@@ -89,6 +84,18 @@ class RecipeUpdate(BaseModel):
     period_type_id: Optional[int] = None
     tags: Optional[list[int]] = Field(default_factory=list)
 
+    @field_validator('*')
+    def check_not_null(value):
+        # The fields may be left out, but the columns can't be set to NULL
+        if value is None:
+            raise ValueError('The field can not be null.')
+        return value
+
+
+class RecipeBulkUpdate(RecipeUpdate):
+    """An item of the bulk update, which names the recipe to update."""
+    id: int
+
 
 class RecipeSchema(BaseModel):
     id: int
@@ -102,5 +109,14 @@ class RecipeSchema(BaseModel):
     author: UserSchema | None
     tags: list[RecipeTagSchema]
     slug: str
+    like_count: int = 0
     
     model_config = ConfigDict(from_attributes=True)
+
+
+class RecipeMatchSchema(BaseModel):
+    """The ingredient match of a recipe, followed by the fields of its fieldset."""
+    matched_ingredients: int
+    coverage: float
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,45 @@
+import re
+from sqlalchemy import func, literal_column, table, column
+from sqlalchemy.orm import Query
+from backend.recipes.models import Recipe
+from app_factory import db
+
+
+SEARCH_LANGUAGE = 'english'
+
+recipe_fts = table('recipe_fts', column('rowid'))
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def to_fts5_query(text: str) -> str | None:
+    """Turns user input into an FTS5 query matching all of its words,
+    with the last one matched as a prefix. Returns `None` if there are no words."""
+    words = _WORD_RE.findall(text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def search_recipes(text: str, load=()) -> Query | None:
+    """Returns a query of the visible recipes matching `text` in the name,
+    ingredients or text, ordered by relevance. Returns `None` if `text` has no words."""
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        if not _WORD_RE.search(text):
+            return None
+        ts_query = func.websearch_to_tsquery(SEARCH_LANGUAGE, text)
+        search_vector = literal_column('recipe.search_vector')
+        return (Recipe.visible(load=load)
+                .filter(search_vector.op('@@')(ts_query))
+                .order_by(func.ts_rank_cd(search_vector, ts_query).desc(), Recipe.id))
+
+    match_query = to_fts5_query(text)
+    if match_query is None:
+        return None
+    # The FTS5 table only holds the visible recipes; the name weighs the most
+    return (Recipe.visible(load=load)
+            .join(recipe_fts, recipe_fts.c.rowid == Recipe.id)
+            .filter(literal_column('recipe_fts').op('MATCH')(match_query))
+            .order_by(func.bm25(literal_column('recipe_fts'), 10.0, 2.0, 1.0), Recipe.id))
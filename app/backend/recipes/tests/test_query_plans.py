@@ -0,0 +1,63 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import Query
+
+from app_factory import db
+from backend.recipes.models import Like, Recipe, RecipePublicationApplication, RecipeTag, recipe_tag_association
+from backend.users.models import User
+
+
+def query_plan(statement) -> str:
+    """Returns the SQLite `EXPLAIN QUERY PLAN` output of a query or a statement."""
+    if isinstance(statement, Query):
+        statement = statement.statement
+    compiled = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}')
+    return '\n'.join(row[-1] for row in rows)
+
+
+def test_visible_recipes_plan(app):
+    plan = query_plan(Recipe.visible().order_by(Recipe.created_on, Recipe.id).limit(5))
+    assert 'ix_recipe_visible_created_on_id' in plan
+    assert 'TEMP B-TREE' not in plan
+
+    # Any of the partial indexes holds exactly the visible recipes
+    plan = query_plan(select(func.count()).select_from(Recipe).where(Recipe.is_visible))
+    assert 'USING INDEX ix_recipe_visible_' in plan
+
+
+def test_active_users_plan(app):
+    plan = query_plan(User.active().order_by(User.created_on, User.id).limit(5))
+    assert 'ix_user_active_created_on_id' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_association_plan(app):
+    # Loading the tags of a page of recipes, and the recipes of a tag
+    plan = query_plan(select(RecipeTag).join(recipe_tag_association)
+                      .where(recipe_tag_association.c.recipe_id.in_([1, 2, 3])))
+    # SQLite names the index of a composite primary key `sqlite_autoindex_*`
+    assert 'SEARCH recipe_recipe_tag_association USING COVERING INDEX sqlite_autoindex' in plan
+    assert '(recipe_id=?)' in plan
+
+    plan = query_plan(select(recipe_tag_association.c.recipe_id)
+                      .where(recipe_tag_association.c.tag_id == 1))
+    assert 'ix_recipe_recipe_tag_association_tag_id' in plan
+
+
+def test_foreign_key_plans(app):
+    for statement, index in (
+        (select(Like).where(Like.recipe_id == 1), 'ix_like_recipe_id'),
+        # Served by the unique constraint on (user_id, recipe_id)
+        (select(Like).where(Like.user_id == 1), 'sqlite_autoindex_like'),
+        (select(Recipe).where(Recipe.author_id == 1), 'ix_recipe_author_id'),
+        (select(RecipePublicationApplication)
+         .where(RecipePublicationApplication.status == RecipePublicationApplication.STATUSES.NOT_REVIEWED),
+         'ix_recipe_publication_application_status'),
+    ):
+        assert index in query_plan(statement)
+
+
+def test_top_recipes_plan(app):
+    plan = query_plan(Recipe.visible().order_by(Recipe.like_count.desc(), Recipe.id.desc()).limit(10))
+    assert 'ix_recipe_visible_like_count' in plan
+    assert 'TEMP B-TREE' not in plan
@@ -1,7 +1,17 @@
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
 from flask.testing import FlaskClient
 from flask_login import current_user, login_user, logout_user
+from sqlalchemy.exc import IntegrityError
 
-from backend.recipes.models import Recipe
+from app_factory import db
+from backend.recipes.ingredients import tokenize_ingredients
+from backend.recipes.models import Like, PeriodType, Recipe, RecipeTag
+from backend.recipes.schemas import RecipeSchema
+from backend.users.models import User
+from backend.utils import misc
+from backend.utils.misc import allocate_slug, allocate_slugs
 
 
 def test_create_recipe(client: FlaskClient, logged_in_user):
@@ -112,6 +122,64 @@ def test_get_recipe_list(client: FlaskClient, test_recipes):
     assert response.status_code == 400
 
 
+def test_recipe_list_serialization(client: FlaskClient, test_recipes):
+    response = client.get('/api/recipes?per-page=25')
+    assert response.mimetype == 'application/json'
+
+    # The bytes path gives the same data as the `model_dump()` one
+    recipes = Recipe.visible(load=Recipe.schema_load()).order_by(Recipe.id).limit(25)
+    expected = [RecipeSchema.model_validate(recipe).model_dump(exclude={'text'}) for recipe in recipes]
+    assert sorted(response.get_json()['recipe_list'], key=lambda item: item['id']) == expected
+
+
+def test_get_recipe_list_fieldsets(client: FlaskClient, test_recipes, query_counter):
+    # The summary by default, without the text
+    response = client.get('/api/recipes')
+    assert response.status_code == 200
+    recipe = response.get_json()['recipe_list'][0]
+    assert 'text' not in recipe
+    assert {'author', 'period_type', 'tags', 'ingredients'} <= recipe.keys()
+
+    query_counter.clear()
+    response = client.get('/api/recipes?fields=name,slug,calories&count=none')
+    assert response.status_code == 200
+    assert response.get_json()['recipe_list'][0].keys() == {'id', 'name', 'slug', 'calories'}
+    # Neither the other columns nor the relationships are fetched
+    assert len(query_counter) == 1
+    assert 'recipe.text' not in query_counter[0] and 'recipe.ingredients' not in query_counter[0]
+    assert 'JOIN' not in query_counter[0]
+
+    response = client.get('/api/recipes?fields=name,text&include=author,tags&limit=5')
+    assert response.status_code == 200
+    assert response.get_json()['recipe_list'][0].keys() == {'id', 'name', 'text', 'author', 'tags'}
+    assert response.get_json()['next_cursor']
+
+    response = client.get('/api/recipes?fields=name,password')
+    assert response.status_code == 400
+    response = client.get('/api/recipes?include=likes')
+    assert response.status_code == 400
+
+
+def test_get_recipe_list_by_ids(client: FlaskClient, test_recipes, query_counter):
+    visible_ids = [recipe.id for recipe in test_recipes['visible'][:3]]
+    hidden_id = test_recipes['hidden'][0].id
+    ids = [visible_ids[2], hidden_id, visible_ids[0], 9999, visible_ids[1], visible_ids[0]]
+
+    query_counter.clear()
+    response = client.get(f"/api/recipes?ids={','.join(map(str, ids))}")
+    assert response.status_code == 200
+    # The recipes and their relationships in a fixed number of queries
+    assert len(query_counter) == 2
+    data = response.get_json()
+    assert [recipe['id'] for recipe in data['recipe_list']] == [visible_ids[2], visible_ids[0], visible_ids[1]]
+    assert data['missing_ids'] == [hidden_id, 9999]
+
+    response = client.get('/api/recipes?ids=1,two')
+    assert response.status_code == 400
+    response = client.get(f"/api/recipes?ids={','.join(map(str, range(1, 102)))}")
+    assert response.status_code == 400
+
+
 def test_delete_recipe(client: FlaskClient, logged_in_user, test_recipes, test_users):
     superuser = test_users['super'][0]
     recipe = test_recipes["visible"][0]
@@ -136,3 +204,535 @@ def test_delete_recipe(client: FlaskClient, logged_in_user, test_recipes, test_u
     assert response.status_code == 204
     response = client.get(f'/api/recipes/{recipe.id}')
     assert response.status_code == 404
+
+
+def _create_related_recipes(count: int) -> list[int]:
+    """Creates `count` recipes, each with its own author, period type and tags,
+    and returns their IDs. The session is emptied so nothing is served from it."""
+    recipes = []
+    for num in range(count):
+        author = User(name=f'Author {num}', email=f'author{num}@test.com', password='-')
+        period_type = PeriodType(name=f'Period {num}', slug=f'period-{num}')
+        tags = [RecipeTag(name=f'Tag {num} {i}', slug=f'tag-{num}-{i}') for i in range(2)]
+        recipe = Recipe(
+            name=f"Related Recipe {num}",
+            calories=4,
+            cooking_time=1337,
+            ingredients="Water",
+            text="A very long recipe here",
+            slug=f"related-recipe-{num}",
+            author=author,
+            period_type=period_type,
+            tags=tags,
+        )
+        db.session.add(recipe)
+        recipes.append(recipe)
+    db.session.commit()
+    recipe_ids = [recipe.id for recipe in recipes]
+    db.session.expunge_all()
+    return recipe_ids
+
+
+def test_get_recipe_list_query_count(client: FlaskClient, query_counter):
+    _create_related_recipes(25)
+    query_counter.clear()
+
+    response = client.get('/api/recipes?per-page=25')
+    assert response.status_code == 200
+    recipe_list = response.get_json()['recipe_list']
+    assert len(recipe_list) == 25
+    assert all(recipe['author'] and recipe['period_type'] for recipe in recipe_list)
+    assert all(len(recipe['tags']) == 2 for recipe in recipe_list)
+    # COUNT, the page with its authors and period types, and the tags
+    assert len(query_counter) == 3
+
+
+def test_get_recipe_query_count(client: FlaskClient, query_counter):
+    recipe_id = _create_related_recipes(1)[0]
+    query_counter.clear()
+
+    response = client.get(f'/api/recipes/{recipe_id}')
+    assert response.status_code == 200
+    assert len(response.get_json()['tags']) == 2
+    # The recipe with its author and period type, and the tags
+    assert len(query_counter) == 2
+
+
+def test_recipe_lists_query_budget(client: FlaskClient, query_budget):
+    _create_related_recipes(25)
+    # Each list needs at most its COUNT, the page and the tags, whatever the page size
+    for url in ('/api/recipes/top', '/api/recipes/search?q=recipe', '/api/recipes?per-page=25&include=tags'):
+        with query_budget(3):
+            response = client.get(url)
+        assert response.status_code == 200
+
+
+def test_get_recipe_list_cursor(client: FlaskClient, test_recipes):
+    visible_ids = sorted(recipe.id for recipe in test_recipes['visible'])
+
+    # Walking forward through every page
+    seen_ids = []
+    response = client.get('/api/recipes?limit=4')
+    assert response.status_code == 200
+    assert response.get_json()['prev_cursor'] is None
+    while True:
+        data = response.get_json()
+        assert 'total' not in data
+        seen_ids.extend(recipe['id'] for recipe in data['recipe_list'])
+        if not data['next_cursor']:
+            break
+        response = client.get(f"/api/recipes?limit=4&cursor={data['next_cursor']}")
+    assert seen_ids == visible_ids
+
+    # Walking back from the last page
+    response = client.get(f"/api/recipes?limit=4&cursor={data['prev_cursor']}")
+    assert [recipe['id'] for recipe in response.get_json()['recipe_list']] == visible_ids[4:8]
+
+    # Exceeding max limit
+    response = client.get('/api/recipes?limit=30')
+    assert response.get_json()['limit'] == 25
+    # Incorrect params
+    response = client.get('/api/recipes?limit=hello')
+    assert response.status_code == 400
+    response = client.get('/api/recipes?cursor=not-a-cursor')
+    assert response.status_code == 400
+
+
+def test_get_recipe_list_count_modes(client: FlaskClient, logged_in_user, test_recipes, query_counter):
+    visible_count = len(test_recipes['visible'])
+    response = client.get('/api/recipes')
+    assert response.get_json()['total'] == visible_count
+
+    # The cached total is served without a COUNT query
+    query_counter.clear()
+    response = client.get('/api/recipes?count=approx')
+    assert response.get_json()['total'] == visible_count
+    assert not any('count(' in statement.lower() for statement in query_counter)
+
+    # No total at all
+    response = client.get('/api/recipes?count=none')
+    assert response.get_json()['total'] is None
+    assert response.get_json()['pages'] is None
+
+    # Creating a recipe invalidates the cached total
+    client.post('/api/recipes', json={
+        "name": "Counted meal",
+        "calories": "4",
+        "cooking_time": "1337",
+        "ingredients": "Water",
+        "text": "A very long recipe here",
+        "period_type_id": 1,
+    })
+    response = client.get('/api/recipes')
+    assert response.get_json()['total'] == visible_count + 1
+
+    # The exact count ignores the cache
+    test_recipes['hidden'][0].is_visible = True
+    db.session.commit()
+    response = client.get('/api/recipes?count=exact')
+    assert response.get_json()['total'] == visible_count + 2
+
+    # Incorrect params
+    response = client.get('/api/recipes?count=maybe')
+    assert response.status_code == 400
+
+
+def test_get_recipe_conditional(client: FlaskClient, test_recipes, test_recipe_tags, query_counter):
+    recipe = test_recipes['visible'][0]
+    response = client.get(f'/api/recipes/{recipe.id}')
+    assert response.status_code == 200
+    etag, is_weak = response.get_etag()
+    assert etag and not is_weak
+    last_modified = response.headers['Last-Modified']
+    assert abs(response.last_modified - datetime.now(timezone.utc)) < timedelta(minutes=1)
+
+    # Unchanged recipe, checked with a single query
+    query_counter.clear()
+    response = client.get(f'/api/recipes/{recipe.id}', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.get_etag()[0] == etag
+    assert len(query_counter) == 1
+
+    response = client.get(f'/api/recipes/{recipe.id}', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+
+    # Changed recipe
+    recipe.name = 'Updated Recipe'
+    db.session.commit()
+    response = client.get(f'/api/recipes/{recipe.id}', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.get_json()['name'] == 'Updated Recipe'
+    assert response.get_etag()[0] != etag
+
+    # Changed tags
+    etag = response.get_etag()[0]
+    recipe.tags.append(test_recipe_tags['visible'][0])
+    db.session.commit()
+    response = client.get(f'/api/recipes/{recipe.id}', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+    # Hidden recipe
+    hidden_recipe = test_recipes['hidden'][0]
+    response = client.get(f'/api/recipes/{hidden_recipe.id}', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 404
+
+
+def test_get_recipes_async(app, client: FlaskClient, test_recipes, test_recipe_tags, asgi_client, query_budget):
+    recipe = test_recipes['visible'][0]
+    recipe.tags.append(test_recipe_tags['visible'][0])
+    db.session.commit()
+    hidden_id = test_recipes['hidden'][0].id
+
+    cases = [('/api/recipes', b''),
+             ('/api/recipes', b'page=2&per-page=2&count=exact'),
+             ('/api/recipes', b'fields=name,text&include=author,tags&count=none'),
+             ('/api/recipes', b'limit=2&include=period_type'),
+             ('/api/recipes', f'ids={recipe.id},{hidden_id},9999'.encode()),
+             ('/api/recipes', b'fields=password'),
+             ('/api/recipes', b'cursor=bogus'),
+             (f'/api/recipes/{recipe.id}', b''),
+             (f'/api/recipes/{hidden_id}', b'')]
+    for path, query_string in cases:
+        # The page, the tags and the total at most, as in the sync views
+        with query_budget(3):
+            status, headers, body = asgi_client('GET', path, query_string)
+        expected = client.get(path, query_string=query_string.decode())
+        assert status == expected.status_code
+        assert body == expected.data
+        assert headers.get(b'etag', b'').decode() == expected.headers.get('ETag', '')
+    assert 'async_engine' in app.extensions
+
+    _, _, body = asgi_client('GET', '/api/recipes', b'limit=2')
+    query_string = f"cursor={json.loads(body)['next_cursor']}&limit=2"
+    _, _, body = asgi_client('GET', '/api/recipes', query_string.encode())
+    assert json.loads(body) == client.get('/api/recipes', query_string=query_string).get_json()
+
+    status, headers, body = asgi_client('GET', f'/api/recipes/{recipe.id}')
+    status, headers, body = asgi_client('GET', f'/api/recipes/{recipe.id}',
+                                        headers={'If-None-Match': headers[b'etag'].decode()})
+    assert status == 304 and body == b''
+
+
+def test_search_recipes(client: FlaskClient, test_recipes):
+    chicken = test_recipes['visible'][0]
+    chicken.name = 'Chicken with rice'
+    rice = test_recipes['visible'][1]
+    rice.ingredients = 'Rice, water, chicken broth'
+    hidden = test_recipes['hidden'][0]
+    hidden.name = 'Hidden chicken'
+    db.session.commit()
+
+    response = client.get('/api/recipes/search?q=chicken')
+    assert response.status_code == 200
+    # A match in the name ranks higher than a match in the ingredients
+    assert [recipe['id'] for recipe in response.get_json()['recipe_list']] == [chicken.id, rice.id]
+    assert response.get_json()['total'] == 2
+
+    # All the words have to match, and the last one is a prefix
+    response = client.get('/api/recipes/search?q=chicken%20ric')
+    assert response.get_json()['total'] == 2
+    response = client.get('/api/recipes/search?q=chicken%20potato')
+    assert response.get_json()['recipe_list'] == []
+
+    # Soft-deleting a recipe removes it from the results
+    chicken.is_visible = False
+    db.session.commit()
+    response = client.get('/api/recipes/search?q=chicken&count=exact')
+    assert [recipe['id'] for recipe in response.get_json()['recipe_list']] == [rice.id]
+
+    # Incorrect params
+    response = client.get('/api/recipes/search?q=%22%20')
+    assert response.status_code == 400
+
+
+def test_search_totals_invalidated(client: FlaskClient, logged_in_user):
+    response = client.post('/api/recipes', json={
+        "name": "Goulash",
+        "calories": "4",
+        "cooking_time": "1337",
+        "ingredients": "Beef, paprika",
+        "text": "A very long recipe here",
+        "period_type_id": 1,
+    })
+    recipe_id = response.get_json()['id']
+    assert client.get('/api/recipes/search?q=goulash').get_json()['total'] == 1
+
+    # The cached totals of the searches are dropped on every change
+    client.put(f'/api/recipes/{recipe_id}', json={"name": "Stew"})
+    assert client.get('/api/recipes/search?q=goulash').get_json()['total'] == 0
+    assert client.get('/api/recipes/search?q=stew').get_json()['total'] == 1
+    client.delete(f'/api/recipes/{recipe_id}')
+    assert client.get('/api/recipes/search?q=stew').get_json()['total'] == 0
+
+
+def test_tokenize_ingredients():
+    assert tokenize_ingredients('2 large Tomatoes, 200g of rice; 3 cloves garlic') == {'tomato', 'rice', 'garlic'}
+    assert tokenize_ingredients('') == set()
+
+
+def test_get_recipe_list_by_ingredients(app, client: FlaskClient, logged_in_user):
+    recipe_ids = {}
+    for name, ingredients in (('Chicken rice', 'Chicken, rice, salt'),
+                              ('Chicken soup', 'Chicken, carrots, onion, potatoes, salt'),
+                              ('Pancakes', 'Flour, eggs, milk')):
+        response = client.post('/api/recipes', json={
+            "name": name,
+            "calories": "4",
+            "cooking_time": "1337",
+            "ingredients": ingredients,
+            "text": "A very long recipe here",
+            "period_type_id": 1,
+        })
+        recipe_ids[name] = response.get_json()['id']
+
+    response = client.get('/api/recipes/by-ingredients?ingredients=chicken,rice,salt,carrot')
+    assert response.status_code == 200
+    recipe_list = response.get_json()['recipe_list']
+    assert [recipe['id'] for recipe in recipe_list] == [recipe_ids['Chicken rice'], recipe_ids['Chicken soup']]
+    assert recipe_list[0]['matched_ingredients'] == 3
+    assert recipe_list[0]['coverage'] == 1
+
+    # A common ingredient only ranks the recipes found by the rarer ones
+    app.config['INGREDIENT_COMMON_TOKEN_RECIPES'] = 1
+    response = client.get('/api/recipes/by-ingredients?ingredients=salt,carrot')
+    assert [(recipe['id'], recipe['matched_ingredients']) for recipe in response.get_json()['recipe_list']] == \
+        [(recipe_ids['Chicken soup'], 2)]
+    response = client.get('/api/recipes/by-ingredients?ingredients=salt,chicken')
+    assert len(response.get_json()['recipe_list']) == 2
+    app.config['INGREDIENT_COMMON_TOKEN_RECIPES'] = 1000
+
+    # Editing the ingredients re-indexes the recipe
+    response = client.put(f"/api/recipes/{recipe_ids['Pancakes']}", json={
+        "ingredients": "Flour, eggs, milk, rice",
+    })
+    assert response.status_code == 200
+    response = client.get('/api/recipes/by-ingredients?ingredients=rice&per-page=1')
+    assert response.get_json()['has_next']
+    response = client.get('/api/recipes/by-ingredients?ingredients=rice&per-page=1&page=2')
+    assert response.get_json()['recipe_list'][0]['id'] == recipe_ids['Pancakes']
+    assert not response.get_json()['has_next']
+
+    # Incorrect params
+    response = client.get('/api/recipes/by-ingredients?ingredients=,')
+    assert response.status_code == 400
+
+
+def test_like_recipe(client: FlaskClient, logged_in_user, test_recipes, test_users):
+    recipe = test_recipes['visible'][0]
+
+    response = client.post(f'/api/recipes/{recipe.id}/like')
+    assert response.status_code == 201
+    assert response.get_json()['like_count'] == 1
+    # Liking twice changes nothing
+    response = client.post(f'/api/recipes/{recipe.id}/like')
+    assert response.status_code == 200
+    assert response.get_json()['like_count'] == 1
+
+    # Another user
+    logout_user()
+    login_user(test_users['active'][0])
+    response = client.post(f'/api/recipes/{recipe.id}/like')
+    assert response.get_json()['like_count'] == 2
+    assert Like.query.filter_by(recipe_id=recipe.id).count() == 2
+
+    # Unliking
+    response = client.delete(f'/api/recipes/{recipe.id}/like')
+    assert response.status_code == 200
+    assert response.get_json()['like_count'] == 1
+    response = client.delete(f'/api/recipes/{recipe.id}/like')
+    assert response.get_json()['like_count'] == 1
+
+    # Hidden recipe
+    response = client.post(f"/api/recipes/{test_recipes['hidden'][0].id}/like")
+    assert response.status_code == 404
+
+    # logged-out request
+    logout_user()
+    response = client.post(f'/api/recipes/{recipe.id}/like')
+    assert response.status_code == 401
+
+
+def test_get_top_recipe_list(client: FlaskClient, test_recipes):
+    for like_count, recipe in enumerate(test_recipes['visible']):
+        recipe.like_count = like_count
+    test_recipes['hidden'][0].like_count = 100
+    db.session.commit()
+
+    response = client.get('/api/recipes/top?limit=3')
+    assert response.status_code == 200
+    assert [recipe['like_count'] for recipe in response.get_json()['recipe_list']] == [9, 8, 7]
+
+    # Incorrect params
+    response = client.get('/api/recipes/top?limit=hello')
+    assert response.status_code == 400
+
+
+def test_import_recipes(runner, test_users, test_recipe_tags, tmp_path):
+    tag = test_recipe_tags['visible'][0]
+    author, other_author = test_users['active'][:2]
+    period_type = PeriodType(name='Dinner', slug='dinner')
+    db.session.add(period_type)
+    db.session.commit()
+    record = {
+        "calories": 4,
+        "cooking_time": 1337,
+        "ingredients": "Chicken, rice",
+        "text": "A very long recipe here",
+        "period_type_id": period_type.id,
+    }
+    lines = [json.dumps({**record, "name": f"Imported {num}", "tags": [tag.id]}) for num in range(5)]
+    lines.insert(2, 'not json')
+    lines.insert(4, json.dumps({**record, "name": "Unknown tag", "tags": [9999]}))
+    lines.append(json.dumps({**record, "name": "Imported 0", "author_id": other_author.id, "tags": None}))
+    lines.append(json.dumps({**record, "name": "Unknown author", "author_id": 9999}))
+    lines.append(json.dumps({**record, "name": "Boolean author", "author_id": True}))
+    lines.append(json.dumps({**record, "name": "Unknown period type", "period_type_id": 9999}))
+    file = tmp_path / 'recipes.jsonl'
+    file.write_text('\n'.join(lines))
+
+    result = runner.invoke(args=['recipes', 'import', str(file), '--batch-size', '2', '--author-id', str(author.id)])
+    assert result.exit_code == 0
+    assert 'Line 3: Invalid JSON' in result.output
+    assert 'Line 5: Unknown tags: [9999]' in result.output
+    assert 'Line 9: Unknown author: 9999' in result.output
+    assert 'Line 10: author_id must be an integer, got True' in result.output
+    assert 'Line 11: Unknown period type: 9999' in result.output
+    assert '6 recipes imported, 5 invalid records' in result.output
+
+    recipes = Recipe.query.filter(Recipe.name.startswith('Imported')).all()
+    assert len(recipes) == 6
+    assert len({recipe.slug for recipe in recipes}) == 6
+    assert all(recipe.tags == [tag] for recipe in recipes if recipe.author_id == author.id)
+    assert [recipe.tags for recipe in recipes if recipe.author_id == other_author.id] == [[]]
+    assert {token.token for token in recipes[0].ingredient_tokens} == {'chicken', 'rice'}
+
+    # Without an author
+    file.write_text(json.dumps({**record, "name": "No author"}))
+    result = runner.invoke(args=['recipes', 'import', str(file)])
+    assert 'Line 1: No author_id' in result.output
+
+
+def _add_recipe_with_slug(slug: str):
+    db.session.add(Recipe(name=slug, calories=4, cooking_time=1337, ingredients="Water",
+                          text="A very long recipe here", period_type_id=1, author_id=9999, slug=slug))
+
+
+def test_allocate_slugs(app, query_counter):
+    for slug in ('soup', 'soup-2', 'soup-bar', 'soup-0a1b2'):
+        _add_recipe_with_slug(slug)
+    db.session.commit()
+    query_counter.clear()
+
+    assert allocate_slug('Soup', Recipe) == 'soup-3'
+    assert allocate_slug('Pie', Recipe) == 'pie'
+    assert allocate_slugs(['Soup', 'Soup', 'Soup 2', 'Pie', 'Pie'], Recipe) == [
+        'soup-3', 'soup-4', 'soup-2-2', 'pie', 'pie-2']
+    # One range query per call
+    assert len(query_counter) == 3
+
+
+def test_commit_with_unique_slug_race(app, monkeypatch):
+    _add_recipe_with_slug('soup')
+    db.session.commit()
+
+    # A concurrent writer takes the slug between its allocation and the commit
+    allocated = iter(['soup'])
+    real_allocate_slug = misc.allocate_slug
+    monkeypatch.setattr(misc, 'allocate_slug',
+                        lambda text, model_class: next(allocated, None) or real_allocate_slug(text, model_class))
+
+    recipe = Recipe(name='Soup', calories=4, cooking_time=1337, ingredients="Water",
+                    text="A very long recipe here", period_type_id=1, author_id=9999)
+    misc.commit_with_unique_slug(db, recipe, recipe.name)
+    assert recipe.slug == 'soup-2'
+
+    # Any other constraint isn't retried
+    allocations = []
+    monkeypatch.setattr(misc, 'allocate_slug',
+                        lambda text, model_class: allocations.append(text) or real_allocate_slug(text, model_class))
+    recipe = Recipe(name='Soup', calories=None, cooking_time=1337, ingredients="Water",
+                    text="A very long recipe here", period_type_id=1, author_id=9999)
+    with pytest.raises(IntegrityError):
+        misc.commit_with_unique_slug(db, recipe, recipe.name)
+    assert allocations == ['Soup']
+
+
+def _bulk_recipe(name: str, **fields) -> dict:
+    return {"name": name, "calories": 4, "cooking_time": 1337, "ingredients": "Water",
+            "text": "A very long recipe here", "period_type_id": 1, **fields}
+
+
+def test_create_recipes_bulk(client: FlaskClient, logged_in_user, test_recipe_tags, query_counter):
+    db.session.add(PeriodType(id=1, name='Lunch', slug='lunch'))
+    db.session.commit()
+    tag_ids = [tag.id for tag in test_recipe_tags['visible'][:2]]
+
+    # An invalid item rejects the whole request
+    response = client.post('/api/recipes/bulk', json=[_bulk_recipe('Soup'),
+                                                      _bulk_recipe('Stew', calories='many'),
+                                                      _bulk_recipe('Pie', tags=[9999])])
+    assert response.status_code == 400
+    results = response.get_json()['results']
+    assert [result['ok'] for result in results] == [True, False, False]
+    assert results[2]['errors'][0]['loc'] == ['tags']
+    assert not Recipe.query.count()
+
+    query_counter.clear()
+    response = client.post('/api/recipes/bulk', json=[_bulk_recipe('Soup', tags=tag_ids),
+                                                      _bulk_recipe('Soup', ingredients='2 eggs, milk'),
+                                                      _bulk_recipe('Pie')])
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['slug'] for result in results] == ['soup', 'soup-2', 'pie']
+    # The recipes, their associations and their tokens are each inserted at once
+    inserts = [statement.split(' (')[0] for statement in query_counter if statement.startswith('INSERT')]
+    assert inserts.count('INSERT INTO recipe') == 1
+    assert inserts.count('INSERT INTO recipe_recipe_tag_association') == 1
+    assert inserts.count('INSERT INTO recipe_ingredient') == 1
+
+    recipe = db.session.get(Recipe, results[0]['id'])
+    assert recipe.author_id == logged_in_user.id
+    assert sorted(tag.id for tag in recipe.tags) == tag_ids
+    tokens = {item.token for item in db.session.get(Recipe, results[1]['id']).ingredient_tokens}
+    assert tokens == {'egg', 'milk'}
+
+
+def test_update_recipes_bulk(client: FlaskClient, logged_in_user, test_recipes, test_recipe_tags):
+    own_recipes = []
+    for num in range(2):
+        recipe = Recipe(name=f'Own {num}', calories=4, cooking_time=1337, ingredients="Water",
+                        text="A very long recipe here", period_type_id=1, slug=f'own-{num}',
+                        author_id=logged_in_user.id)
+        db.session.add(recipe)
+        own_recipes.append(recipe)
+    db.session.commit()
+    own_ids = [recipe.id for recipe in own_recipes]
+    other_id = test_recipes['visible'][0].id
+    tag_id = test_recipe_tags['visible'][0].id
+
+    # A recipe of another author rejects the whole request
+    response = client.patch('/api/recipes/bulk', json=[{"id": own_ids[0], "name": "Renamed"},
+                                                       {"id": other_id, "name": "Stolen"}])
+    assert response.status_code == 400
+    assert response.get_json()['results'][1]['errors'][0]['loc'] == ['id']
+    db.session.expire_all()
+    assert db.session.get(Recipe, own_ids[0]).name == 'Own 0'
+
+    # The fields can be left out, but not set to null
+    response = client.patch('/api/recipes/bulk', json=[{"id": own_ids[0], "name": None}])
+    assert response.status_code == 400
+    assert response.get_json()['results'][0]['errors'][0]['loc'] == ['name']
+
+    response = client.patch('/api/recipes/bulk', json=[{"id": own_ids[0], "name": "Renamed"},
+                                                       {"id": own_ids[1], "ingredients": "3 apples",
+                                                        "tags": [tag_id]}])
+    assert response.status_code == 200
+    assert [result['id'] for result in response.get_json()['results']] == own_ids
+
+    db.session.expire_all()
+    first, second = (db.session.get(Recipe, recipe_id) for recipe_id in own_ids)
+    assert (first.name, first.calories) == ('Renamed', 4)
+    assert second.ingredients == '3 apples'
+    assert [tag.id for tag in second.tags] == [tag_id]
+    assert {item.token for item in second.ingredient_tokens} == {'apple'}
@@ -128,3 +128,17 @@ def test_delete_tag(client: FlaskClient, test_recipe_tags, test_users):
     })
     response = client.delete(f'/api/recipe-tags/{tag.id}')
     assert response.status_code == 204
+
+
+def test_get_tag_list_cursor(client: FlaskClient, test_recipe_tags):
+    response = client.get('/api/recipe-tags?limit=5')
+    assert response.status_code == 200
+    first_page = response.get_json()
+    assert len(first_page['recipe_tag_list']) == 5
+
+    response = client.get(f"/api/recipe-tags?limit=5&cursor={first_page['next_cursor']}")
+    second_page = response.get_json()
+    assert len(second_page['recipe_tag_list']) == 5
+    assert second_page['next_cursor'] is None
+    assert {tag['id'] for tag in first_page['recipe_tag_list']}.isdisjoint(
+        tag['id'] for tag in second_page['recipe_tag_list'])
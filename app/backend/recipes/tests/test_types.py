@@ -0,0 +1,48 @@
+from flask.testing import FlaskClient
+
+from backend.recipes.models import PeriodType
+
+
+def test_get_type_list(client: FlaskClient, runner, query_counter):
+    for name in ('breakfast', 'lunch', 'dinner'):
+        runner.invoke(args=['recipes', 'createrecipetype', name])
+
+    response = client.get('/api/recipe-types/')
+    assert response.status_code == 200
+    assert response.get_json()['total'] == 3
+    assert [rtype['name'] for rtype in response.get_json()['period_type_list']] == ['Breakfast', 'Lunch', 'Dinner']
+    assert response.cache_control.public
+    etag = response.get_etag()[0]
+
+    # Served from the cache, and not modified
+    query_counter.clear()
+    response = client.get('/api/recipe-types/', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+    assert not query_counter
+
+    # Pagination
+    response = client.get('/api/recipe-types/?per-page=2&page=2')
+    assert response.get_json()['pages'] == 2
+    assert len(response.get_json()['period_type_list']) == 1
+    # Incorrect params
+    response = client.get('/api/recipe-types/?per-page=hello')
+    assert response.status_code == 400
+
+
+def test_get_type(client: FlaskClient, runner):
+    runner.invoke(args=['recipes', 'createrecipetype', 'breakfast'])
+    rtype = PeriodType.query.filter_by(slug='breakfast').first()
+
+    response = client.get(f'/api/recipe-types/{rtype.id}')
+    assert response.status_code == 200
+    assert response.get_json()['name'] == 'Breakfast'
+    etag = response.get_etag()[0]
+
+    # Deleting the type through the CLI invalidates the cache
+    runner.invoke(args=['recipes', 'deleterecipetype', str(rtype.id)])
+    response = client.get(f'/api/recipe-types/{rtype.id}', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 404
+
+    # get unexistent type
+    response = client.get('/api/recipe-types/9999')
+    assert response.status_code == 404
@@ -0,0 +1,77 @@
+"""The async versions of the user reads, served by `AsyncViewsASGI` in the
+ASGI mode. They answer like the views of the same endpoints in `routes.py`."""
+from flask import abort, request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.utils.asgi import async_view
+from backend.utils.errors import ErrorCode, create_error_response
+from backend.utils.pagination import (
+    async_keyset_paginate,
+    async_paginate,
+    batch_meta,
+    get_count_mode,
+    get_cursor_args,
+    get_ids_arg,
+    is_batch_request,
+    is_cursor_request,
+    pagination_meta,
+)
+from backend.utils.serialization import list_response, schema_response
+from backend.users.models import User
+from backend.users.schemas import UserDetailedSchema, UserSchema
+
+
+def _active():
+    return select(User).where(User.is_active)
+
+
+@async_view('users.get_user_list')
+async def get_user_list(session: AsyncSession):
+    if is_batch_request():
+        try:
+            ids = get_ids_arg()
+        except ValueError as error:
+            return create_error_response(str(error), status_code=400)
+
+        users = {user.id: user for user in await session.scalars(_active().where(User.id.in_(ids)))}
+
+        return list_response(UserSchema, [users[id] for id in ids if id in users],
+                             "user_list", batch_meta(ids, users))
+
+    if is_cursor_request():
+        cursor, limit = get_cursor_args()
+        try:
+            page = await async_keyset_paginate(session, _active(),
+                                               columns=(User.created_on, User.id),
+                                               cursor=cursor,
+                                               limit=limit)
+        except ValueError:
+            abort(400)
+
+        return list_response(UserSchema, page.items, "user_list", page.to_dict())
+
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per-page', 5))
+        count_mode = get_count_mode()
+    except ValueError:
+        abort(400)
+
+    pagination = await async_paginate(session, _active(),
+                                      count_key='users',
+                                      count_mode=count_mode,
+                                      page=page,
+                                      per_page=per_page,
+                                      max_per_page=25)
+
+    return list_response(UserSchema, pagination.items, "user_list", pagination_meta(pagination))
+
+
+@async_view('users.get_user_info')
+async def get_user_info(session: AsyncSession, id: int):
+    user = await session.scalar(_active().where(User.id == id))
+
+    if not user:
+        return create_error_response(ErrorCode.USER_NOT_FOUND)
+
+    return schema_response(UserDetailedSchema, user)
@@ -0,0 +1,122 @@
+from dataclasses import dataclass
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from backend.users.models import User
+from backend.utils.cache import TTLCache, get_version_stamp
+from backend.utils.replicas import on_primary
+from app_factory import db
+
+
+USERS_STAMP = 'users'
+
+CACHED_ATTRIBUTES = ('name', 'is_active', 'is_superuser')
+"""The `User` attributes held by `CachedUser`, whose changes invalidate the cache."""
+
+
+@dataclass(frozen=True, eq=False)
+class CachedUser:
+    """A lightweight, detached copy of a `User`, used as `current_user`.
+    It compares equal to the `User` with the same ID."""
+    id: int
+    name: str
+    is_active: bool
+    is_superuser: bool
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def get_id(self) -> str:
+        return str(self.id)
+
+    def __eq__(self, other):
+        if hasattr(other, 'get_id'):
+            return self.get_id() == other.get_id()
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class UserCache:
+    """A bounded LRU/TTL cache of `CachedUser` records by ID.
+
+    Every worker process keeps its own cache, and drops all of it once the
+    `users` generation stamp, shared between the processes, changes."""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self._cache = TTLCache(ttl=ttl, maxsize=maxsize)
+        self._generation: str | None = None
+
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+
+    def _sync_generation(self):
+        generation = get_version_stamp(USERS_STAMP).read()
+        if generation != self._generation:
+            self._cache.invalidate()
+            self._generation = generation
+
+    def get(self, user_id: int) -> CachedUser | None:
+        self._sync_generation()
+        record = self._cache.get(user_id)
+        if record is None:
+            # Read from the primary, so that a lagging replica can't refill stale data
+            with on_primary(db.session):
+                row = db.session.execute(
+                    select(User.id, User.name, User.is_active, User.is_superuser)
+                    .where(User.id == user_id)
+                ).first()
+            if row is None:
+                return None
+            record = CachedUser(*row)
+            self._cache.set(user_id, record)
+        return record
+
+    def invalidate(self, *user_ids: int):
+        """Drops the users from this process, and makes the other processes
+        drop their whole caches."""
+        self._cache.invalidate(*user_ids)
+        self._generation = get_version_stamp(USERS_STAMP).bump()
+
+
+def get_user_cache() -> UserCache:
+    """Returns the user cache of the current app."""
+    cache = current_app.extensions.get('user_cache')
+    if cache is None:
+        cache = UserCache(ttl=current_app.config.get('USER_CACHE_TTL', 300),
+                          maxsize=current_app.config.get('USER_CACHE_MAXSIZE', 10000))
+        current_app.extensions['user_cache'] = cache
+    return cache
+
+
+def load_cached_user(user_id: int) -> CachedUser | None:
+    """The `user_loader` of the app. Returns `None` for the inactive users,
+    which logs them out."""
+    user = get_user_cache().get(user_id)
+    if user is None or not user.is_active:
+        return None
+    return user
+
+
+@event.listens_for(User, 'after_update')
+def _collect_changed_user(mapper, connection, target: User):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in CACHED_ATTRIBUTES):
+        state.session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_changed_users(session):
+    changed_user_ids = session.info.pop('changed_user_ids', None)
+    if changed_user_ids:
+        get_user_cache().invalidate(*changed_user_ids)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_changed_users(session, previous_transaction):
+    session.info.pop('changed_user_ids', None)
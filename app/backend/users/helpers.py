@@ -1,5 +1,6 @@
 from backend.users.schemas import UserCreate
 from backend.users.models import User
+from backend.utils.passwords import get_password_hasher
 from app_factory import db
 
 
@@ -13,3 +14,18 @@ def create_user_instance(user_schema: UserCreate, commit=True):
         db.session.commit()
         
     return new_user
+
+
+def authenticate_user(email: str, password: str) -> User | None:
+    """Returns the active user with the given credentials, or `None`.
+    The user is fetched with a single query, and a bcrypt check is run even if
+    there is no such user, so that both failures take about the same time."""
+    user = User.active_by_email(email)
+    hasher = get_password_hasher()
+
+    if user is None:
+        hasher.dummy_check(password)
+        return None
+    if not hasher.check(password, user.password):
+        return None
+    return user
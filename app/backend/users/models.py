@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import TYPE_CHECKING, List
 from app_factory import db
+from sqlalchemy import Index, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from flask_login import UserMixin
 if TYPE_CHECKING:
@@ -8,6 +9,16 @@ if TYPE_CHECKING:
 
 
 class User(db.Model, UserMixin):
+    __table_args__ = (
+        # Serves `active()` ordered by the creation date, and its counts
+        Index('ix_user_active_created_on_id', 'created_on', 'id',
+              sqlite_where=text('is_active = 1'),
+              postgresql_where=text('is_active')),
+        # Serves the case-insensitive lookups by email, and keeps emails differing
+        # only in case from belonging to different users
+        Index('ix_user_email_lower', text('lower(email)'), unique=True),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     email: Mapped[str] = mapped_column(unique=True)
     password: Mapped[str] = mapped_column()
@@ -28,7 +39,17 @@ class User(db.Model, UserMixin):
     
     @classmethod
     def active(cls):
-        return db.session.query(cls).filter_by(is_active=True)
+        return db.session.query(cls).filter(cls.is_active)
+
+    @classmethod
+    def active_by_email(cls, email: str):
+        """Returns the active user with the email, compared case-insensitively."""
+        return cls.active().filter(func.lower(cls.email) == email.lower()).first()
+
+    @classmethod
+    def email_taken(cls, email: str) -> bool:
+        """Whether any user, also an inactive one, has the email, compared case-insensitively."""
+        return db.session.query(cls.id).filter(func.lower(cls.email) == email.lower()).first() is not None
 
     def __repr__(self):
         return f"<User: id={self.id}, name='{self.name}'>"
\ No newline at end of file
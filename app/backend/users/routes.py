@@ -4,11 +4,26 @@ from flask.blueprints import Blueprint
 from pydantic import ValidationError
 from backend.utils.misc import safe_commit
 from backend.utils.login import is_owner_or_superuser
-from backend.users.helpers import create_user_instance
+from backend.utils.passwords import get_password_hasher
+from backend.utils.pagination import (
+    batch_meta,
+    get_count_mode,
+    get_cursor_args,
+    get_ids_arg,
+    invalidate_counts,
+    is_batch_request,
+    is_cursor_request,
+    keyset_paginate,
+    paginate,
+    pagination_meta,
+)
+from backend.users.helpers import authenticate_user, create_user_instance
 from backend.users.schemas import UserCreate, UserDetailedSchema, UserEdit, UserLogin, UserSchema
 from backend.users.models import User
+from backend.utils.replicas import replica_reads
 from backend.utils.errors import create_error_response, ErrorCode
-from flask import abort, jsonify, request
+from backend.utils.serialization import json_response, list_response, schema_response
+from flask import abort, request
 from app_factory import db
 
 
@@ -23,28 +38,47 @@ user_bp = Blueprint(
 
 
 @user_bp.route('/users', methods=['GET'])
+@replica_reads
 def get_user_list():
+    if is_batch_request():
+        try:
+            ids = get_ids_arg()
+        except ValueError as error:
+            return create_error_response(str(error), status_code=400)
+
+        users = {user.id: user for user in User.active().filter(User.id.in_(ids))}
+
+        return list_response(UserSchema, [users[id] for id in ids if id in users],
+                             "user_list", batch_meta(ids, users))
+
+    if is_cursor_request():
+        cursor, limit = get_cursor_args()
+        try:
+            page = keyset_paginate(User.active(),
+                                   columns=(User.created_on, User.id),
+                                   cursor=cursor,
+                                   limit=limit)
+        except ValueError:
+            abort(400)
+
+        return list_response(UserSchema, page.items, "user_list", page.to_dict())
+
     try:
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per-page', 5))
+        count_mode = get_count_mode()
     except ValueError:
         abort(400)
 
-    pagination = User.active().paginate(page=page,
-                                        per_page=per_page,
-                                        max_per_page=25,
-                                        error_out=False)
-
-    user_list = [UserSchema.model_validate(user).model_dump()
-                 for user in pagination.items]
+    pagination = paginate(User.active(),
+                          count_key='users',
+                          count_mode=count_mode,
+                          page=page,
+                          per_page=per_page,
+                          max_per_page=25,
+                          error_out=False)
 
-    return jsonify({
-        "page": pagination.page,
-        "per_page": pagination.per_page,
-        "total": pagination.total,
-        "pages": pagination.pages,
-        "user_list": user_list
-    })
+    return list_response(UserSchema, pagination.items, "user_list", pagination_meta(pagination))
 
 
 @user_bp.route('/users', methods=["POST"])
@@ -52,28 +86,27 @@ def register_user():
     try:
         user_schema = UserCreate(**request.get_json())
     except ValidationError as error:
-        return jsonify({"errors": error.errors(include_url=False, include_context=False)}), 400
+        return json_response({"errors": error.errors(include_url=False, include_context=False)}, status=400)
 
     try:
         new_user = create_user_instance(user_schema)
     except Exception as e:
         logger.exception(e)
         return create_error_response(ErrorCode.UNKNOWN)
+    invalidate_counts('users')
 
-    response = UserSchema.model_validate(new_user).model_dump()
-
-    return jsonify(response)
+    return schema_response(UserSchema, new_user)
 
 
 @user_bp.route('/users/<int:id>', methods=["GET"])
+@replica_reads
 def get_user_info(id: int):
     user = User.active().filter_by(id=id).first()
 
     if not user:
         return create_error_response(ErrorCode.USER_NOT_FOUND)
 
-    response = UserDetailedSchema.model_validate(user).model_dump()
-    return jsonify(response)
+    return schema_response(UserDetailedSchema, user)
 
 
 @user_bp.route('/users/<int:id>', methods=["PUT"])
@@ -81,7 +114,7 @@ def edit_user(id: int):
     try:
         user_schema = UserEdit(**request.get_json())
     except ValidationError as error:
-        return jsonify({"errors": error.errors(include_url=False, include_context=False)}), 400
+        return json_response({"errors": error.errors(include_url=False, include_context=False)}, status=400)
 
     user: User = User.active().filter_by(id=id).first()
     if not user:
@@ -98,9 +131,7 @@ def edit_user(id: int):
     errors = safe_commit(db, logger)
     if errors:
         return errors
-    response = UserDetailedSchema.model_validate(user).model_dump()
-
-    return jsonify(response)
+    return schema_response(UserDetailedSchema, user)
 
 
 @user_bp.route('/users/<int:id>', methods=['DELETE'])
@@ -121,6 +152,7 @@ def delete_user(id: int):
     errors = safe_commit(db, logger)
     if errors:
         return errors
+    invalidate_counts('users')
 
     return '', 204
 
@@ -133,9 +165,19 @@ def login():
     try:
         login_schema = UserLogin(**request.get_json())
     except ValidationError as error:
-        return jsonify({"errors": error.errors(include_url=False, include_context=False)}), 400
-
-    user: User = login_schema.user
+        return json_response({"errors": error.errors(include_url=False, include_context=False)}, status=400)
+
+    user = authenticate_user(login_schema.email, login_schema.password)
+    if user is None:
+        return create_error_response(ErrorCode.INVALID_CREDENTIALS)
+
+    hasher = get_password_hasher()
+    if hasher.needs_rehash(user.password):
+        # The configured work factor has changed since the password was hashed
+        user.password = hasher.hash(login_schema.password)
+        errors = safe_commit(db, logger)
+        if errors:
+            return errors
     
     flask_login.login_user(user)
 
@@ -143,7 +185,7 @@ def login():
         'id': user.id
     }
 
-    return jsonify(response)
+    return json_response(response)
 
 
 @user_bp.route('/auth/logout', methods=['POST'])
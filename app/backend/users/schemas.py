@@ -1,16 +1,16 @@
 from typing import Self
-from pydantic import BaseModel, ConfigDict, Field, EmailStr, computed_field, field_validator, model_validator
+from pydantic import BaseModel, ConfigDict, Field, EmailStr, field_validator, model_validator
 from backend.utils.errors import PasswordRequirements
+from backend.utils.passwords import get_password_hasher
 from backend.users.models import User
 from app_factory import password_policy
-import bcrypt
 
 
 def check_email_availability(email: EmailStr):
     if email is None:
         return None
 
-    if User.query.filter(User.email == email).first():
+    if User.email_taken(email):
         raise ValueError('The email is already taken.')
     return email
 
@@ -40,10 +40,7 @@ class UserCreate(BaseModel):
 
     @field_validator('password', mode='after')
     def hash_password(password: str):
-        salt = bcrypt.gensalt()
-        hashed_password = bcrypt.hashpw(password=password.encode(),
-                                        salt=salt).decode()
-        return hashed_password
+        return get_password_hasher().hash(password)
 
     _validate_email = field_validator('email')(check_email_availability)
 
@@ -68,31 +65,7 @@ class UserDetailedSchema(UserSchema):
 
 
 class UserLogin(BaseModel):
+    """Login credentials. They are checked by `authenticate_user`, so that the
+    user is fetched once per request."""
     email: EmailStr
     password: str = Field(..., max_length=128)
-
-    @computed_field
-    @property
-    def user(self) -> User:
-        user = User.active().filter_by(email=self.email).first()
-        return user
-
-    @model_validator(mode='after')
-    def check_credentials(self):
-        if not self.user:
-            raise ValueError("Login credentials are incorrect.")
-
-        try:
-            credentials_match = bcrypt.checkpw(
-                self.password.encode(), self.user.password.encode())
-        except Exception as exc:
-            print(exc)
-            raise exc
-
-        if not credentials_match:
-            raise ValueError("Login credentials are incorrect.")
-
-        return self
-
-    model_config = ConfigDict(from_attributes=True,
-                              arbitrary_types_allowed=True)
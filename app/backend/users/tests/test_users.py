@@ -1,7 +1,13 @@
+import json
+import pytest
+from sqlalchemy import func
 from flask.testing import FlaskClient
 from werkzeug.test import TestResponse
 from app.backend.utils.errors import ErrorCode
+from app_factory import db
+from backend.users.cache import get_user_cache
 from backend.users.models import User
+from backend.utils.passwords import PasswordHasher, PasswordHasherBusy, get_hash_rounds, get_password_hasher
 from conftest import TEST_PASSWORD
 
 
@@ -29,6 +35,16 @@ def test_register_user(client: FlaskClient):
     assert response.status_code == 400
     assert User.active().filter_by(email=email).count() == 1
 
+    # the same email in another case is taken as well
+    response = client.post('/api/users', json={
+        "name": user_name,
+        "email": email.upper(),
+        "password": TEST_PASSWORD,
+        "password_confirm": TEST_PASSWORD,
+    })
+    assert response.status_code == 400
+    assert User.query.count() == 1
+
     # create different user
     new_email = 'not' + email
     response = client.post('/api/users', json={
@@ -232,3 +248,148 @@ def test_get_user_list(client: FlaskClient, test_users):
     response: TestResponse = client.get('/api/users?per-page=hello')
     assert response.status_code == 400
 
+
+
+def test_get_user_list_cursor(client: FlaskClient, test_users):
+    seen_ids = []
+    response: TestResponse = client.get('/api/users?limit=5')
+    while True:
+        assert response.status_code == 200
+        data = response.get_json()
+        seen_ids.extend(user['id'] for user in data['user_list'])
+        if not data['next_cursor']:
+            break
+        response = client.get(f"/api/users?limit=5&cursor={data['next_cursor']}")
+
+    assert len(seen_ids) == 13 # Active users created by the fixture
+    assert len(set(seen_ids)) == len(seen_ids)
+
+
+def test_get_user_list_by_ids(client: FlaskClient, test_users):
+    user_ids = [user.id for user in test_users['active'][:2]]
+    inactive_id = test_users['inactive'][0].id
+
+    response = client.get(f'/api/users?ids={user_ids[1]},{inactive_id},{user_ids[0]}')
+    assert response.status_code == 200
+    assert [user['id'] for user in response.get_json()['user_list']] == [user_ids[1], user_ids[0]]
+    assert response.get_json()['missing_ids'] == [inactive_id]
+
+    response = client.get('/api/users?ids=')
+    assert response.status_code == 400
+
+
+def test_rehash_password_on_login(app, client: FlaskClient, test_users):
+    user = test_users['active'][0]
+    assert get_hash_rounds(user.password) == 4
+
+    get_password_hasher().rounds = 5
+    response = client.post('/api/auth/login', json={
+        "email": user.email,
+        "password": TEST_PASSWORD,
+    })
+    assert response.status_code == 200
+    db.session.refresh(user)
+    assert get_hash_rounds(user.password) == 5
+    assert get_password_hasher().check(TEST_PASSWORD, user.password)
+
+
+def test_password_hasher_pool():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=1, queue_timeout=0)
+    try:
+        hashed = hasher.hash(TEST_PASSWORD)
+        assert hasher.check(TEST_PASSWORD, hashed)
+        assert not hasher.check('wrong password', hashed)
+
+        # Every slot is taken, so the next operation is rejected at once
+        hasher._slots.acquire()
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash(TEST_PASSWORD)
+        hasher._slots.release()
+    finally:
+        hasher.shutdown()
+
+
+def test_login_single_query(app, client: FlaskClient, test_users, query_counter):
+    email = test_users['active'][0].email
+
+    query_counter.clear()
+    response = client.post('/api/auth/login', json={
+        "email": email.upper(),
+        "password": TEST_PASSWORD,
+    })
+    assert response.status_code == 200
+    assert len(query_counter) == 1
+
+    statement = User.active().filter(func.lower(User.email) == email).statement
+    compiled = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    plan = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}').all()
+    assert 'ix_user_email_lower' in plan[0][-1]
+
+
+def test_login_invalid_credentials(client: FlaskClient, test_users):
+    inactive_user = test_users['inactive'][0]
+    errors = []
+    for email, password in ((test_users['active'][0].email, 'Wr0ng-password!'),
+                            ('unknown@test.com', TEST_PASSWORD),
+                            (inactive_user.email, TEST_PASSWORD)):
+        response = client.post('/api/auth/login', json={
+            "email": email,
+            "password": password,
+        })
+        assert response.status_code == 400
+        errors.append(response.get_json())
+
+    # The same generic error for every case
+    assert errors == [{"errors": [{"msg": ErrorCode.INVALID_CREDENTIALS.value}]}] * 3
+    with client.session_transaction() as session:
+        assert '_user_id' not in session
+
+
+def test_user_loader_cache(app, client: FlaskClient, test_users, query_counter):
+    user = test_users['active'][0]
+    user_id, email = user.id, user.email
+    client.post('/api/auth/login', json={
+        "email": email,
+        "password": TEST_PASSWORD,
+    })
+    client.put(f'/api/users/{user_id}', json={'name': 'cached'})
+
+    # The user is loaded once, then served from the cache
+    query_counter.clear()
+    response = client.put(f'/api/users/{user_id}', json={'name': 'cached'})
+    assert response.status_code == 200
+    assert not any('FROM user' in statement and 'user.password' not in statement
+                   for statement in query_counter)
+    assert get_user_cache().get(user_id).name == 'cached'
+
+    # Deleting the user drops its entry, so the next request is anonymous
+    response = client.delete(f'/api/users/{user_id}?confirm=True')
+    assert response.status_code == 204
+    response = client.post('/api/auth/logout')
+    assert response.get_json()['errors'][0]['msg'] == 'Already logged out.'
+
+
+def test_asgi_mode(app, client: FlaskClient, test_users, asgi_client):
+    user = test_users['active'][0]
+    inactive_user = test_users['inactive'][0]
+
+    for path, query_string in (('/api/users', b'per-page=2'),
+                               ('/api/users', b'page=2&per-page=2&count=exact'),
+                               ('/api/users', b'limit=2'),
+                               ('/api/users', f'ids={user.id},{inactive_user.id},999'.encode()),
+                               (f'/api/users/{user.id}', b''),
+                               (f'/api/users/{inactive_user.id}', b'')):
+        status, headers, body = asgi_client('GET', path, query_string)
+        expected = client.get(path, query_string=query_string.decode())
+        assert status == expected.status_code
+        assert body == expected.data
+        assert b'queries' in headers[b'server-timing']
+    # The reads were served by the async views
+    assert 'async_engine' in app.extensions
+
+    # The other routes run in the thread pool
+    status, _, body = asgi_client('POST', '/api/auth/login', body=json.dumps({
+        "email": user.email,
+        "password": TEST_PASSWORD,
+    }).encode())
+    assert status == 200 and json.loads(body)['id'] == user.id
@@ -0,0 +1,201 @@
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable
+from flask import Flask, request, request_started
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from werkzeug.exceptions import HTTPException
+from backend.utils.database import create_async_database_engine
+from backend.utils.query_stats import instrument_engine
+
+
+_ASYNC_VIEWS: dict[str, Callable[..., Awaitable]] = {}
+
+
+def async_view(endpoint: str):
+    """Registers the decorated coroutine function as the async version of the
+    `GET` view `endpoint`, served by `AsyncViewsASGI`. It's called within the
+    request context with an `AsyncSession` and the URL arguments."""
+    def decorator(view: Callable[..., Awaitable]):
+        _ASYNC_VIEWS[endpoint] = view
+        return view
+    return decorator
+
+
+class WSGIThreadPoolASGI:
+    """Serves a WSGI app to an ASGI server, running every request in a thread
+    pool of `threads` threads. The client connections wait in the event loop of
+    the server, so slow clients and idle keep-alive connections hold no thread.
+
+    The request body is read before, and the response body is buffered after the
+    WSGI call, which suits the JSON API. Only the `http` and `lifespan` scopes
+    are supported."""
+
+    def __init__(self, wsgi_app: Callable, threads: int):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi')
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        status, headers, content = await self.handle(build_environ(scope, bytes(body)))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': content})
+
+    async def handle(self, environ: dict) -> tuple[int, list[tuple[bytes, bytes]], bytes]:
+        """Returns the status, headers and body of the response to the `environ`."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._call_wsgi, environ)
+
+    async def shutdown(self):
+        """Waits for the running requests and stops the threads. Called on the
+        lifespan shutdown."""
+        self.executor.shutdown(wait=True)
+
+    def _call_wsgi(self, environ: dict) -> tuple[int, list[tuple[bytes, bytes]], bytes]:
+        response = {}
+
+        def start_response(status: str, headers: list[tuple[str, str]], exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+
+        chunks = self.wsgi_app(environ, start_response)
+        try:
+            content = b''.join(chunks)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        return response['status'], response['headers'], content
+
+    async def _lifespan(self, receive: Callable, send: Callable):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+class AsyncViewsASGI(WSGIThreadPoolASGI):
+    """Serves a Flask app like `WSGIThreadPoolASGI`, except for the `GET` requests
+    of the views registered with `async_view`: those run in the event loop and
+    read through an async engine, so a request waiting for the database holds
+    no thread. They go through the request hooks and error handlers of the app,
+    as the other views do.
+
+    The engine is created by the first async request, in the event loop of the
+    server, and disposed on the lifespan shutdown. It's connected to the primary
+    database only."""
+
+    def __init__(self, flask_app: Flask, threads: int):
+        super().__init__(flask_app, threads)
+        self.flask_app = flask_app
+        self._sessions: async_sessionmaker[AsyncSession] | None = None
+
+    def get_sessions(self) -> async_sessionmaker[AsyncSession]:
+        if self._sessions is None:
+            engine = create_async_database_engine(self.flask_app)
+            instrument_engine(self.flask_app, engine.sync_engine)
+            self.flask_app.extensions['async_engine'] = engine
+            self._sessions = async_sessionmaker(engine, expire_on_commit=False)
+        return self._sessions
+
+    async def handle(self, environ: dict) -> tuple[int, list[tuple[bytes, bytes]], bytes]:
+        view = self._match_async_view(environ)
+        if view is None:
+            return await super().handle(environ)
+        return await self._call_async_view(view, environ)
+
+    async def shutdown(self):
+        await super().shutdown()
+        engine = self.flask_app.extensions.pop('async_engine', None)
+        if engine is not None:
+            await engine.dispose()
+        self._sessions = None
+
+    def _match_async_view(self, environ: dict) -> Callable[..., Awaitable] | None:
+        if environ['REQUEST_METHOD'] != 'GET':
+            return None
+        adapter = self.flask_app.url_map.bind_to_environ(environ, server_name=self.flask_app.config['SERVER_NAME'])
+        try:
+            endpoint, _ = adapter.match()
+        except HTTPException:
+            return None
+        return _ASYNC_VIEWS.get(endpoint)
+
+    async def _call_async_view(self, view: Callable[..., Awaitable],
+                               environ: dict) -> tuple[int, list[tuple[bytes, bytes]], bytes]:
+        # The steps of `Flask.wsgi_app()` and `Flask.full_dispatch_request()`, awaiting the view
+        app = self.flask_app
+        with app.request_context(environ):
+            try:
+                try:
+                    request_started.send(app, _async_wrapper=app.ensure_sync)
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        async with self.get_sessions()() as session:
+                            rv = await view(session, **request.view_args)
+                except Exception as error:
+                    rv = app.handle_user_exception(error)
+                response = app.finalize_request(rv)
+            except Exception as error:
+                response = app.handle_exception(error)
+            try:
+                headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                           for name, value in response.headers.items()]
+                return response.status_code, headers, response.get_data()
+            finally:
+                response.close()
+
+
+def build_environ(scope: dict, body: bytes) -> dict:
+    """Builds the WSGI environ of an ASGI `http` scope, as described by PEP 3333."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = f'HTTP_{name}'
+        if key in environ:
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        environ[key] = value
+    # The body is already read as a whole, also when it was sent in chunks
+    environ['CONTENT_LENGTH'] = str(len(body))
+    environ.pop('HTTP_TRANSFER_ENCODING', None)
+    return environ
@@ -0,0 +1,99 @@
+import os
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Callable, Hashable
+from uuid import uuid4
+from flask import current_app
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """A thread-safe in-process cache whose entries expire after `ttl` seconds.
+    If `maxsize` is set, the least recently used entries are evicted first."""
+
+    def __init__(self, ttl: float, maxsize: int | None = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= monotonic():
+                self._data.pop(key, None)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Returns the cached value of the `key`, calling `factory` to fill it on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, *keys: Hashable):
+        """Drops the given `keys`, or every entry if no keys are given."""
+        with self._lock:
+            if not keys:
+                self._data.clear()
+            for key in keys:
+                self._data.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str):
+        """Drops every entry whose string key starts with the `prefix`."""
+        with self._lock:
+            for key in [key for key in self._data if isinstance(key, str) and key.startswith(prefix)]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class VersionStamp:
+    """A version token stored in a file, so that every worker process sharing
+    the file sees when the data behind a process-wide cache has changed."""
+
+    INITIAL_VERSION = '0'
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def read(self) -> str:
+        try:
+            with open(self.path) as file:
+                return file.read().strip() or self.INITIAL_VERSION
+        except FileNotFoundError:
+            return self.INITIAL_VERSION
+
+    def bump(self) -> str:
+        """Replaces the stored version with a new one, and returns it."""
+        version = uuid4().hex
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as file:
+            file.write(version)
+        os.replace(temp_path, self.path)
+        return version
+
+
+def get_version_stamp(name: str) -> VersionStamp:
+    """Returns the version stamp `name` of the current app, kept in its instance folder."""
+    return VersionStamp(os.path.join(current_app.instance_path, f'{name}.version'))
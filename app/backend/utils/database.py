@@ -0,0 +1,275 @@
+import os
+import weakref
+from threading import Lock
+from time import perf_counter
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import ArgumentError, SQLAlchemyError, TimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from backend.utils.replicas import REPLICA_BIND_PREFIX
+from backend.utils.sqlite import configure_sqlite
+
+
+DATABASE_PROFILES = {
+    'postgresql': {
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 10,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+        'statement_timeout': 30000,
+        'prepare_threshold': 5,
+        'busy_timeout': None,
+        'single_writer': False,
+        'pragmas': {},
+    },
+    'sqlite': {
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 10,
+        'pool_recycle': -1,
+        'pool_pre_ping': False,
+        'statement_timeout': None,
+        'prepare_threshold': None,
+        'busy_timeout': 5000,
+        'single_writer': True,
+        'pragmas': {
+            # Readers don't block the writer, and commits only sync at checkpoints
+            'journal_mode': 'wal',
+            'synchronous': 'normal',
+            'mmap_size': 256 * 1024 * 1024,
+            # Negative sizes are in KiB
+            'cache_size': -64 * 1024,
+        },
+    },
+}
+"""The engine settings per database dialect, overridden by the `DB_*` config values."""
+
+_SETTINGS = {
+    # setting: (config key, type, minimal value)
+    'pool_size': ('DB_POOL_SIZE', int, 1),
+    'max_overflow': ('DB_MAX_OVERFLOW', int, 0),
+    'pool_timeout': ('DB_POOL_TIMEOUT', float, 0),
+    'pool_recycle': ('DB_POOL_RECYCLE', int, -1),
+    'pool_pre_ping': ('DB_POOL_PRE_PING', bool, None),
+    'statement_timeout': ('DB_STATEMENT_TIMEOUT_MS', int, 0),
+    'prepare_threshold': ('DB_PREPARE_THRESHOLD', int, 0),
+    'busy_timeout': ('DB_BUSY_TIMEOUT_MS', int, 0),
+    'single_writer': ('DB_SINGLE_WRITER', bool, None),
+}
+
+
+class DatabaseConfigError(ValueError):
+    """Raised at startup if the database settings are invalid."""
+
+
+class MeteredQueuePool(QueuePool):
+    """A `QueuePool` that measures how long the checkouts take, including the
+    waits for a free connection and the opening of the new ones."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def connect(self):
+        started = perf_counter()
+        try:
+            return super().connect()
+        except TimeoutError:
+            with self._metrics_lock:
+                self.checkout_timeouts += 1
+            raise
+        finally:
+            waited = perf_counter() - started
+            with self._metrics_lock:
+                self.checkouts += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+class MeteredAsyncQueuePool(MeteredQueuePool, AsyncAdaptedQueuePool):
+    """The `MeteredQueuePool` of the async engines."""
+
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+psycopg',
+}
+"""The async driver per database dialect. psycopg 3 is async itself, SQLite needs aiosqlite."""
+
+
+def _parse_setting(name: str, value, type_: type, minimum):
+    if type_ is bool:
+        if isinstance(value, bool):
+            return value
+        if str(value).lower() in ('1', 'true', 'yes', 'on'):
+            return True
+        if str(value).lower() in ('0', 'false', 'no', 'off'):
+            return False
+        raise DatabaseConfigError(f'{name} must be a boolean, got {value!r}.')
+    try:
+        value = type_(value)
+    except (TypeError, ValueError):
+        raise DatabaseConfigError(f'{name} must be a number, got {value!r}.')
+    if value < minimum:
+        raise DatabaseConfigError(f'{name} must be at least {minimum}, got {value}.')
+    return value
+
+
+def get_database_settings(app_config) -> tuple[str, dict]:
+    """Returns the database URL and the settings of its dialect profile with the
+    `DB_*` overrides of `app_config` applied. `postgres://` and `postgresql://`
+    URLs are switched to psycopg 3. Raises `DatabaseConfigError` on invalid values."""
+    try:
+        url = make_url(app_config['SQLALCHEMY_DATABASE_URI'])
+    except ArgumentError as error:
+        raise DatabaseConfigError(f'SQLALCHEMY_DATABASE_URI is not a database URL: {error}')
+
+    dialect = 'postgresql' if url.get_backend_name() in ('postgres', 'postgresql') else url.get_backend_name()
+    if dialect not in DATABASE_PROFILES:
+        raise DatabaseConfigError(f"Unsupported database: {url.get_backend_name()}. "
+                                  f"Supported are: {', '.join(DATABASE_PROFILES)}.")
+    if dialect == 'postgresql':
+        if url.drivername in ('postgres', 'postgresql'):
+            url = url.set(drivername='postgresql+psycopg')
+        elif url.drivername != 'postgresql+psycopg':
+            raise DatabaseConfigError('Only the psycopg 3 driver (postgresql+psycopg://) is supported.')
+
+    settings = dict(DATABASE_PROFILES[dialect])
+    for setting, (key, type_, minimum) in _SETTINGS.items():
+        value = app_config.get(key)
+        if value is not None and value != '':
+            settings[setting] = _parse_setting(key, value, type_, minimum)
+    return url.render_as_string(hide_password=False), settings
+
+
+def build_engine_options(url: str, settings: dict) -> dict:
+    """Turns the settings of `get_database_settings` into `create_engine()` options."""
+    if make_url(url).database in (None, '', ':memory:'):
+        # In-memory SQLite keeps one connection per thread, so there is no pool to tune
+        return {}
+
+    options = {
+        'poolclass': MeteredQueuePool,
+        'pool_size': settings['pool_size'],
+        'max_overflow': settings['max_overflow'],
+        'pool_timeout': settings['pool_timeout'],
+        'pool_recycle': settings['pool_recycle'],
+        'pool_pre_ping': settings['pool_pre_ping'],
+    }
+    connect_args = {}
+    if settings['prepare_threshold'] is not None:
+        # psycopg prepares a statement on the server after it runs this many times
+        connect_args['prepare_threshold'] = settings['prepare_threshold']
+    if settings['statement_timeout']:
+        connect_args['options'] = f"-c statement_timeout={settings['statement_timeout']}"
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+def configure_database(app: Flask):
+    """Validates the database settings of the `app` and fills its
+    `SQLALCHEMY_ENGINE_OPTIONS`, and the `SQLALCHEMY_BINDS` of the replicas listed
+    in `SQLALCHEMY_REPLICA_URIS`. Explicitly set engine options take precedence.
+    The settings per bind key are kept for `setup_engine()` in
+    `app.extensions['database_settings']`. Called before `db.init_app()`."""
+    url, settings = get_database_settings(app.config)
+    database_settings = {None: settings}
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**build_engine_options(url, settings),
+                                               **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for number, replica_uri in enumerate(app.config.get('SQLALCHEMY_REPLICA_URIS') or ()):
+        replica_url, replica_settings = get_database_settings({**app.config,
+                                                               'SQLALCHEMY_DATABASE_URI': replica_uri})
+        key = f'{REPLICA_BIND_PREFIX}{number}'
+        binds[key] = {'url': replica_url, **build_engine_options(replica_url, replica_settings)}
+        database_settings[key] = replica_settings
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.extensions['database_settings'] = database_settings
+
+
+def create_async_database_engine(app: Flask) -> AsyncEngine:
+    """Creates an async engine of the primary database of the `app`, with the
+    settings of the sync engine. The SQLite single-writer queue is left out, as it
+    blocks the thread, so the engine is meant for reads. Relative SQLite paths
+    are resolved against the instance folder, like Flask-SQLAlchemy does."""
+    url, settings = get_database_settings(app.config)
+    options = build_engine_options(url, settings)
+    url = make_url(url)
+    dialect = url.get_backend_name()
+    url = url.set(drivername=ASYNC_DRIVERS[dialect])
+    if dialect == 'sqlite' and url.database not in (None, '', ':memory:') and not os.path.isabs(url.database):
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+    if 'poolclass' in options:
+        options['poolclass'] = MeteredAsyncQueuePool
+
+    engine = create_async_engine(url, **options)
+    if dialect == 'sqlite':
+        configure_sqlite(engine.sync_engine, {**settings, 'single_writer': False})
+    dispose_after_fork(engine.sync_engine)
+    return engine
+
+
+def setup_engine(engine: Engine, settings: dict | None):
+    """Prepares an engine created by Flask-SQLAlchemy for use: applies the SQLite
+    profile, if the engine has `settings` from `configure_database()`, and
+    registers it with `dispose_after_fork()`."""
+    if settings is not None and engine.dialect.name == 'sqlite':
+        configure_sqlite(engine, settings)
+    dispose_after_fork(engine)
+
+
+def check_database(engine: Engine):
+    """Opens a connection and runs a trivial query, so that a wrong URL or
+    unreachable server fails the startup instead of the first request."""
+    try:
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+    except SQLAlchemyError as error:
+        raise DatabaseConfigError(f'The database is not reachable: {error}') from error
+
+
+_forked_engines: weakref.WeakSet[Engine] = weakref.WeakSet()
+
+
+def _dispose_forked_engines():
+    for engine in list(_forked_engines):
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_forked_engines)
+
+
+def dispose_after_fork(engine: Engine):
+    """Drops the pooled connections inherited from the parent process, e.g. with
+    `gunicorn --preload`, without closing them for the parent."""
+    _forked_engines.add(engine)
+
+
+def get_pool_metrics(engine: Engine) -> dict:
+    """Returns the state of the connection pool of the `engine`."""
+    pool = engine.pool
+    metrics = {
+        'pool_class': type(pool).__name__,
+        'size': getattr(pool, 'size', lambda: None)(),
+        'checked_out': getattr(pool, 'checkedout', lambda: None)(),
+        'checked_in': getattr(pool, 'checkedin', lambda: None)(),
+        'overflow': getattr(pool, 'overflow', lambda: None)(),
+    }
+    if isinstance(pool, MeteredQueuePool):
+        metrics.update({
+            'checkouts': pool.checkouts,
+            'checkout_timeouts': pool.checkout_timeouts,
+            'wait_seconds_total': pool.wait_seconds_total,
+            'wait_seconds_max': pool.wait_seconds_max,
+        })
+    return metrics
@@ -6,6 +6,7 @@ class ErrorCode(Enum):
     """Enum containing error messages."""
     
     USER_NOT_FOUND = "User with such ID doesn't exist."
+    INVALID_CREDENTIALS = "Login credentials are incorrect."
     UNKNOWN = "An unknown error has occured."
 
 
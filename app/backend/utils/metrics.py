@@ -0,0 +1,395 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import weakref
+from bisect import bisect_left
+from time import monotonic, perf_counter
+from uuid import uuid4
+from flask import Flask, Response, current_app, g, request
+from backend.utils.database import get_pool_metrics
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+"""The upper bounds, in seconds, of the request latency histogram buckets."""
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+EXITED_FILE_NAME = 'metrics-exited.json'
+"""The file of `METRICS_DIR` holding the merged counters of the exited processes."""
+
+_POOL_COUNTERS = {
+    # get_pool_metrics() key: (metric, help)
+    'checkouts': ('db_pool_checkouts_total', 'Connections taken from the pool.'),
+    'checkout_timeouts': ('db_pool_checkout_timeouts_total', 'Checkouts that timed out waiting for a connection.'),
+    'wait_seconds_total': ('db_pool_wait_seconds_total', 'Time spent taking connections from the pool.'),
+}
+_POOL_GAUGES = {
+    'size': ('db_pool_size', 'The configured pool size.'),
+    'checked_out': ('db_pool_checked_out', 'Connections in use.'),
+    'checked_in': ('db_pool_checked_in', 'Idle connections in the pool.'),
+    'overflow': ('db_pool_overflow', 'Connections over the pool size.'),
+}
+
+
+class _ThreadMetrics:
+    """The requests recorded by a single thread, which alone writes them."""
+
+    def __init__(self):
+        self.requests: dict[tuple[str, str, str, str], int] = {}
+        # (blueprint, endpoint) -> the count per bucket, the last one +Inf, and the sum
+        self.latency: dict[tuple[str, str], list] = {}
+
+
+class RequestMetrics:
+    """Counts the requests and their latencies per endpoint and status.
+
+    Every thread records into its own accumulator without locking; the lock is
+    only taken when a thread records for the first time and for snapshots,
+    which merge the accumulators. The accumulators of finished threads are
+    folded into one, so the thread-per-request server doesn't pile them up."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._token = uuid4().hex
+        self.started = _process_start_time(self._pid)
+        self._local = threading.local()
+        self._threads: list[tuple[weakref.ref, _ThreadMetrics]] = []
+        self._retired = _ThreadMetrics()
+        self.last_flush = monotonic()
+
+    def _thread_metrics(self) -> _ThreadMetrics:
+        if self._pid != os.getpid():
+            # A forked worker starts over instead of counting the parent's requests again
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+        metrics = getattr(self._local, 'metrics', None)
+        if metrics is None:
+            metrics = self._local.metrics = _ThreadMetrics()
+            with self._lock:
+                self._threads.append((weakref.ref(threading.current_thread()), metrics))
+        return metrics
+
+    def record(self, blueprint: str, endpoint: str, method: str, status: int, seconds: float):
+        metrics = self._thread_metrics()
+        key = (blueprint, endpoint, method, str(status))
+        metrics.requests[key] = metrics.requests.get(key, 0) + 1
+        histogram = metrics.latency.get((blueprint, endpoint))
+        if histogram is None:
+            histogram = metrics.latency[(blueprint, endpoint)] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        histogram[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+    def snapshot(self) -> dict:
+        """Returns the merged metrics of all threads of the process, as JSON-ready data."""
+        merged = _ThreadMetrics()
+        with self._lock:
+            live = []
+            for thread_ref, metrics in self._threads:
+                thread = thread_ref()
+                if thread is None or not thread.is_alive():
+                    _merge_thread_metrics(self._retired, metrics)
+                else:
+                    live.append((thread_ref, metrics))
+            self._threads = live
+            for metrics in [self._retired, *(metrics for _, metrics in live)]:
+                _merge_thread_metrics(merged, metrics)
+        return {
+            'requests': [[*key, count] for key, count in merged.requests.items()],
+            'latency': [[*key, histogram] for key, histogram in merged.latency.items()],
+        }
+
+    @property
+    def token(self) -> str:
+        """Tells this process apart from an earlier one with the same PID."""
+        return self._token
+
+    @property
+    def file_name(self) -> str:
+        return f'metrics-{self._pid}-{self._token}.json'
+
+
+def _merge_thread_metrics(target: _ThreadMetrics, source: _ThreadMetrics):
+    # Copies first, as the owning thread may be adding entries meanwhile
+    for key, count in source.requests.copy().items():
+        target.requests[key] = target.requests.get(key, 0) + count
+    for key, histogram in source.latency.copy().items():
+        _add_histogram(target.latency, key, list(histogram))
+
+
+def _add_histogram(histograms: dict, key, histogram: list):
+    total = histograms.get(key)
+    if total is None:
+        histograms[key] = histogram
+    else:
+        histograms[key] = [a + b for a, b in zip(total, histogram)]
+
+
+def get_request_metrics() -> RequestMetrics:
+    return current_app.extensions['metrics']
+
+
+def process_snapshot(app: Flask) -> dict:
+    """Returns the request, cache and connection pool metrics of this process.
+    The caches are the app extensions that count their `hits` and `misses`, and
+    the pool of the async engine of the ASGI mode is listed as `async`.
+    Called within an app context."""
+    metrics = app.extensions['metrics']
+    snapshot = metrics.snapshot()
+    snapshot['pid'] = os.getpid()
+    snapshot['token'] = metrics.token
+    snapshot['started'] = metrics.started
+    snapshot['caches'] = {name: [extension.hits, extension.misses]
+                          for name, extension in app.extensions.items()
+                          if hasattr(extension, 'hits') and hasattr(extension, 'misses')}
+    engines = app.extensions['sqlalchemy'].engines
+    snapshot['pools'] = {key or 'default': get_pool_metrics(engine) for key, engine in engines.items()}
+    async_engine = app.extensions.get('async_engine')
+    if async_engine is not None:
+        snapshot['pools']['async'] = get_pool_metrics(async_engine.sync_engine)
+    return snapshot
+
+
+def flush_metrics(app: Flask):
+    """Writes the metrics of this process into `METRICS_DIR`, where the other
+    worker processes read them."""
+    directory = app.config.get('METRICS_DIR')
+    if not directory:
+        return
+    metrics = app.extensions['metrics']
+    metrics.last_flush = monotonic()
+    os.makedirs(directory, exist_ok=True)
+    _write_snapshot(os.path.join(directory, metrics.file_name), process_snapshot(app))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _process_start_time(pid: int) -> int | None:
+    """Returns when the process started, in clock ticks since the boot, or
+    `None` where `/proc` isn't available."""
+    try:
+        with open(f'/proc/{pid}/stat') as file:
+            # The fields after the parenthesized command name, of which the start time is the 20th
+            return int(file.read().rpartition(')')[2].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _snapshot_alive(snapshot: dict, metrics: RequestMetrics) -> bool:
+    """Tells if the process of the `snapshot` is running. A reused PID doesn't
+    count, as the start time, or the token for this process's PID, differs."""
+    pid = snapshot.get('pid')
+    if pid is None:
+        return False
+    if pid == os.getpid():
+        return snapshot.get('token') == metrics.token
+    if not _pid_alive(pid):
+        return False
+    return snapshot.get('started') is None or snapshot['started'] == _process_start_time(pid)
+
+
+def _read_snapshot(path: str) -> dict | None:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(path: str, snapshot: dict):
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump(snapshot, file)
+    os.replace(f'{path}.tmp', path)
+
+
+def _merge_counters(target: dict, snapshot: dict):
+    """Adds the counters of the `snapshot` to the `target` snapshot, leaving out the gauges."""
+    requests = {tuple(key): count for *key, count in target['requests']}
+    for *key, count in snapshot['requests']:
+        requests[tuple(key)] = requests.get(tuple(key), 0) + count
+    target['requests'] = [[*key, count] for key, count in requests.items()]
+
+    latency = {tuple(key): histogram for *key, histogram in target['latency']}
+    for *key, histogram in snapshot['latency']:
+        _add_histogram(latency, tuple(key), histogram)
+    target['latency'] = [[*key, histogram] for key, histogram in latency.items()]
+
+    for name, (hits, misses) in snapshot['caches'].items():
+        total = target['caches'].setdefault(name, [0, 0])
+        total[0] += hits
+        total[1] += misses
+    for bind, metrics in snapshot['pools'].items():
+        total = target['pools'].setdefault(bind, {})
+        for name in _POOL_COUNTERS:
+            if metrics.get(name) is not None:
+                total[name] = total.get(name, 0) + metrics[name]
+
+
+def compact_snapshots(directory: str, paths: list[str]):
+    """Merges the counters of the exited processes' snapshots at `paths` into
+    `EXITED_FILE_NAME`, and deletes the snapshots. Skipped while another
+    process of the directory is compacting."""
+    with open(os.path.join(directory, 'metrics.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        exited_path = os.path.join(directory, EXITED_FILE_NAME)
+        exited = _read_snapshot(exited_path) or {
+            'pid': None, 'requests': [], 'latency': [], 'caches': {}, 'pools': {}}
+        merged = []
+        for path in paths:
+            # Another process may have compacted it before the lock was taken
+            snapshot = _read_snapshot(path)
+            if snapshot is not None:
+                _merge_counters(exited, snapshot)
+                merged.append(path)
+        if merged:
+            _write_snapshot(exited_path, exited)
+        for path in merged:
+            os.remove(path)
+
+
+def collect_snapshots(app: Flask) -> list[dict]:
+    """Returns the snapshots of every worker process sharing `METRICS_DIR`,
+    including the up-to-date one of this process. The snapshots of the exited
+    processes are compacted into one, see `compact_snapshots`. Every snapshot
+    tells if its process is `alive`."""
+    directory = app.config.get('METRICS_DIR')
+    if not directory:
+        return [{**process_snapshot(app), 'alive': True}]
+    flush_metrics(app)
+    metrics = app.extensions['metrics']
+    snapshots, exited_paths = [], []
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        snapshot = _read_snapshot(path)
+        if snapshot is None:
+            continue
+        snapshot['alive'] = _snapshot_alive(snapshot, metrics)
+        snapshots.append(snapshot)
+        if not snapshot['alive'] and os.path.basename(path) != EXITED_FILE_NAME:
+            exited_paths.append(path)
+    if exited_paths:
+        compact_snapshots(directory, exited_paths)
+    return snapshots
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_metrics(snapshots: list[dict]) -> str:
+    """Renders the merged `snapshots` of `collect_snapshots` in the Prometheus
+    text format. The counters of exited processes are kept, their gauges are left out."""
+    requests: dict[tuple, int] = {}
+    latency: dict[tuple, list] = {}
+    caches: dict[str, list[int]] = {}
+    pool_counters: dict[tuple[str, str], float] = {}
+    pool_gauges: dict[tuple[str, str], float] = {}
+    pool_wait_max: dict[str, float] = {}
+    for snapshot in snapshots:
+        alive = snapshot['alive']
+        for *key, count in snapshot['requests']:
+            requests[tuple(key)] = requests.get(tuple(key), 0) + count
+        for *key, histogram in snapshot['latency']:
+            _add_histogram(latency, tuple(key), histogram)
+        for name, (hits, misses) in snapshot['caches'].items():
+            total = caches.setdefault(name, [0, 0])
+            total[0] += hits
+            total[1] += misses
+        for bind, metrics in snapshot['pools'].items():
+            for name in _POOL_COUNTERS:
+                if metrics.get(name) is not None:
+                    pool_counters[(bind, name)] = pool_counters.get((bind, name), 0) + metrics[name]
+            if not alive:
+                continue
+            for name in _POOL_GAUGES:
+                if metrics.get(name) is not None:
+                    pool_gauges[(bind, name)] = pool_gauges.get((bind, name), 0) + metrics[name]
+            if metrics.get('wait_seconds_max') is not None:
+                pool_wait_max[bind] = max(pool_wait_max.get(bind, 0), metrics['wait_seconds_max'])
+
+    lines = []
+
+    def metric(name: str, type_: str, help_: str, samples):
+        lines.append(f'# HELP {name} {help_}')
+        lines.append(f'# TYPE {name} {type_}')
+        for sample_name, labels, value in samples:
+            lines.append(f'{sample_name}{_labels(**labels)} {value}')
+
+    metric('http_requests_total', 'counter', 'Handled requests by endpoint, method and status.', (
+        ('http_requests_total', dict(blueprint=blueprint, endpoint=endpoint, method=method, status=status), count)
+        for (blueprint, endpoint, method, status), count in sorted(requests.items())))
+
+    def latency_samples():
+        for (blueprint, endpoint), histogram in sorted(latency.items()):
+            labels = dict(blueprint=blueprint, endpoint=endpoint)
+            cumulative = 0
+            for bound, count in zip([*LATENCY_BUCKETS, '+Inf'], histogram[:-1]):
+                cumulative += count
+                yield 'http_request_duration_seconds_bucket', {**labels, 'le': bound}, cumulative
+            yield 'http_request_duration_seconds_sum', labels, histogram[-1]
+            yield 'http_request_duration_seconds_count', labels, cumulative
+    metric('http_request_duration_seconds', 'histogram', 'Request latency by endpoint.', latency_samples())
+
+    metric('cache_hits_total', 'counter', 'Cache lookups that found a value.', (
+        ('cache_hits_total', dict(cache=name), hits) for name, (hits, _) in sorted(caches.items())))
+    metric('cache_misses_total', 'counter', 'Cache lookups that found nothing.', (
+        ('cache_misses_total', dict(cache=name), misses) for name, (_, misses) in sorted(caches.items())))
+    metric('cache_hit_ratio', 'gauge', 'The share of the cache lookups that found a value.', (
+        ('cache_hit_ratio', dict(cache=name), hits / (hits + misses))
+        for name, (hits, misses) in sorted(caches.items()) if hits + misses))
+
+    for type_, pool_metrics, values in (('counter', _POOL_COUNTERS, pool_counters),
+                                        ('gauge', _POOL_GAUGES, pool_gauges)):
+        for key, (name, help_) in pool_metrics.items():
+            metric(name, type_, help_, ((name, dict(bind=bind), value)
+                                        for (bind, pool_key), value in sorted(values.items()) if pool_key == key))
+    metric('db_pool_wait_seconds_max', 'gauge', 'The longest checkout of a running process.', (
+        ('db_pool_wait_seconds_max', dict(bind=bind), value) for bind, value in sorted(pool_wait_max.items())))
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app: Flask):
+    """Records every request of the `app` and serves the metrics of all its
+    worker processes at `/api/_metrics`. Register before the other request
+    hooks, so that the latency covers them."""
+    app.extensions['metrics'] = RequestMetrics()
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = perf_counter()
+
+    @app.after_request
+    def record_request(response: Response) -> Response:
+        started = g.pop('request_started', None)
+        if started is not None:
+            metrics = get_request_metrics()
+            metrics.record(request.blueprint or '', request.endpoint or 'unmatched',
+                           request.method, response.status_code, perf_counter() - started)
+            if (app.config.get('METRICS_DIR')
+                    and monotonic() - metrics.last_flush >= app.config['METRICS_FLUSH_INTERVAL']):
+                flush_metrics(app)
+        return response
+
+    def get_metrics():
+        return Response(render_metrics(collect_snapshots(app)), content_type=CONTENT_TYPE)
+    app.add_url_rule('/api/_metrics', endpoint='metrics', view_func=get_metrics, methods=['GET'])
@@ -1,4 +1,8 @@
+from datetime import datetime
+from flask import Response, request
 from slugify import slugify as py_slugify
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
 from random import randint
 from backend.utils.errors import ErrorCode, create_error_response
 
@@ -11,15 +15,87 @@ def slugify(text: str, additional_id: bool = False):
     return slug
 
 
-def generate_unique_slug(text: str, model_class) -> str:
-    slug = slugify(text)
-    # Append a unique ID, retry if the same slug exists
-    while True:
-        if model_class.query.filter_by(slug=slug).first():
-            slug = slugify(text, additional_id=True)
-        else:
-            break
-    return slug
+SLUG_ATTEMPTS = 3
+"""How many times a write is retried with a new slug if a concurrent one took it."""
+
+
+def _slug_key_filter(model_class, bases: list[str]):
+    """Matches the slugs equal to any of the `bases` or starting with `{base}-`.
+    The ranges are used instead of `LIKE`, so that the unique index is used."""
+    column = model_class.slug
+    return or_(*(or_(column == base, and_(column > f'{base}-', column < f'{base}.'))
+                 for base in bases))
+
+
+def allocate_slugs(texts: list[str], model_class, chunk_size: int = 100) -> list[str]:
+    """Returns a free slug for each of the `texts`, appending the next unused
+    numeric suffix to the taken ones (`name`, `name-2`, `name-3`, ...).
+    The used suffixes of every base slug are read with one indexed range query
+    per `chunk_size` bases, and the returned slugs are unique among themselves."""
+    default_base = model_class.__tablename__.replace('_', '-')
+    bases = [slugify(text) or default_base for text in texts]
+    unique_bases = list(dict.fromkeys(bases))
+
+    # The largest suffix used per base, where the bare base counts as 1
+    last_suffixes: dict[str, int] = {}
+    for start in range(0, len(unique_bases), chunk_size):
+        chunk = unique_bases[start:start + chunk_size]
+        chunk_set = set(chunk)
+        taken = model_class.query.with_entities(model_class.slug).filter(_slug_key_filter(model_class, chunk))
+        for (slug,) in taken:
+            # A slug like `soup-2` may be both a base and a suffixed `soup`
+            if slug in chunk_set:
+                last_suffixes[slug] = max(last_suffixes.get(slug, 0), 1)
+            prefix, _, suffix = slug.rpartition('-')
+            if prefix in chunk_set and suffix.isdigit():
+                last_suffixes[prefix] = max(last_suffixes.get(prefix, 0), int(suffix))
+
+    slugs = []
+    allocated = set()
+    for base in bases:
+        suffix = last_suffixes.get(base, 0)
+        slug = base if suffix == 0 else f'{base}-{suffix + 1}'
+        # Another base may have produced the same slug, e.g. "Soup 2" and a second "Soup"
+        while slug in allocated:
+            suffix = max(suffix, 1) + 1
+            slug = f'{base}-{suffix}'
+        last_suffixes[base] = max(suffix, 1)
+        allocated.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def allocate_slug(text: str, model_class) -> str:
+    """Returns a free slug for the `text`, see `allocate_slugs`."""
+    return allocate_slugs([text], model_class)[0]
+
+
+def is_slug_conflict(error: IntegrityError, model_class) -> bool:
+    """Tells if the `error` is a violation of the unique slug of the `model_class`,
+    rather than of any other constraint."""
+    table = model_class.__tablename__
+    diag = getattr(error.orig, 'diag', None)
+    if diag is not None:
+        # PostgreSQL names the key, e.g. `Key (slug)=(soup) already exists.`
+        return diag.table_name == table and (diag.message_detail or '').startswith('Key (slug)=')
+    return str(error.orig) == f'UNIQUE constraint failed: {table}.slug'
+
+
+def commit_with_unique_slug(db, instance, text: str, attempts: int = SLUG_ATTEMPTS):
+    """Adds the `instance` with a slug allocated from the `text`, and commits.
+    If a concurrent writer takes the same slug first, the unique constraint fails
+    and the commit is retried with a newly allocated slug. Other integrity errors
+    are raised at once."""
+    for attempt in range(attempts):
+        instance.slug = allocate_slug(text, type(instance))
+        db.session.add(instance)
+        try:
+            db.session.commit()
+            return instance
+        except IntegrityError as error:
+            db.session.rollback()
+            if attempt == attempts - 1 or not is_slug_conflict(error, type(instance)):
+                raise
 
 
 def safe_commit(db, logger):
@@ -30,4 +106,22 @@ def safe_commit(db, logger):
         return None
     except Exception as e:
         logger.exception(e)
-        return create_error_response(ErrorCode.UNKNOWN)
\ No newline at end of file
+        return create_error_response(ErrorCode.UNKNOWN)
+
+
+def make_cacheable(response: Response, etag: str, max_age: int = 0, public: bool = True):
+    """Sets the `ETag` and `Cache-Control` headers of the `response`, turning it
+    into `304 Not Modified` if the client already has the same version."""
+    response.set_etag(etag)
+    response.cache_control.public = public
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+
+def set_validators(response: Response, etag: str, last_modified: datetime):
+    """Sets the strong `ETag` and the `Last-Modified` headers of the `response`,
+    asking clients to revalidate it with a conditional request before reuse."""
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
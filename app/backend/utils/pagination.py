@@ -0,0 +1,268 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Sequence
+from flask import abort, current_app, request
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query
+from backend.utils.cache import TTLCache
+
+
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 25
+MAX_BATCH_IDS = 100
+"""How many IDs can be requested at once with the `ids` query argument."""
+
+COUNT_MODES = ('none', 'approx', 'exact')
+"""Values of the `count` query argument:
+`none` skips counting, `approx` uses a cached total, `exact` always runs `COUNT(*)`."""
+DEFAULT_COUNT_MODE = 'approx'
+
+
+@dataclass
+class KeysetPage:
+    """A page of a keyset (cursor) pagination."""
+    items: list
+    limit: int
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "limit": self.limit,
+            "next_cursor": self.next_cursor,
+            "prev_cursor": self.prev_cursor,
+        }
+
+
+def is_cursor_request() -> bool:
+    """Returns `True` if the current request asks for the cursor pagination mode."""
+    return 'cursor' in request.args or 'limit' in request.args
+
+
+def get_cursor_args(default_limit: int = DEFAULT_LIMIT) -> tuple[str | None, int]:
+    """Reads the `cursor` and `limit` query arguments of the current request,
+    aborting with `400` if the `limit` is not a number."""
+    try:
+        limit = int(request.args.get('limit', default_limit))
+    except ValueError:
+        abort(400)
+    cursor = request.args.get('cursor') or None
+    return cursor, limit
+
+
+def is_batch_request() -> bool:
+    """Returns `True` if the current request asks for the items by their IDs."""
+    return 'ids' in request.args
+
+
+def get_ids_arg(max_ids: int = MAX_BATCH_IDS) -> list[int]:
+    """Reads the comma-separated `ids` query argument of the current request,
+    without the duplicates and in the request order.
+    Raises `ValueError` if an ID is not a number, or there are none or too many."""
+    try:
+        ids = list(dict.fromkeys(int(value) for value in request.args['ids'].split(',') if value.strip()))
+    except ValueError:
+        raise ValueError('The IDs must be numbers.')
+    if not ids:
+        raise ValueError('No IDs were given.')
+    if len(ids) > max_ids:
+        raise ValueError(f'At most {max_ids} IDs can be given.')
+    return ids
+
+
+def batch_meta(ids: list[int], found_ids) -> dict:
+    """Returns the metadata of the batch response: the requested IDs that
+    are missing or hidden, in the request order."""
+    found_ids = set(found_ids)
+    return {"missing_ids": [id for id in ids if id not in found_ids]}
+
+
+def get_count_mode() -> str:
+    """Reads the `count` query argument of the current request.
+    Raises `ValueError` if it is not one of `COUNT_MODES`."""
+    count_mode = request.args.get('count', DEFAULT_COUNT_MODE).lower()
+    if count_mode not in COUNT_MODES:
+        raise ValueError(f'Unknown count mode: {count_mode}')
+    return count_mode
+
+
+def get_count_cache() -> TTLCache:
+    """Returns the cache of the list totals of the current app."""
+    cache = current_app.extensions.get('count_cache')
+    if cache is None:
+        cache = TTLCache(ttl=current_app.config.get('COUNT_CACHE_TTL', 30), maxsize=1024)
+        current_app.extensions['count_cache'] = cache
+    return cache
+
+
+def invalidate_counts(*count_keys: str):
+    """Drops the cached totals of the given lists, along with the totals of
+    their filtered views cached under `{count_key}:...`. Called by the routes
+    that add, remove or change list items."""
+    cache = get_count_cache()
+    cache.invalidate(*count_keys)
+    for count_key in count_keys:
+        cache.invalidate_prefix(f'{count_key}:')
+
+
+def paginate(query: Query, count_key: str, count_mode: str = DEFAULT_COUNT_MODE,
+             **kwargs) -> Pagination:
+    """A wrapper of `.paginate()` that fills the total according to `count_mode`,
+    caching it under `count_key`. `kwargs` are passed to `.paginate()`."""
+    pagination = query.paginate(count=False, **kwargs)
+    if count_mode == 'none':
+        return pagination
+
+    def count():
+        return query.order_by(None).count()
+
+    cache = get_count_cache()
+    if count_mode == 'exact':
+        pagination.total = count()
+        cache.set(count_key, pagination.total)
+    else:
+        pagination.total = cache.get_or_set(count_key, count)
+    return pagination
+
+
+class _FetchedPagination(Pagination):
+    """A `Pagination` of the items fetched by `async_paginate`."""
+
+    def _query_items(self) -> list:
+        return self._query_args['items']
+
+    def _query_count(self) -> int:
+        raise NotImplementedError
+
+
+async def async_paginate(session: AsyncSession, statement: Select, count_key: str,
+                         count_mode: str = DEFAULT_COUNT_MODE, page: int | None = None,
+                         per_page: int | None = None, max_per_page: int | None = 100) -> Pagination:
+    """`paginate` of an ORM `statement` run by an async `session`, with the
+    `error_out=False` handling of the page arguments."""
+    page, per_page = Pagination._prepare_page_args(page=page, per_page=per_page,
+                                                   max_per_page=max_per_page, error_out=False)
+    items = list(await session.scalars(statement.limit(per_page).offset((page - 1) * per_page)))
+    pagination = _FetchedPagination(page=page, per_page=per_page, max_per_page=max_per_page,
+                                    error_out=False, count=False, items=items)
+    if count_mode == 'none':
+        return pagination
+
+    cache = get_count_cache()
+    total = cache.get(count_key) if count_mode != 'exact' else None
+    if total is None:
+        total = await session.scalar(select(func.count()).select_from(statement.order_by(None).subquery()))
+        cache.set(count_key, total)
+    pagination.total = total
+    return pagination
+
+
+def pagination_meta(pagination: Pagination) -> dict:
+    """Returns the metadata of the page/per-page mode response.
+    `total` and `pages` are `None` if the total was not counted."""
+    counted = pagination.total is not None
+    return {
+        "page": pagination.page,
+        "per_page": pagination.per_page,
+        "total": pagination.total,
+        "pages": pagination.pages if counted else None,
+    }
+
+
+def _encode_value(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _decode_value(value: Any, column) -> Any:
+    if column.type.python_type is datetime:
+        return datetime.fromisoformat(value)
+    return column.type.python_type(value)
+
+
+def encode_cursor(direction: str, values: Sequence) -> str:
+    """Encodes the key `values` of a row into an opaque cursor string."""
+    payload = json.dumps({"d": direction, "k": [_encode_value(v) for v in values]})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> tuple[str, tuple]:
+    """Decodes a cursor created by `encode_cursor` into a direction and key values.
+    Raises `ValueError` if the cursor is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction, values = payload['d'], payload['k']
+        if direction not in ('next', 'prev') or len(values) != len(columns):
+            raise ValueError
+        return direction, tuple(_decode_value(value, column)
+                                for value, column in zip(values, columns))
+    except (ValueError, TypeError, KeyError) as exc:
+        raise ValueError('Malformed cursor.') from exc
+
+
+def _keyset_query(query, columns: Sequence, cursor: str | None, limit: int):
+    key = tuple_(*columns)
+    direction, values = ('next', None)
+    if cursor:
+        direction, values = decode_cursor(cursor, columns)
+
+    if direction == 'next':
+        if values is not None:
+            query = query.filter(key > tuple_(*values))
+        query = query.order_by(*(column.asc() for column in columns))
+    else:
+        query = query.filter(key < tuple_(*values))
+        query = query.order_by(*(column.desc() for column in columns))
+    return query.limit(limit + 1), direction, values
+
+
+def _keyset_page(items: list, columns: Sequence, direction: str, values, limit: int) -> KeysetPage:
+    has_more = len(items) > limit
+    items = items[:limit]
+    if direction == 'prev':
+        items.reverse()
+
+    page = KeysetPage(items=items, limit=limit)
+    if not items:
+        return page
+
+    def row_key(item):
+        return [getattr(item, column.key) for column in columns]
+
+    if direction == 'next':
+        has_next, has_prev = has_more, values is not None
+    else:
+        has_next, has_prev = True, has_more
+
+    if has_next:
+        page.next_cursor = encode_cursor('next', row_key(items[-1]))
+    if has_prev:
+        page.prev_cursor = encode_cursor('prev', row_key(items[0]))
+    return page
+
+
+def keyset_paginate(query: Query, columns: Sequence, cursor: str | None = None,
+                    limit: int = DEFAULT_LIMIT, max_limit: int = MAX_LIMIT) -> KeysetPage:
+    """Paginates the `query` by the unique, ascending key made of `columns`.
+
+    Unlike `.paginate()`, neither `OFFSET` nor `COUNT(*)` is used, so any page costs
+    the same as the first one. Raises `ValueError` if the `cursor` is malformed."""
+    limit = max(1, min(limit, max_limit))
+    query, direction, values = _keyset_query(query, columns, cursor, limit)
+    return _keyset_page(query.all(), columns, direction, values, limit)
+
+
+async def async_keyset_paginate(session: AsyncSession, statement: Select, columns: Sequence,
+                                cursor: str | None = None, limit: int = DEFAULT_LIMIT,
+                                max_limit: int = MAX_LIMIT) -> KeysetPage:
+    """`keyset_paginate` of an ORM `statement` run by an async `session`."""
+    limit = max(1, min(limit, max_limit))
+    statement, direction, values = _keyset_query(statement, columns, cursor, limit)
+    items = list(await session.scalars(statement))
+    return _keyset_page(items, columns, direction, values, limit)
@@ -0,0 +1,108 @@
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from threading import BoundedSemaphore, Lock
+from uuid import uuid4
+import bcrypt
+from flask import current_app, has_app_context
+from werkzeug.exceptions import ServiceUnavailable
+import config
+
+
+class PasswordHasherBusy(ServiceUnavailable):
+    description = 'Too many password operations are in progress, try again later.'
+
+
+def _hash_password(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _check_password(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+def get_hash_rounds(hashed: str) -> int | None:
+    """Returns the work factor of a bcrypt hash like `$2b$12$...`, or `None` if it can't be read."""
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded pool of worker processes, so that the hashing
+    doesn't take the CPU time of the request threads.
+
+    At most `max_pending` operations are running or queued at once; callers wait
+    up to `queue_timeout` seconds for a free slot, and get `PasswordHasherBusy`
+    otherwise. With `workers=0`, bcrypt runs inline in the calling thread."""
+
+    def __init__(self, rounds: int, workers: int, max_pending: int, queue_timeout: float):
+        self.rounds = rounds
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = BoundedSemaphore(max_pending)
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = Lock()
+        self._dummy_hashes: dict[int, str] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Spawned rather than forked, as the app may already run threads
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                atexit.register(self._executor.shutdown, wait=False, cancel_futures=True)
+            return self._executor
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordHasherBusy()
+        try:
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash_password, password.encode(), self.rounds).decode()
+
+    def check(self, password: str, hashed: str) -> bool:
+        return self._run(_check_password, password.encode(), hashed.encode())
+
+    def dummy_check(self, password: str):
+        """Checks the `password` against a hash of the configured work factor.
+        Used for the unknown users, so that they can't be told apart from the
+        known ones by the response time."""
+        dummy_hash = self._dummy_hashes.get(self.rounds)
+        if dummy_hash is None:
+            dummy_hash = self._dummy_hashes[self.rounds] = self.hash(uuid4().hex)
+        self.check(password, dummy_hash)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Returns `True` if the hash was made with a work factor other than the configured one."""
+        return get_hash_rounds(hashed) != self.rounds
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Returns the password hasher of the current app, or a default one outside of an app."""
+    if not has_app_context():
+        return PasswordHasher(rounds=config.BCRYPT_ROUNDS, workers=0,
+                              max_pending=1, queue_timeout=0)
+
+    hasher = current_app.extensions.get('password_hasher')
+    if hasher is None:
+        app_config = current_app.config
+        hasher = PasswordHasher(rounds=app_config['BCRYPT_ROUNDS'],
+                                workers=app_config['PASSWORD_HASHER_WORKERS'],
+                                max_pending=app_config['PASSWORD_HASHER_MAX_PENDING'],
+                                queue_timeout=app_config['PASSWORD_HASHER_QUEUE_TIMEOUT'])
+        current_app.extensions['password_hasher'] = hasher
+    return hasher
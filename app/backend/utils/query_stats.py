@@ -0,0 +1,95 @@
+import heapq
+from dataclasses import dataclass, field
+from logging import getLogger
+from time import perf_counter
+from flask import Flask, Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = getLogger(__name__)
+
+SLOWEST_STATEMENTS = 3
+"""How many of the slowest statements of a request are kept."""
+
+_STARTED_KEY = 'query_started'
+
+
+@dataclass
+class QueryStats:
+    """The SQL statements run while handling a request."""
+    count: int = 0
+    seconds: float = 0.0
+    slowest: list[tuple[float, str]] = field(default_factory=list)
+    """The slowest statements with their durations, as a min-heap."""
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        if len(self.slowest) < SLOWEST_STATEMENTS:
+            heapq.heappush(self.slowest, (seconds, statement))
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, statement))
+
+    def server_timing(self, statements: bool = False) -> str:
+        """Returns the value of the `Server-Timing` header, naming the slowest
+        statements too if `statements` is set."""
+        metrics = [f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries"']
+        if statements:
+            for number, (seconds, statement) in enumerate(sorted(self.slowest, reverse=True), start=1):
+                description = ' '.join(statement.split())[:80].replace('\\', '\\\\').replace('"', '\\"')
+                metrics.append(f'sql-{number};dur={seconds * 1000:.1f};desc="{description}"')
+        return ', '.join(metrics)
+
+
+def get_query_stats() -> QueryStats | None:
+    """Returns the stats of the current request, or `None` outside requests."""
+    return g.get('query_stats') if has_request_context() else None
+
+
+def _instrument(engine: Engine, slow_seconds: float | None):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_timer(connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault(_STARTED_KEY, []).append(perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_timer(connection, cursor, statement, parameters, context, executemany):
+        seconds = perf_counter() - connection.info[_STARTED_KEY].pop()
+        stats = get_query_stats()
+        if stats is not None:
+            stats.record(statement, seconds)
+        if slow_seconds is not None and seconds >= slow_seconds:
+            logger.warning('Slow query (%.1f ms) in %s: %s', seconds * 1000,
+                           request.endpoint if has_request_context() else 'no request',
+                           ' '.join(statement.split()))
+
+    @event.listens_for(engine, 'handle_error')
+    def drop_timer(context):
+        if context.connection is not None and context.connection.info.get(_STARTED_KEY):
+            context.connection.info[_STARTED_KEY].pop()
+
+
+def instrument_engine(app: Flask, engine: Engine):
+    """Records the statements of the `engine` in the stats of the requests of the
+    `app`, e.g. for an engine created after `init_query_stats`."""
+    slow_query_ms = app.config.get('SLOW_QUERY_MS')
+    _instrument(engine, slow_query_ms / 1000 if slow_query_ms is not None else None)
+
+
+def init_query_stats(app: Flask, engines):
+    """Records the query count, the total database time and the slowest
+    statements of each request on the `engines`, and sends them in the
+    `Server-Timing` header. Statements over `SLOW_QUERY_MS` are logged."""
+    for engine in engines:
+        instrument_engine(app, engine)
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def add_server_timing(response: Response) -> Response:
+        stats = get_query_stats()
+        if stats is not None:
+            response.headers.add('Server-Timing', stats.server_timing(app.config['SERVER_TIMING_STATEMENTS']))
+        return response
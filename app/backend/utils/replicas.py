@@ -0,0 +1,117 @@
+import random
+from contextlib import contextmanager
+from logging import getLogger
+from time import time
+from flask import current_app, has_request_context, request, session as client_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from backend.utils.cache import TTLCache
+
+
+logger = getLogger(__name__)
+
+REPLICA_BIND_PREFIX = 'replica-'
+"""The prefix of the `SQLALCHEMY_BINDS` keys of the replicas."""
+LAST_WRITE_KEY = '_last_write'
+"""The client session key holding the time of the last commit made by the client."""
+
+_POSTGRESQL_LAG = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END")
+
+
+def replica_reads(view):
+    """Marks a read-only view, whose queries may be served by a replica."""
+    view.replica_reads = True
+    return view
+
+
+def measure_replica_lag(engine: Engine) -> float | None:
+    """Returns how many seconds the replica is behind the primary, or `None`
+    if it can't be reached. Databases other than PostgreSQL report no lag."""
+    try:
+        with engine.connect() as connection:
+            if engine.dialect.name == 'postgresql':
+                return float(connection.execute(_POSTGRESQL_LAG).scalar_one())
+            connection.execute(text('SELECT 1'))
+            return 0.0
+    except SQLAlchemyError as error:
+        logger.warning('Replica %s is unavailable: %s', engine.url.render_as_string(), error)
+        return None
+
+
+def _get_lag_cache() -> TTLCache:
+    cache = current_app.extensions.get('replica_lag')
+    if cache is None:
+        cache = TTLCache(ttl=current_app.config['REPLICA_LAG_CHECK_INTERVAL'])
+        current_app.extensions['replica_lag'] = cache
+    return cache
+
+
+def get_healthy_replicas(engines: dict) -> list[Engine]:
+    """Returns the replica engines whose lag, checked at most once per
+    `REPLICA_LAG_CHECK_INTERVAL` seconds, is within `REPLICA_MAX_LAG_SECONDS`."""
+    cache = _get_lag_cache()
+    max_lag = current_app.config['REPLICA_MAX_LAG_SECONDS']
+    healthy = []
+    for key, engine in engines.items():
+        if not isinstance(key, str) or not key.startswith(REPLICA_BIND_PREFIX):
+            continue
+        lag = cache.get_or_set(key, lambda: measure_replica_lag(engine))
+        if lag is not None and lag <= max_lag:
+            healthy.append(engine)
+    return healthy
+
+
+def _wrote_recently() -> bool:
+    last_write = client_session.get(LAST_WRITE_KEY)
+    return last_write is not None and time() - last_write < current_app.config['READ_YOUR_WRITES_SECONDS']
+
+
+class RoutingSession(Session):
+    """Sends the reads of the views marked with `replica_reads` to a healthy
+    replica, and everything else to the primary. The reads of a client stay on
+    the primary for `READ_YOUR_WRITES_SECONDS` after its last commit, and when
+    no replica is healthy. The replica is picked once per session, which lasts
+    a request, so that the reads of a request see the same replica."""
+
+    def _reads_from_replica(self, clause) -> bool:
+        if self._flushing or self.info.get('primary') or not has_request_context():
+            return False
+        if clause is not None and getattr(clause, 'is_dml', False):
+            return False
+        view = current_app.view_functions.get(request.endpoint)
+        return getattr(view, 'replica_reads', False) and not _wrote_recently()
+
+    def _replica(self) -> Engine | None:
+        if 'replica' not in self.info:
+            replicas = get_healthy_replicas(self._db.engines)
+            self.info['replica'] = random.choice(replicas) if replicas else None
+        return self.info['replica']
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            replica = self._replica()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(session: RoutingSession):
+    if has_request_context() and any(isinstance(key, str) and key.startswith(REPLICA_BIND_PREFIX)
+                                     for key in session._db.engines):
+        client_session[LAST_WRITE_KEY] = time()
+
+
+@contextmanager
+def on_primary(session):
+    """Sends every query of the `session` to the primary within the block, e.g.
+    to fill the caches that must not hold stale replica data."""
+    session.info['primary'] = session.info.get('primary', 0) + 1
+    try:
+        yield
+    finally:
+        session.info['primary'] -= 1
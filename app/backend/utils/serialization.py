@@ -0,0 +1,44 @@
+from functools import lru_cache
+from typing import Any, Iterable
+from flask import Response, current_app
+from pydantic import BaseModel, TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def get_type_adapter(type_: Any) -> TypeAdapter:
+    """Returns the `TypeAdapter` of the `type_`, built once per process."""
+    return TypeAdapter(type_)
+
+
+def to_schema(schema: type[BaseModel], obj: Any) -> BaseModel:
+    """Validates an ORM object with the `schema`."""
+    return schema.model_validate(obj, from_attributes=True)
+
+
+def to_schema_list(schema: type[BaseModel], objs: Iterable) -> list[BaseModel]:
+    """Validates the ORM objects with the `schema`, in a single `TypeAdapter` call."""
+    return get_type_adapter(list[schema]).validate_python(list(objs), from_attributes=True)
+
+
+def dump_json(data: Any) -> bytes:
+    """Serializes the `data` straight to JSON bytes. The schemas in it are
+    dumped by their own pydantic serializers, without building the dicts first."""
+    return get_type_adapter(Any).dump_json(data)
+
+
+def json_response(data: Any, status: int = 200) -> Response:
+    """A faster `jsonify()` for the data made of schemas, dicts, lists and scalars."""
+    return current_app.response_class(dump_json(data), status=status, mimetype='application/json')
+
+
+def schema_response(schema: type[BaseModel], obj: Any, status: int = 200) -> Response:
+    """Returns the ORM object serialized with the `schema`."""
+    return current_app.response_class(get_type_adapter(schema).dump_json(to_schema(schema, obj)),
+                                      status=status, mimetype='application/json')
+
+
+def list_response(schema: type[BaseModel], objs: Iterable, key: str, meta: dict,
+                  status: int = 200) -> Response:
+    """Returns a list envelope: the pagination `meta`, and the ORM objects
+    serialized with the `schema` under the `key`."""
+    return json_response({**meta, key: to_schema_list(schema, objs)}, status=status)
@@ -0,0 +1,86 @@
+import re
+from collections import deque
+from threading import Condition, get_ident
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError
+
+
+_WRITE_STATEMENT = re.compile(r'\s*(INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+_WRITER_KEY = 'holds_writer_queue'
+
+
+class WriterQueue:
+    """Lets one thread at a time write to an SQLite database, in the order the
+    threads asked, instead of having them race for the file lock. A thread
+    already holding the queue may take it again, e.g. with a second session."""
+
+    def __init__(self):
+        self._condition = Condition()
+        self._waiting = deque()
+        self._owner = None
+        self._depth = 0
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        """Waits at most `timeout` seconds for the turn of the current thread.
+        Returns whether it got it."""
+        thread = get_ident()
+        with self._condition:
+            if self._owner == thread:
+                self._depth += 1
+                return True
+            ticket = object()
+            self._waiting.append(ticket)
+            if not self._condition.wait_for(
+                    lambda: self._owner is None and self._waiting[0] is ticket, timeout):
+                self._waiting.remove(ticket)
+                self._condition.notify_all()
+                return False
+            self._waiting.popleft()
+            self._owner, self._depth = thread, 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self._depth -= 1
+            if self._depth == 0:
+                self._owner = None
+                self._condition.notify_all()
+
+
+def configure_sqlite(engine: Engine, settings: dict):
+    """Applies the pragmas and `busy_timeout` of the SQLite profile to every new
+    connection of the `engine` and, with `single_writer`, serializes its write
+    transactions through a `WriterQueue`. In-memory databases are left as they are."""
+    if engine.url.database in (None, '', ':memory:'):
+        return
+
+    pragmas = dict(settings['pragmas'])
+    if settings['busy_timeout'] is not None:
+        pragmas['busy_timeout'] = settings['busy_timeout']
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    if not settings['single_writer']:
+        return
+    queue = WriterQueue()
+    timeout = settings['busy_timeout'] / 1000 if settings['busy_timeout'] is not None else None
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def wait_for_turn(connection, cursor, statement, parameters, context, executemany):
+        # The driver begins the transaction right before its first write
+        if not connection.info.get(_WRITER_KEY) and _WRITE_STATEMENT.match(statement):
+            if not queue.acquire(timeout):
+                raise TimeoutError(f'Waited over {timeout} seconds for the turn to write to the database.')
+            connection.info[_WRITER_KEY] = True
+
+    @event.listens_for(engine, 'checkin')
+    def end_turn(dbapi_connection, connection_record):
+        # The returned connection has committed or is rolled back by the pool
+        if connection_record is not None and connection_record.info.pop(_WRITER_KEY, False):
+            queue.release()
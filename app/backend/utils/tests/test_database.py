@@ -0,0 +1,109 @@
+import threading
+import pytest
+from sqlalchemy import create_engine, text
+from app_factory import db
+from backend.utils.database import (
+    DatabaseConfigError,
+    MeteredQueuePool,
+    build_engine_options,
+    get_database_settings,
+    get_pool_metrics,
+    setup_engine,
+)
+from backend.utils.sqlite import WriterQueue
+
+
+def test_postgresql_profile():
+    url, settings = get_database_settings({
+        'SQLALCHEMY_DATABASE_URI': 'postgres://recipes:secret@db/recipes',
+        'DB_POOL_SIZE': '20',
+        'DB_POOL_PRE_PING': 'false',
+        'DB_STATEMENT_TIMEOUT_MS': '5000',
+    })
+    assert url == 'postgresql+psycopg://recipes:secret@db/recipes'
+
+    options = build_engine_options(url, settings)
+    assert options['poolclass'] is MeteredQueuePool
+    assert (options['pool_size'], options['max_overflow']) == (20, 10)
+    assert options['pool_pre_ping'] is False
+    assert options['connect_args'] == {'prepare_threshold': 5, 'options': '-c statement_timeout=5000'}
+
+
+@pytest.mark.parametrize('config', [
+    {'SQLALCHEMY_DATABASE_URI': 'not a url'},
+    {'SQLALCHEMY_DATABASE_URI': 'mysql://db/recipes'},
+    {'SQLALCHEMY_DATABASE_URI': 'postgresql+psycopg2://db/recipes'},
+    {'SQLALCHEMY_DATABASE_URI': 'sqlite:///dev.db', 'DB_POOL_SIZE': '0'},
+    {'SQLALCHEMY_DATABASE_URI': 'sqlite:///dev.db', 'DB_POOL_TIMEOUT': 'soon'},
+    {'SQLALCHEMY_DATABASE_URI': 'sqlite:///dev.db', 'DB_POOL_PRE_PING': 'maybe'},
+])
+def test_invalid_database_settings(config):
+    with pytest.raises(DatabaseConfigError):
+        get_database_settings(config)
+
+
+def test_pool_metrics(app, client):
+    client.get('/api/recipes')
+    metrics = get_pool_metrics(db.engine)
+    assert metrics['pool_class'] == 'MeteredQueuePool'
+    assert metrics['checkouts'] >= 1
+    assert metrics['checkout_timeouts'] == 0
+    assert metrics['wait_seconds_max'] >= 0
+
+
+def test_sqlite_profile(tmp_path):
+    url, settings = get_database_settings({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'profile.db'}",
+        'DB_BUSY_TIMEOUT_MS': '2000',
+    })
+    engine = create_engine(url, **build_engine_options(url, settings))
+    setup_engine(engine, settings)
+    with engine.connect() as connection:
+        assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert connection.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+        assert connection.execute(text('PRAGMA busy_timeout')).scalar() == 2000
+
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE item (id INTEGER PRIMARY KEY, thread INTEGER)'))
+    errors = []
+
+    def write(number: int):
+        try:
+            for _ in range(20):
+                with engine.begin() as connection:
+                    connection.execute(text('INSERT INTO item (thread) VALUES (:n)'), {'n': number})
+                    connection.execute(text('UPDATE item SET thread = thread WHERE thread = :n'), {'n': number})
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=write, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with engine.connect() as connection:
+        assert connection.execute(text('SELECT count(*) FROM item')).scalar() == 160
+    engine.dispose()
+
+
+def test_writer_queue():
+    queue = WriterQueue()
+    assert queue.acquire()
+    assert queue.acquire()  # Reentrant in the same thread
+    results = []
+
+    def acquire(timeout: float):
+        results.append(queue.acquire(timeout))
+
+    thread = threading.Thread(target=acquire, args=(0.05,))
+    thread.start()
+    thread.join()
+    assert results == [False]
+
+    thread = threading.Thread(target=acquire, args=(5,))
+    thread.start()
+    queue.release()
+    queue.release()
+    thread.join()
+    assert results == [False, True]
@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+from flask.testing import FlaskClient
+from app_factory import db
+from backend.utils.database import get_pool_metrics
+from backend.utils.metrics import LATENCY_BUCKETS, RequestMetrics
+
+
+def _samples(text: str) -> dict[str, float]:
+    return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in text.splitlines() if not line.startswith('#')}
+
+
+def test_metrics_endpoint(client: FlaskClient, test_recipes):
+    for _ in range(3):
+        client.get('/api/recipes')
+    client.get('/api/recipes/0')
+
+    response = client.get('/api/_metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    samples = _samples(response.get_data(as_text=True))
+
+    labels = 'blueprint="recipes",endpoint="recipes.get_recipe_list"'
+    assert samples[f'http_requests_total{{{labels},method="GET",status="200"}}'] == 3
+    assert samples['http_requests_total{blueprint="recipes",endpoint="recipes.get_recipe",method="GET",status="404"}'] == 1
+    assert samples[f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'] == 3
+    assert samples[f'http_request_duration_seconds_count{{{labels}}}'] == 3
+    assert samples['cache_hits_total{cache="count_cache"}'] == 2
+    assert samples['cache_hit_ratio{cache="count_cache"}'] == 2 / 3
+    pool = get_pool_metrics(db.engine)
+    assert samples['db_pool_checkouts_total{bind="default"}'] == pool['checkouts'] >= 1
+    assert samples['db_pool_checked_out{bind="default"}'] == pool['checked_out']
+
+
+def test_thread_accumulators():
+    metrics = RequestMetrics()
+
+    def record():
+        for _ in range(100):
+            metrics.record('recipes', 'recipes.get_recipe', 'GET', 200, 0.02)
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics.record('recipes', 'recipes.get_recipe', 'GET', 200, 20)
+
+    snapshot = metrics.snapshot()
+    assert snapshot['requests'] == [['recipes', 'recipes.get_recipe', 'GET', '200', 401]]
+    [[_, _, histogram]] = snapshot['latency']
+    assert histogram[LATENCY_BUCKETS.index(0.025)] == 400
+    assert histogram[len(LATENCY_BUCKETS)] == 1
+    assert round(histogram[-1], 6) == 28
+
+
+def test_metrics_across_processes(app, client: FlaskClient, tmp_path):
+    app.config['METRICS_DIR'] = str(tmp_path)
+    other_worker = {
+        'pid': os.getppid(),
+        'requests': [['users', 'users.get_user_list', 'GET', '200', 5]],
+        'latency': [['users', 'users.get_user_list', [5] + [0] * len(LATENCY_BUCKETS) + [0.01]]],
+        'caches': {'user_cache': [7, 3]},
+        'pools': {'default': {'checkouts': 10, 'checked_out': 2}},
+    }
+    exited_worker = {**other_worker, 'pid': 2 ** 22 + 1, 'pools': {'default': {'checkouts': 1, 'checked_out': 9}}}
+    # An exited worker whose PID was reused by a running process
+    reused_pid_worker = {**exited_worker, 'pid': os.getppid(), 'started': -1}
+    (tmp_path / 'metrics-other.json').write_text(json.dumps(other_worker))
+    (tmp_path / 'metrics-dead.json').write_text(json.dumps(exited_worker))
+    (tmp_path / 'metrics-reused.json').write_text(json.dumps(reused_pid_worker))
+
+    client.get('/api/users')
+    for _ in range(2):
+        samples = _samples(client.get('/api/_metrics').get_data(as_text=True))
+        assert samples['http_requests_total{blueprint="users",endpoint="users.get_user_list",method="GET",status="200"}'] == 16
+        assert samples['cache_hits_total{cache="user_cache"}'] == 21
+        # The gauges of exited processes are left out, their counters are kept
+        pool = get_pool_metrics(db.engine)
+        assert samples['db_pool_checked_out{bind="default"}'] == pool['checked_out'] + 2
+        assert samples['db_pool_checkouts_total{bind="default"}'] == pool['checkouts'] + 12
+
+    # The exited processes are merged into one file
+    assert {path.name for path in tmp_path.glob('metrics-*.json')} == {
+        'metrics-exited.json', 'metrics-other.json', app.extensions['metrics'].file_name}
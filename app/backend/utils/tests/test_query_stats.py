@@ -0,0 +1,48 @@
+import logging
+import re
+from flask.testing import FlaskClient
+from app_factory import create_app, db
+from backend.utils import query_stats
+from backend.utils.query_stats import QueryStats
+import config
+
+
+def test_server_timing(app, client: FlaskClient, test_recipes):
+    response = client.get('/api/recipes')
+    assert response.status_code == 200
+    assert re.fullmatch(r'db;dur=\d+\.\d;desc="\d+ queries"', response.headers['Server-Timing'])
+
+    app.config['SERVER_TIMING_STATEMENTS'] = True
+    response = client.get('/api/recipes')
+    metrics = response.headers['Server-Timing'].split(', ')
+    assert metrics[1].startswith('sql-1;dur=') and 'SELECT' in metrics[1]
+
+
+def test_slowest_statements():
+    stats = QueryStats()
+    for number in range(10):
+        stats.record(f'SELECT {number}', number / 1000)
+    assert stats.count == 10
+    assert round(stats.seconds, 3) == 0.045
+    assert sorted(stats.slowest, reverse=True) == [(0.009, 'SELECT 9'), (0.008, 'SELECT 8'), (0.007, 'SELECT 7')]
+    assert 'sql-1;dur=9.0;desc="SELECT 9"' in stats.server_timing(statements=True)
+
+
+def test_slow_query_log(tmp_path, caplog):
+    app = create_app(config_object=config, overrides={
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'slow.db'}",
+        "SLOW_QUERY_MS": 0,
+    })
+    query_stats.logger.addHandler(caplog.handler)
+    try:
+        with app.app_context():
+            db.create_all()
+            caplog.clear()
+            app.test_client().get('/api/recipes')
+            db.session.remove()
+    finally:
+        query_stats.logger.removeHandler(caplog.handler)
+    assert caplog.records
+    assert all(record.levelno == logging.WARNING for record in caplog.records)
+    assert 'in recipes.get_recipe_list: SELECT' in caplog.records[-1].getMessage()
@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from app_factory import create_app, db
+from backend.users.models import User
+from backend.utils import replicas
+import config
+
+
+TEST_PASSWORD = 'r3p[avn!f;1cFGKDS'
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """An app with a primary and a replica in two SQLite files, which hold the
+    same user under different names to tell which database answered."""
+    overrides = {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+        "SQLALCHEMY_REPLICA_URIS": [f"sqlite:///{tmp_path / 'replica.db'}"],
+        "BCRYPT_ROUNDS": 4,
+        "PASSWORD_HASHER_WORKERS": 0,
+    }
+    app = create_app(config_object=config, overrides=overrides)
+
+    with app.app_context():
+        db.create_all()
+        replica = db.engines['replica-0']
+        db.metadata.create_all(replica)
+        db.session.add(User(id=1, name='On primary', email='user@test.com', password='-'))
+        db.session.commit()
+        with Session(replica) as session:
+            session.add(User(id=1, name='On replica', email='user@test.com', password='-'))
+            session.commit()
+        yield app
+        db.session.remove()
+
+
+def test_reads_go_to_replica(replica_app):
+    client = replica_app.test_client()
+    response = client.get('/api/users/1')
+    assert response.status_code == 200
+    assert response.json['name'] == 'On replica'
+
+
+def test_read_your_writes(replica_app):
+    client = replica_app.test_client()
+    response = client.post('/api/users', json={
+        "name": "New User",
+        "email": "new@test.com",
+        "password": TEST_PASSWORD,
+        "password_confirm": TEST_PASSWORD,
+    })
+    assert response.status_code == 200
+    with Session(db.engines['replica-0']) as session:
+        assert session.scalar(select(func.count()).select_from(User)) == 1
+
+    # The writing client reads from the primary, the others from the replica
+    assert client.get('/api/users/1').json['name'] == 'On primary'
+    assert replica_app.test_client().get('/api/users/1').json['name'] == 'On replica'
+
+
+def test_lagging_replica_is_skipped(replica_app, monkeypatch):
+    monkeypatch.setattr(replicas, 'measure_replica_lag', lambda engine: 60.0)
+    replica_app.extensions.pop('replica_lag', None)
+
+    response = replica_app.test_client().get('/api/users/1')
+    assert response.json['name'] == 'On primary'
+
+
+def test_replica_picked_once_per_session(replica_app, monkeypatch):
+    picks = []
+    monkeypatch.setattr(replicas.random, 'choice', lambda engines: picks.append(engines) or engines[0])
+    statements = []
+    event.listen(db.engines['replica-0'], 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+
+    # After the lag check, the page and its total are read from the same replica
+    response = replica_app.test_client().get('/api/users')
+    assert response.json['total'] == 1
+    assert len(statements) == 3 and all('FROM user' in statement for statement in statements[1:])
+    assert len(picks) == 1
@@ -0,0 +1,134 @@
+"""Compares the throughput of the WSGI mode (the threaded Werkzeug server) and
+the ASGI mode (`asgi.py` under uvicorn) with many concurrent clients. The ASGI
+mode is measured with every route in the thread pool, and with the async reads.
+
+Run from the `app` directory: `python -m benchmarks.concurrency [--concurrency N] [--requests N]`.
+The ASGI modes are skipped if uvicorn or aiosqlite is not installed."""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from werkzeug.serving import make_server
+from app_factory import create_app, db
+
+
+PATHS = ('/api/recipes', '/api/recipes?limit=10', '/api/recipes/1', '/api/users', '/api/users/1')
+
+
+def seed(app, recipes: int):
+    from sqlalchemy import insert
+    from backend.recipes.models import PeriodType, Recipe
+    from backend.users.models import User
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, name='author', email='author@example.com', password='-'))
+        db.session.add(PeriodType(id=1, name='Dinner', slug='dinner'))
+        db.session.execute(insert(Recipe), [
+            {'name': f'Recipe {i}', 'slug': f'recipe-{i}', 'author_id': 1, 'period_type_id': 1,
+             'calories': 500, 'cooking_time': 30, 'ingredients': '2 eggs, flour, milk',
+             'text': 'Mix and bake. ' * 40}
+            for i in range(1, recipes + 1)])
+        db.session.commit()
+
+
+async def fetch(port: int, path: str) -> float:
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    if b' 200 ' not in status_line:
+        raise RuntimeError(f'{path}: {status_line.decode().strip()}')
+    return time.perf_counter() - started
+
+
+async def load(port: int, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(number: int) -> float:
+        async with semaphore:
+            return await fetch(port, PATHS[number % len(PATHS)])
+
+    started = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*(one(number) for number in range(requests))))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests_per_second': requests / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def run_wsgi(app, port: int, args) -> dict:
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        return asyncio.run(load(port, args.requests, args.concurrency))
+    finally:
+        server.shutdown()
+
+
+def run_asgi(app, port: int, args, async_views: bool = False) -> dict | None:
+    try:
+        import aiosqlite
+        import uvicorn
+    except ImportError:
+        return None
+    from backend.utils.asgi import AsyncViewsASGI, WSGIThreadPoolASGI
+    import backend.recipes.async_views
+    import backend.users.async_views
+
+    asgi_class = AsyncViewsASGI if async_views else WSGIThreadPoolASGI
+    asgi_app = asgi_class(app, threads=app.config['ASGI_THREADS'])
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host='127.0.0.1', port=port,
+                                           log_level='warning', backlog=args.concurrency))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        return asyncio.run(load(port, args.requests, args.concurrency))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def run_asgi_async(app, port: int, args) -> dict | None:
+    return run_asgi(app, port, args, async_views=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=200, help='clients at once')
+    parser.add_argument('--requests', type=int, default=4000, help='requests per mode')
+    parser.add_argument('--recipes', type=int, default=1000, help='recipes in the database')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(overrides={
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'bench.db')}",
+            'PASSWORD_HASHER_WORKERS': 0,
+        })
+        seed(app, args.recipes)
+
+        for mode, run in (('WSGI', run_wsgi), ('ASGI threads', run_asgi), ('ASGI async', run_asgi_async)):
+            result = run(app, args.port, args)
+            if result is None:
+                print(f'{mode}: skipped, uvicorn or aiosqlite is not installed')
+                continue
+            print(f"{mode:12}: {result['requests_per_second']:8.1f} req/s, "
+                  f"p50 {result['p50_ms']:7.1f} ms, p95 {result['p95_ms']:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
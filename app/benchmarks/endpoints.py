@@ -0,0 +1,434 @@
+"""Measures the latency and the SQL queries of every route of the `recipes` and
+`users` blueprints through `app.test_client()`, on a database seeded with large
+volumes of users, recipes and likes.
+
+Run from the `app` directory: `python -m benchmarks.endpoints [--recipes N] [--likes N] [--users N]`.
+The results are saved as JSON in `benchmarks/results/`, named after the current commit,
+and `--compare OLD.json` prints the changes against an earlier run. The seeded data only
+depends on the volumes and `--seed`, so the runs of different commits can be compared. Without `--database-url`
+a fresh SQLite database is seeded in a temporary directory; a given database is seeded
+only if it has no users yet. Passwords are hashed with the lowest work factor, so the
+login and registration times leave out most of the hashing."""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import tempfile
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from typing import Callable
+from uuid import uuid4
+from flask import g, request_finished
+from flask.testing import FlaskClient
+from sqlalchemy import func, insert, select
+from app_factory import create_app, db
+
+
+INGREDIENTS = (
+    'egg', 'flour', 'milk', 'butter', 'sugar', 'salt', 'pepper', 'onion', 'garlic', 'tomato',
+    'potato', 'carrot', 'rice', 'chicken', 'beef', 'pork', 'cheese', 'cream', 'basil', 'parsley',
+    'lemon', 'apple', 'honey', 'yeast', 'spinach', 'mushroom', 'pasta', 'bean', 'lentil', 'ginger',
+    'cinnamon', 'vanilla', 'oat', 'yogurt', 'salmon', 'shrimp', 'cucumber', 'pumpkin', 'walnut', 'paprika',
+)
+PERIOD_TYPES = ('Breakfast', 'Lunch', 'Dinner', 'Snack')
+TAGS = 50
+PASSWORD = 'r3p[avn!f;1cFGKDS'
+CHUNK = 10000
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+"""Where the results are saved without `--output`. It's ignored by git."""
+
+
+def seed(volumes: dict, rng: random.Random):
+    """Inserts `volumes['users']` users, the first a superuser, and
+    `volumes['recipes']` recipes with their tags, ingredient tokens and
+    `volumes['likes']` likes."""
+    from backend.recipes.ingredients import tokenize_ingredients
+    from backend.recipes.models import Like, PeriodType, Recipe, RecipeIngredient, RecipeTag, recipe_tag_association
+    from backend.users.models import User
+    from backend.utils.passwords import get_password_hasher
+
+    users, recipes = volumes['users'], volumes['recipes']
+    started_on = datetime(2024, 1, 1)
+    password = get_password_hasher().hash(PASSWORD)
+
+    def insert_chunks(target, rows):
+        rows = list(rows)
+        for start in range(0, len(rows), CHUNK):
+            db.session.execute(insert(target), rows[start:start + CHUNK])
+            db.session.commit()
+
+    insert_chunks(User, ({'id': i, 'name': f'User {i}', 'email': f'user{i}@example.com', 'password': password,
+                          'is_superuser': i == 1, 'created_on': started_on + timedelta(minutes=i)}
+                         for i in range(1, users + 1)))
+    insert_chunks(PeriodType, ({'id': i, 'name': name, 'slug': name.lower()}
+                               for i, name in enumerate(PERIOD_TYPES, start=1)))
+    insert_chunks(RecipeTag, ({'id': i, 'name': f'Tag {i}', 'slug': f'tag-{i}'} for i in range(1, TAGS + 1)))
+
+    # Every user likes the same number of distinct recipes
+    likes = []
+    for user_id in range(1, users + 1):
+        count = min(volumes['likes'] // users + (user_id <= volumes['likes'] % users), recipes)
+        likes.extend((user_id, recipe_id) for recipe_id in rng.sample(range(1, recipes + 1), count))
+    like_counts = Counter(recipe_id for _, recipe_id in likes)
+
+    for start in range(1, recipes + 1, CHUNK):
+        rows, tag_rows, token_rows = [], [], []
+        for i in range(start, min(start + CHUNK, recipes + 1)):
+            ingredients = ', '.join(f'{rng.randint(1, 5)} {word}' for word in rng.sample(INGREDIENTS, rng.randint(4, 9)))
+            created_on = started_on + timedelta(minutes=i)
+            rows.append({'id': i, 'name': f'Recipe {i}', 'slug': f'recipe-{i}', 'author_id': rng.randint(1, users),
+                         'calories': rng.randint(100, 1500), 'cooking_time': rng.randint(5, 180),
+                         'period_type_id': rng.randint(1, len(PERIOD_TYPES)), 'ingredients': ingredients,
+                         'text': f'Mix the {ingredients} and cook. ' * 5, 'is_published': True,
+                         'created_on': created_on, 'last_updated': created_on, 'like_count': like_counts[i]})
+            tag_rows.extend({'recipe_id': i, 'tag_id': tag_id} for tag_id in rng.sample(range(1, TAGS + 1), 3))
+            token_rows.extend({'recipe_id': i, 'token': token} for token in tokenize_ingredients(ingredients))
+        db.session.execute(insert(Recipe), rows)
+        db.session.execute(insert(recipe_tag_association), tag_rows)
+        db.session.execute(insert(RecipeIngredient), token_rows)
+        db.session.commit()
+
+    insert_chunks(Like, ({'user_id': user_id, 'recipe_id': recipe_id, 'created_on': started_on}
+                         for user_id, recipe_id in likes))
+
+
+def count_rows() -> dict:
+    from backend.recipes.models import Like, Recipe
+    from backend.users.models import User
+    return {name: db.session.scalar(select(func.count()).select_from(model))
+            for name, model in (('users', User), ('recipes', Recipe), ('likes', Like))}
+
+
+@dataclass
+class Bench:
+    """The state shared by the scenarios of a run."""
+    app: object
+    client: FlaskClient
+    """Logged in as the superuser."""
+    rng: random.Random
+    volumes: dict
+    token: str = field(default_factory=lambda: uuid4().hex[:8])
+    created: dict[str, list[int]] = field(default_factory=lambda: defaultdict(list))
+    """The IDs of the objects created by the scenarios, by kind, for the scenarios deleting them."""
+    sequence: int = 0
+    last_query_count: int = 0
+
+    def next(self) -> int:
+        self.sequence += 1
+        return self.sequence
+
+    def take(self, kind: str) -> int:
+        if not self.created[kind]:
+            raise RuntimeError(f'No {kind} are left to delete; the scenario creating them runs first.')
+        return self.created[kind].pop()
+
+    def login(self, client: FlaskClient, user_id: int) -> FlaskClient:
+        response = client.post('/api/auth/login', json={'email': f'user{user_id}@example.com', 'password': PASSWORD})
+        if response.status_code != 200:
+            raise RuntimeError(f'Logging in failed: {response.get_data(as_text=True)}')
+        return client
+
+    def recipe_id(self) -> int:
+        return self.rng.randint(1, self.volumes['recipes'])
+
+    def user_id(self) -> int:
+        return self.rng.randint(1, self.volumes['users'])
+
+    def recipe_payload(self, tags: bool = True) -> dict:
+        return {'name': f'Bench recipe {self.token} {self.next()}', 'calories': self.rng.randint(100, 1500),
+                'cooking_time': self.rng.randint(5, 180), 'period_type_id': self.rng.randint(1, len(PERIOD_TYPES)),
+                'ingredients': ', '.join(self.rng.sample(INGREDIENTS, 6)), 'text': 'Mix and cook. ' * 20,
+                'tags': self.rng.sample(range(1, TAGS + 1), 3) if tags else []}
+
+
+@dataclass(frozen=True)
+class Scenario:
+    endpoint: str
+    method: str
+    make: Callable[[Bench], tuple[FlaskClient, str, dict]]
+    """Returns the client, the path and the other `client.open()` arguments of
+    the next request. Runs before the timer starts."""
+    keep: str | None = None
+    """The kind of the object created by the request, whose ID is kept in `Bench.created`."""
+
+
+SCENARIOS: list[Scenario] = []
+
+
+def scenario(endpoint: str, method: str = 'GET', keep: str | None = None):
+    def register(make):
+        SCENARIOS.append(Scenario(endpoint, method, make, keep))
+        return make
+    return register
+
+
+@scenario('recipes.get_recipe_list')
+def _(bench):
+    return bench.client, f'/api/recipes?page={bench.rng.randint(1, 100)}&per-page=25', {}
+
+
+@scenario('recipes.search_recipe_list')
+def _(bench):
+    return bench.client, f'/api/recipes/search?q={bench.rng.choice(INGREDIENTS)}&per-page=25', {}
+
+
+@scenario('recipes.get_top_recipe_list')
+def _(bench):
+    return bench.client, '/api/recipes/top?limit=25', {}
+
+
+@scenario('recipes.get_recipe_list_by_ingredients')
+def _(bench):
+    return bench.client, f"/api/recipes/by-ingredients?ingredients={','.join(bench.rng.sample(INGREDIENTS, 3))}", {}
+
+
+@scenario('recipes.get_recipe')
+def _(bench):
+    return bench.client, f'/api/recipes/{bench.recipe_id()}', {}
+
+
+@scenario('recipes.create_recipe', 'POST', keep='recipes')
+def _(bench):
+    # The single create route doesn't take tag IDs yet
+    return bench.client, '/api/recipes', {'json': bench.recipe_payload(tags=False)}
+
+
+@scenario('recipes.create_recipes_bulk', 'POST')
+def _(bench):
+    return bench.client, '/api/recipes/bulk', {'json': [bench.recipe_payload() for _ in range(10)]}
+
+
+@scenario('recipes.edit_recipe', 'PUT')
+def _(bench):
+    return bench.client, f'/api/recipes/{bench.recipe_id()}', {'json': {'calories': bench.rng.randint(100, 1500)}}
+
+
+@scenario('recipes.update_recipes_bulk', 'PATCH')
+def _(bench):
+    ids = bench.rng.sample(range(1, bench.volumes['recipes'] + 1), min(10, bench.volumes['recipes']))
+    return bench.client, '/api/recipes/bulk', {'json': [{'id': id, 'calories': bench.rng.randint(100, 1500)}
+                                                        for id in ids]}
+
+
+@scenario('recipes.delete_recipe', 'DELETE')
+def _(bench):
+    return bench.client, f"/api/recipes/{bench.take('recipes')}", {}
+
+
+@scenario('recipes.create_recipe_like', 'POST')
+def _(bench):
+    recipe_id = bench.recipe_id()
+    bench.created['likes'].append(recipe_id)
+    return bench.client, f'/api/recipes/{recipe_id}/like', {}
+
+
+@scenario('recipes.delete_recipe_like', 'DELETE')
+def _(bench):
+    return bench.client, f"/api/recipes/{bench.take('likes')}/like", {}
+
+
+@scenario('recipes.get_recipe_tag_list')
+def _(bench):
+    return bench.client, '/api/recipe-tags', {}
+
+
+@scenario('recipes.get_recipe_tag')
+def _(bench):
+    return bench.client, f'/api/recipe-tags/{bench.rng.randint(1, TAGS)}', {}
+
+
+@scenario('recipes.create_recipe_tag', 'POST', keep='tags')
+def _(bench):
+    return bench.client, '/api/recipe-tags', {'json': {'name': f'Bench tag {bench.token} {bench.next()}'}}
+
+
+@scenario('recipes.update_recipe_tag', 'PUT')
+def _(bench):
+    tag_id = bench.rng.choice(bench.created['tags'])
+    return bench.client, f'/api/recipe-tags/{tag_id}', {'json': {'name': f'Bench tag {bench.token} {bench.next()}'}}
+
+
+@scenario('recipes.delete_recipe_tag', 'DELETE')
+def _(bench):
+    return bench.client, f"/api/recipe-tags/{bench.take('tags')}", {}
+
+
+@scenario('recipes.get_recipe_type_list')
+def _(bench):
+    return bench.client, '/api/recipe-types/', {}
+
+
+@scenario('recipes.get_recipe_type')
+def _(bench):
+    return bench.client, f'/api/recipe-types/{bench.rng.randint(1, len(PERIOD_TYPES))}', {}
+
+
+@scenario('users.get_user_list')
+def _(bench):
+    return bench.client, f'/api/users?page={bench.rng.randint(1, 100)}', {}
+
+
+@scenario('users.get_user_info')
+def _(bench):
+    return bench.client, f'/api/users/{bench.user_id()}', {}
+
+
+@scenario('users.register_user', 'POST', keep='users')
+def _(bench):
+    number = bench.next()
+    return bench.app.test_client(), '/api/users', {'json': {
+        'name': f'Bench user {number}', 'email': f'bench-{bench.token}-{number}@example.com',
+        'password': PASSWORD, 'password_confirm': PASSWORD}}
+
+
+@scenario('users.edit_user', 'PUT')
+def _(bench):
+    user_id = bench.rng.choice(bench.created['users'])
+    return bench.client, f'/api/users/{user_id}', {'json': {'name': f'Bench user {bench.next()}'}}
+
+
+@scenario('users.delete_user', 'DELETE')
+def _(bench):
+    return bench.client, f"/api/users/{bench.take('users')}?confirm=true", {}
+
+
+@scenario('users.login', 'POST')
+def _(bench):
+    return bench.app.test_client(), '/api/auth/login', {'json': {
+        'email': f'user{bench.user_id()}@example.com', 'password': PASSWORD}}
+
+
+@scenario('users.logout', 'POST')
+def _(bench):
+    return bench.login(bench.app.test_client(), bench.user_id()), '/api/auth/logout', {}
+
+
+def percentile(values: list[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(math.ceil(len(ordered) * share) - 1, 0)]
+
+
+def measure(bench: Bench, scenario: Scenario, requests: int, warmup: int) -> dict:
+    latencies, queries, statuses = [], [], Counter()
+    for number in range(warmup + requests):
+        client, path, kwargs = scenario.make(bench)
+        started = perf_counter()
+        response = client.open(path, method=scenario.method, **kwargs)
+        elapsed = perf_counter() - started
+        if scenario.keep and response.status_code in (200, 201):
+            bench.created[scenario.keep].append(response.get_json()['id'])
+        if number >= warmup:
+            latencies.append(elapsed * 1000)
+            queries.append(bench.last_query_count)
+            statuses[str(response.status_code)] += 1
+    return {
+        'requests': requests,
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'queries_per_request': round(statistics.fmean(queries), 2),
+        'max_queries': max(queries),
+        'statuses': dict(sorted(statuses.items())),
+    }
+
+
+def check_coverage(app):
+    """Fails if a route of the blueprints has no scenario, so that new routes get one."""
+    routes = {(rule.endpoint, method) for rule in app.url_map.iter_rules()
+              if rule.endpoint.split('.')[0] in ('recipes', 'users')
+              for method in rule.methods - {'HEAD', 'OPTIONS'}}
+    missing = routes - {(scenario.endpoint, scenario.method) for scenario in SCENARIOS}
+    if missing:
+        raise SystemExit('No benchmark scenario for: ' + ', '.join(f'{method} {endpoint}'
+                                                                   for endpoint, method in sorted(missing)))
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, path: str):
+    with open(path) as file:
+        old = json.load(file)
+    print(f"\nChanges against {path} ({old.get('commit')}):")
+    for route, result in results['routes'].items():
+        before = old['routes'].get(route)
+        if before is None:
+            print(f'{route:45} new')
+            continue
+        print(f"{route:45} p50 {result['p50_ms'] / before['p50_ms'] - 1:+7.1%}, "
+              f"p99 {result['p99_ms'] / before['p99_ms'] - 1:+7.1%}, "
+              f"queries {result['queries_per_request'] - before['queries_per_request']:+.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=100_000)
+    parser.add_argument('--likes', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=50_000)
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed requests per route')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the generated data and requests')
+    parser.add_argument('--database-url', help='a database to use instead of a fresh SQLite file')
+    parser.add_argument('--output', help='the JSON results file, by default named after the commit in benchmarks/results/')
+    parser.add_argument('--compare', metavar='OLD.json', help='earlier results to compare with')
+    args = parser.parse_args()
+    volumes = {'recipes': args.recipes, 'likes': args.likes, 'users': args.users}
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(overrides={
+            'SQLALCHEMY_DATABASE_URI': args.database_url or f"sqlite:///{os.path.join(directory, 'bench.db')}",
+            'PASSWORD_HASHER_WORKERS': 0,
+            'BCRYPT_ROUNDS': 4,
+            'SLOW_QUERY_MS': None,
+        })
+        check_coverage(app)
+        with app.app_context():
+            db.create_all()
+            if not count_rows()['users']:
+                started = perf_counter()
+                seed(volumes, random.Random(args.seed))
+                print(f'Seeded {volumes} in {perf_counter() - started:.1f} s')
+            rows = count_rows()
+            dialect = db.engine.dialect.name
+            db.session.remove()
+
+        rng = random.Random(args.seed)
+        bench = Bench(app=app, client=None, rng=rng, volumes=rows)
+        bench.client = bench.login(app.test_client(), 1)
+
+        def count_queries(sender, response, **extra):
+            bench.last_query_count = g.query_stats.count
+
+        results = {'commit': get_commit(), 'created_on': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                   'database': dialect, 'rows': rows, 'requests': args.requests, 'routes': {}}
+        with request_finished.connected_to(count_queries, app):
+            for item in SCENARIOS:
+                result = measure(bench, item, args.requests, args.warmup)
+                route = f'{item.method} {item.endpoint}'
+                results['routes'][route] = result
+                print(f"{route:45} p50 {result['p50_ms']:8.2f} ms, p99 {result['p99_ms']:8.2f} ms, "
+                      f"{result['queries_per_request']:5.2f} queries, {result['statuses']}")
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"benchmark-endpoints-{results['commit'] or 'local'}.json")
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'Saved to {output}')
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
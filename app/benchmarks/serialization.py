@@ -0,0 +1,58 @@
+"""Compares the `model_dump()` + `jsonify()` serialization of a recipe list
+page with the direct-to-bytes path of `backend.utils.serialization`.
+
+Run from the `app` directory: `python -m benchmarks.serialization [--items N] [--repeat N]`."""
+import argparse
+import timeit
+from flask import jsonify
+from app_factory import create_app
+
+
+def make_recipes(count: int) -> list:
+    """Builds transient recipes with their relationships, so that no database is needed."""
+    from backend.recipes.models import PeriodType, Recipe, RecipeTag
+    from backend.users.models import User
+
+    author = User(id=1, name='author', email='author@example.com', password='-')
+    period_type = PeriodType(id=1, name='Dinner', slug='dinner')
+    tags = [RecipeTag(id=i, name=f'Tag {i}', slug=f'tag-{i}') for i in range(1, 4)]
+    return [Recipe(id=i, name=f'Recipe {i}', slug=f'recipe-{i}', calories=500, cooking_time=30,
+                   ingredients='2 eggs, 100 g flour, 1 cup of milk', text='Mix and bake. ' * 40,
+                   like_count=i, author=author, period_type=period_type, tags=tags)
+            for i in range(1, count + 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=25, help='recipes per page')
+    parser.add_argument('--repeat', type=int, default=500, help='pages serialized per run')
+    args = parser.parse_args()
+
+    app = create_app(overrides={'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    with app.app_context():
+        from backend.recipes.schemas import RecipeSchema
+        from backend.utils.serialization import list_response
+
+        recipes = make_recipes(args.items)
+        meta = {"page": 1, "per_page": args.items, "total": None, "pages": None}
+
+        def dict_path():
+            recipe_list = [RecipeSchema.model_validate(recipe).model_dump() for recipe in recipes]
+            return jsonify({**meta, "recipe_list": recipe_list}).get_data()
+
+        def bytes_path():
+            return list_response(RecipeSchema, recipes, "recipe_list", meta).get_data()
+
+        results = {}
+        for name, func in (('model_dump + jsonify', dict_path), ('dump_json', bytes_path)):
+            func()
+            results[name] = min(timeit.repeat(func, number=args.repeat, repeat=5)) / args.repeat
+
+    baseline = results['model_dump + jsonify']
+    for name, seconds in results.items():
+        saved = f' ({(1 - seconds / baseline) * 100:.1f}% less)' if seconds is not baseline else ''
+        print(f'{name:>22}: {seconds * 1e6:9.1f} us/page{saved}')
+
+
+if __name__ == '__main__':
+    main()
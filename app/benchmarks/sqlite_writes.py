@@ -0,0 +1,98 @@
+"""Compares concurrent writes to an SQLite file with the SQLite defaults (rollback
+journal, writers racing for the lock) and with the SQLite profile (WAL, pragmas
+and the single-writer queue), under the threaded Werkzeug server.
+
+Run from the `app` directory: `python -m benchmarks.sqlite_writes [--concurrency N] [--requests N]`.
+Every other request registers a user, the rest read the recipe list."""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from unittest import mock
+from werkzeug.serving import make_server
+from app_factory import create_app
+from backend.utils.database import DATABASE_PROFILES
+from benchmarks.concurrency import seed
+
+
+SQLITE_DEFAULTS = {**DATABASE_PROFILES['sqlite'], 'busy_timeout': None, 'single_writer': False, 'pragmas': {}}
+PASSWORD = 'r3p[avn!f;1cFGKDS'
+
+
+async def send(port: int, number: int) -> tuple[float, int]:
+    if number % 2:
+        request = 'GET /api/recipes HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode()
+    else:
+        body = json.dumps({'name': f'User {number}', 'email': f'user{number}@example.com',
+                           'password': PASSWORD, 'password_confirm': PASSWORD}).encode()
+        request = (f'POST /api/users HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n'
+                   f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n').encode() + body
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(request)
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return time.perf_counter() - started, int(status_line.split()[1])
+
+
+async def load(port: int, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(number: int) -> tuple[float, int]:
+        async with semaphore:
+            return await send(port, number)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(number) for number in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'requests_per_second': requests / elapsed,
+        'errors': sum(status != 200 for _, status in results),
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def run(profile: dict, args) -> dict:
+    with tempfile.TemporaryDirectory() as directory, mock.patch.dict(DATABASE_PROFILES, sqlite=profile):
+        app = create_app(overrides={
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'bench.db')}",
+            'PASSWORD_HASHER_WORKERS': 0,
+            'BCRYPT_ROUNDS': 4,
+        })
+        seed(app, args.recipes)
+        server = make_server('127.0.0.1', args.port, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            return asyncio.run(load(args.port, args.requests, args.concurrency))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=50, help='clients at once')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per setup')
+    parser.add_argument('--recipes', type=int, default=1000, help='recipes in the database')
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    for name, profile in (('SQLite defaults', SQLITE_DEFAULTS), ('SQLite profile', DATABASE_PROFILES['sqlite'])):
+        result = run(profile, args)
+        print(f"{name:16}: {result['requests_per_second']:8.1f} req/s, {result['errors']:5} errors, "
+              f"p50 {result['p50_ms']:7.1f} ms, p95 {result['p95_ms']:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,101 @@
+import os
 from pathlib import Path
 
 SECRET_KEY = 'not-so-secret-key'
 
 BASE_DIR = Path(__file__).resolve().parent
 
-SQLALCHEMY_DATABASE_URI = "sqlite:///dev.db"
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', "sqlite:///dev.db")
+"""`postgres://` and `postgresql://` URLs use psycopg 3."""
+
+# The overrides of the engine settings of the database dialect, see
+# `backend.utils.database.DATABASE_PROFILES`; unset values keep the profile defaults.
+# With N worker processes, the database gets up to N * (pool size + max overflow) connections.
+DB_POOL_SIZE = os.environ.get('DB_POOL_SIZE')
+DB_MAX_OVERFLOW = os.environ.get('DB_MAX_OVERFLOW')
+DB_POOL_TIMEOUT = os.environ.get('DB_POOL_TIMEOUT')
+"""For how many seconds a request waits for a free pooled connection."""
+DB_POOL_RECYCLE = os.environ.get('DB_POOL_RECYCLE')
+"""After how many seconds the connections are reopened; `-1` never."""
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING')
+"""Whether the pooled connections are tested before each checkout."""
+DB_STATEMENT_TIMEOUT_MS = os.environ.get('DB_STATEMENT_TIMEOUT_MS')
+"""PostgreSQL only: the longest a statement may run; `0` disables the limit."""
+DB_PREPARE_THRESHOLD = os.environ.get('DB_PREPARE_THRESHOLD')
+"""PostgreSQL only: after how many runs psycopg prepares a statement on the server;
+`0` prepares every statement at once."""
+DB_BUSY_TIMEOUT_MS = os.environ.get('DB_BUSY_TIMEOUT_MS')
+"""SQLite only: how long a write waits for the database lock before it fails."""
+DB_SINGLE_WRITER = os.environ.get('DB_SINGLE_WRITER')
+"""SQLite only: whether the writes of a process take turns in a queue, instead
+of racing for the database lock."""
+
+SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri]
+"""The read replicas serving the read-only views, from the comma-separated `DATABASE_REPLICA_URLS`.
+They use the same engine settings as the primary."""
+
+REPLICA_MAX_LAG_SECONDS = 5
+"""Replicas lagging behind the primary by more seconds are skipped."""
+
+REPLICA_LAG_CHECK_INTERVAL = 2
+"""For how many seconds a measured replica lag is reused."""
+
+READ_YOUR_WRITES_SECONDS = 5
+"""For how many seconds after a commit the client reads from the primary."""
+
+DB_CHECK_ON_STARTUP = os.environ.get('DB_CHECK_ON_STARTUP', '').lower() in ('1', 'true', 'yes')
+"""Whether the app connects to the database once when it's created, to fail early."""
+
+SLOW_QUERY_MS = 200
+"""Statements running longer than this many milliseconds are logged by the
+`backend.utils.query_stats` logger; `None` disables the log."""
+
+SERVER_TIMING_STATEMENTS = False
+"""Whether the `Server-Timing` header also names the slowest SQL statements of
+the request, which shows the SQL to the clients."""
+
+METRICS_DIR = os.environ.get('METRICS_DIR')
+"""A directory shared by the worker processes of the app, e.g. gunicorn workers,
+so that `/api/_metrics` reports all of them. Unset reports only the serving process."""
+
+METRICS_FLUSH_INTERVAL = 5
+"""At most how many seconds old the metrics of the other worker processes are."""
+
+ASGI_THREADS = 32
+"""How many requests of the routes without an async version are handled at once
+per process in the ASGI mode (`asgi.py`)."""
+
+COUNT_CACHE_TTL = 30
+"""For how many seconds the totals of the paginated lists are cached."""
+
+REFERENCE_DATA_MAX_AGE = 300
+"""The `Cache-Control: max-age` of the rarely changing data, like recipe types."""
+
+BCRYPT_ROUNDS = 12
+"""The bcrypt work factor of new password hashes. Existing hashes made with
+another work factor are rehashed when their users log in."""
+
+PASSWORD_HASHER_WORKERS = 2
+"""The number of processes hashing passwords. `0` hashes in the request thread."""
+
+PASSWORD_HASHER_MAX_PENDING = 16
+"""How many password operations can be running or queued at once per app process."""
+
+PASSWORD_HASHER_QUEUE_TIMEOUT = 2
+"""For how many seconds a request waits for a password hashing slot before `503`."""
+
+INGREDIENT_COMMON_TOKEN_RECIPES = 1000
+"""Ingredients found in more recipes, like salt, don't widen the ingredient
+search on their own; they only rank the recipes matched by the rarer ones."""
+
+RECIPE_BULK_MAX_ITEMS = 500
+"""How many recipes can be created or updated with one bulk request."""
+
+USER_CACHE_TTL = 300
+"""For how many seconds the logged-in users are cached between the requests."""
+
+USER_CACHE_MAXSIZE = 10000
+"""How many logged-in users are cached per app process."""
 
 PASSWORD_POLICY = {
     'length': 8,
@@ -53,6 +144,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False
         },
+        'backend.utils.query_stats': {
+            'handlers': {'stdout'},
+            'level': 'WARNING',
+            'propagate': False
+        },
     },
 
     'root': {
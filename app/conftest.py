@@ -1,21 +1,33 @@
+import asyncio
+from contextlib import contextmanager
 import flask_login
 import pytest
+from flask import g, request_finished
+from sqlalchemy import event
 from backend.recipes.models import Recipe, RecipeTag
 from backend.recipes.schemas import RecipeCreate, RecipeTagCreate
 from backend.users.models import User
 from backend.users.schemas import UserCreate
 from backend.users.helpers import create_user_instance
+from backend.utils.asgi import AsyncViewsASGI
+import backend.recipes.async_views
+import backend.users.async_views
 from app_factory import create_app, db
 import config
 
 
 @pytest.fixture
-def app():
+def app(tmp_path):
     overrides = {
         "TESTING": True,
-        "SQLALCHEMY_DATABASE_URI": "sqlite:///test.db"
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        # Cheap hashes in the test thread keep the suite fast
+        "BCRYPT_ROUNDS": 4,
+        "PASSWORD_HASHER_WORKERS": 0,
     }
     app = create_app(config_object=config, overrides=overrides)
+    # The version stamps are kept in the instance folder
+    app.instance_path = str(tmp_path)
 
     with app.app_context():
         db.create_all()
@@ -24,11 +36,78 @@ def app():
         db.drop_all()
 
 
+@pytest.fixture
+def query_counter(app):
+    """Records the SQL statements executed while the fixture is active."""
+    statements: list[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@pytest.fixture
+def query_budget(app):
+    """Asserts that the requests made within the block run at most `max_queries`
+    SQL statements in total, e.g. `with query_budget(2): client.get(...)`."""
+    @contextmanager
+    def budget(max_queries: int):
+        stats = []
+
+        def collect(sender, response, **extra):
+            stats.append(g.query_stats)
+
+        with request_finished.connected_to(collect, app):
+            yield
+        count = sum(request_stats.count for request_stats in stats)
+        slowest = sorted((entry for request_stats in stats for entry in request_stats.slowest), reverse=True)
+        assert count <= max_queries, (
+            f'{count} queries over the budget of {max_queries}, the slowest:\n'
+            + '\n'.join(statement for _, statement in slowest))
+    return budget
+
+
 @pytest.fixture
 def client(app):
     return app.test_client()
 
 
+@pytest.fixture
+def asgi_client(app):
+    """Calls the app in the ASGI mode, with the async views, e.g.
+    `status, headers, body = asgi_client('GET', '/api/users', b'page=2')`.
+    The calls share an event loop, as the connections of the async engine do."""
+    asgi_app = AsyncViewsASGI(app, threads=2)
+    loop = asyncio.new_event_loop()
+
+    async def call(method: str, path: str, query_string: bytes, headers: dict, body: bytes):
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await asgi_app({'type': 'http', 'method': method, 'path': path, 'query_string': query_string,
+                        'headers': [(b'content-type', b'application/json'),
+                                    *((name.lower().encode(), value.encode()) for name, value in headers.items())],
+                        'server': ('testserver', 80), 'http_version': '1.1'}, receive, send)
+        return sent[0]['status'], dict(sent[0]['headers']), sent[1]['body']
+
+    def request(method: str, path: str, query_string: bytes = b'', headers: dict | None = None,
+                body: bytes = b''):
+        return loop.run_until_complete(call(method, path, query_string, headers or {}, body))
+
+    yield request
+    loop.run_until_complete(asgi_app.shutdown())
+    loop.close()
+
+
 @pytest.fixture
 def runner(app):
     return app.test_cli_runner()
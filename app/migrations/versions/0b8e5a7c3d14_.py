@@ -0,0 +1,26 @@
+"""case-insensitive user email index
+
+Revision ID: 0b8e5a7c3d14
+Revises: f40b6e8d2c57
+Create Date: 2026-10-17 17:02:36.471590
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b8e5a7c3d14'
+down_revision = 'f40b6e8d2c57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_email_lower', [sa.text('lower(email)')], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_email_lower')
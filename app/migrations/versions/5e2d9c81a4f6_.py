@@ -0,0 +1,29 @@
+"""unique case-insensitive user emails
+
+Revision ID: 5e2d9c81a4f6
+Revises: 0b8e5a7c3d14
+Create Date: 2026-10-17 21:14:08.215903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2d9c81a4f6'
+down_revision = '0b8e5a7c3d14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fails if emails differing only in case exist; such accounts must be merged first
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_email_lower')
+        batch_op.create_index('ix_user_email_lower', [sa.text('lower(email)')], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_email_lower')
+        batch_op.create_index('ix_user_email_lower', [sa.text('lower(email)')], unique=False)
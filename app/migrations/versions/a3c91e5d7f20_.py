@@ -0,0 +1,32 @@
+"""keyset pagination indexes
+
+Revision ID: a3c91e5d7f20
+Revises: 70256cee2385
+Create Date: 2026-10-17 10:12:41.502318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c91e5d7f20'
+down_revision = '70256cee2385'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.create_index('ix_recipe_created_on_id', ['created_on', 'id'], unique=False)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_created_on_id', ['created_on', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_created_on_id')
+
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.drop_index('ix_recipe_created_on_id')
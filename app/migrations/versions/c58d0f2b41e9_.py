@@ -0,0 +1,70 @@
+"""recipe full-text search
+
+Revision ID: c58d0f2b41e9
+Revises: a3c91e5d7f20
+Create Date: 2026-10-17 11:40:05.218734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c58d0f2b41e9'
+down_revision = 'a3c91e5d7f20'
+branch_labels = None
+depends_on = None
+
+# The search index as of this revision, kept here so later model changes don't alter it
+FTS_DDL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS recipe_fts USING fts5("
+        "name, ingredients, text, content='recipe', content_rowid='id', tokenize='porter unicode61')",
+
+        "CREATE TRIGGER IF NOT EXISTS recipe_fts_insert AFTER INSERT ON recipe WHEN new.is_visible BEGIN "
+        "INSERT INTO recipe_fts(rowid, name, ingredients, text) VALUES (new.id, new.name, new.ingredients, new.text); "
+        "END",
+
+        "CREATE TRIGGER IF NOT EXISTS recipe_fts_delete AFTER DELETE ON recipe WHEN old.is_visible BEGIN "
+        "INSERT INTO recipe_fts(recipe_fts, rowid, name, ingredients, text) "
+        "VALUES ('delete', old.id, old.name, old.ingredients, old.text); "
+        "END",
+
+        "CREATE TRIGGER IF NOT EXISTS recipe_fts_update AFTER UPDATE OF name, ingredients, text, is_visible ON recipe BEGIN "
+        "INSERT INTO recipe_fts(recipe_fts, rowid, name, ingredients, text) "
+        "SELECT 'delete', old.id, old.name, old.ingredients, old.text WHERE old.is_visible; "
+        "INSERT INTO recipe_fts(rowid, name, ingredients, text) "
+        "SELECT new.id, new.name, new.ingredients, new.text WHERE new.is_visible; "
+        "END",
+    ],
+    'postgresql': [
+        "ALTER TABLE recipe ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(ingredients, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(\"text\", '')), 'C')) STORED",
+
+        "CREATE INDEX IF NOT EXISTS ix_recipe_search_vector ON recipe USING GIN (search_vector) WHERE is_visible",
+    ],
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for statement in FTS_DDL.get(dialect, []):
+        op.execute(statement)
+
+    if dialect == 'sqlite':
+        # Index the already existing recipes
+        op.execute("INSERT INTO recipe_fts(rowid, name, ingredients, text) "
+                   "SELECT id, name, ingredients, text FROM recipe WHERE is_visible")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for trigger in ('recipe_fts_insert', 'recipe_fts_delete', 'recipe_fts_update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS recipe_fts")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_recipe_search_vector")
+        op.execute("ALTER TABLE recipe DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,74 @@
+"""recipe ingredient index
+
+Revision ID: d9a4b3e6c712
+Revises: c58d0f2b41e9
+Create Date: 2026-10-17 13:05:52.904117
+
+"""
+import re
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a4b3e6c712'
+down_revision = 'c58d0f2b41e9'
+branch_labels = None
+depends_on = None
+
+# The ingredient tokenizer as of this revision, kept here so later changes to it don't alter the backfill
+_WORD_RE = re.compile(r'[^\W\d_]+', re.UNICODE)
+
+STOP_WORDS = frozenset({
+    'a', 'an', 'and', 'or', 'of', 'to', 'for', 'with', 'without', 'the', 'some', 'few',
+    'fresh', 'large', 'small', 'medium', 'chopped', 'sliced', 'diced', 'minced', 'optional',
+    'g', 'kg', 'mg', 'ml', 'l', 'oz', 'lb', 'lbs', 'cup', 'cups', 'tbsp', 'tsp', 'pinch',
+    'gram', 'grams', 'spoon', 'spoons', 'tablespoon', 'tablespoons', 'teaspoon', 'teaspoons',
+    'piece', 'pieces', 'slice', 'slices', 'clove', 'cloves', 'can', 'cans', 'taste',
+})
+
+
+def normalize_token(word):
+    word = word.lower()
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 4 and word.endswith('oes'):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def tokenize_ingredients(text):
+    tokens = set()
+    for word in _WORD_RE.findall(text or ''):
+        if len(word) < 2 or word.lower() in STOP_WORDS:
+            continue
+        tokens.add(normalize_token(word))
+    return tokens
+
+
+def upgrade():
+    recipe_ingredient = op.create_table('recipe_ingredient',
+    sa.Column('token', sa.String(), nullable=False),
+    sa.Column('recipe_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipe.id'], ),
+    sa.PrimaryKeyConstraint('token', 'recipe_id')
+    )
+    with op.batch_alter_table('recipe_ingredient', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_recipe_ingredient_recipe_id'), ['recipe_id'], unique=False)
+
+    # Index the ingredients of the already existing recipes
+    connection = op.get_bind()
+    rows = [{'token': token, 'recipe_id': recipe_id}
+            for recipe_id, ingredients in connection.execute(sa.text('SELECT id, ingredients FROM recipe'))
+            for token in tokenize_ingredients(ingredients)]
+    if rows:
+        op.bulk_insert(recipe_ingredient, rows)
+
+
+def downgrade():
+    with op.batch_alter_table('recipe_ingredient', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_recipe_ingredient_recipe_id'))
+
+    op.drop_table('recipe_ingredient')
@@ -0,0 +1,98 @@
+"""association keys and hot column indexes
+
+Revision ID: e1f7c20a9b35
+Revises: d9a4b3e6c712
+Create Date: 2026-10-17 14:22:17.663481
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f7c20a9b35'
+down_revision = 'd9a4b3e6c712'
+branch_labels = None
+depends_on = None
+
+
+ASSOCIATIONS = (
+    ('recipe_recipe_tag_association', 'tag_id'),
+    ('recipe_recipe_mix_association', 'mix_id'),
+)
+
+
+def _delete_duplicates(table: str, other_id: str):
+    """Removes the incomplete and repeated association rows, which would
+    violate the new primary key."""
+    row_id = 'ctid' if op.get_bind().dialect.name == 'postgresql' else 'rowid'
+    op.execute(f"DELETE FROM {table} WHERE recipe_id IS NULL OR {other_id} IS NULL")
+    op.execute(f"DELETE FROM {table} WHERE {row_id} NOT IN ("
+               f"SELECT MIN({row_id}) FROM {table} GROUP BY recipe_id, {other_id})")
+
+
+def upgrade():
+    for table, other_id in ASSOCIATIONS:
+        _delete_duplicates(table, other_id)
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(other_id, existing_type=sa.Integer(), nullable=False)
+            batch_op.alter_column('recipe_id', existing_type=sa.Integer(), nullable=False)
+            batch_op.create_primary_key(f'pk_{table}', ['recipe_id', other_id])
+            batch_op.create_index(batch_op.f(f'ix_{table}_{other_id}'), [other_id], unique=False)
+
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.drop_index('ix_recipe_created_on_id')
+        batch_op.create_index('ix_recipe_visible_created_on_id', ['created_on', 'id'], unique=False,
+                              sqlite_where=sa.text('is_visible = 1'),
+                              postgresql_where=sa.text('is_visible'))
+        batch_op.create_index(batch_op.f('ix_recipe_author_id'), ['author_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_recipe_period_type_id'), ['period_type_id'], unique=False)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_created_on_id')
+        batch_op.create_index('ix_user_active_created_on_id', ['created_on', 'id'], unique=False,
+                              sqlite_where=sa.text('is_active = 1'),
+                              postgresql_where=sa.text('is_active'))
+
+    with op.batch_alter_table('recipe_mix', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_recipe_mix_author_id'), ['author_id'], unique=False)
+
+    with op.batch_alter_table('recipe_publication_application', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_recipe_publication_application_recipe_id'), ['recipe_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_recipe_publication_application_status'), ['status'], unique=False)
+        batch_op.create_index(batch_op.f('ix_recipe_publication_application_last_reviewed_by_id'), ['last_reviewed_by_id'], unique=False)
+
+    with op.batch_alter_table('like', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_like_recipe_id'), ['recipe_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_like_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('like', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_like_user_id'))
+        batch_op.drop_index(batch_op.f('ix_like_recipe_id'))
+
+    with op.batch_alter_table('recipe_publication_application', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_recipe_publication_application_last_reviewed_by_id'))
+        batch_op.drop_index(batch_op.f('ix_recipe_publication_application_status'))
+        batch_op.drop_index(batch_op.f('ix_recipe_publication_application_recipe_id'))
+
+    with op.batch_alter_table('recipe_mix', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_recipe_mix_author_id'))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_active_created_on_id')
+        batch_op.create_index('ix_user_created_on_id', ['created_on', 'id'], unique=False)
+
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_recipe_period_type_id'))
+        batch_op.drop_index(batch_op.f('ix_recipe_author_id'))
+        batch_op.drop_index('ix_recipe_visible_created_on_id')
+        batch_op.create_index('ix_recipe_created_on_id', ['created_on', 'id'], unique=False)
+
+    for table, other_id in ASSOCIATIONS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f(f'ix_{table}_{other_id}'))
+            batch_op.drop_constraint(f'pk_{table}', type_='primary')
+            batch_op.alter_column('recipe_id', existing_type=sa.Integer(), nullable=True)
+            batch_op.alter_column(other_id, existing_type=sa.Integer(), nullable=True)
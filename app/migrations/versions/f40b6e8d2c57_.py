@@ -0,0 +1,71 @@
+"""recipe like counter
+
+Revision ID: f40b6e8d2c57
+Revises: e1f7c20a9b35
+Create Date: 2026-10-17 15:31:48.120954
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f40b6e8d2c57'
+down_revision = 'e1f7c20a9b35'
+branch_labels = None
+depends_on = None
+
+# The search triggers as of this revision, recreated after the recipe table is rebuilt
+FTS_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS recipe_fts_insert AFTER INSERT ON recipe WHEN new.is_visible BEGIN "
+    "INSERT INTO recipe_fts(rowid, name, ingredients, text) VALUES (new.id, new.name, new.ingredients, new.text); "
+    "END",
+
+    "CREATE TRIGGER IF NOT EXISTS recipe_fts_delete AFTER DELETE ON recipe WHEN old.is_visible BEGIN "
+    "INSERT INTO recipe_fts(recipe_fts, rowid, name, ingredients, text) "
+    "VALUES ('delete', old.id, old.name, old.ingredients, old.text); "
+    "END",
+
+    "CREATE TRIGGER IF NOT EXISTS recipe_fts_update AFTER UPDATE OF name, ingredients, text, is_visible ON recipe BEGIN "
+    "INSERT INTO recipe_fts(recipe_fts, rowid, name, ingredients, text) "
+    "SELECT 'delete', old.id, old.name, old.ingredients, old.text WHERE old.is_visible; "
+    "INSERT INTO recipe_fts(rowid, name, ingredients, text) "
+    "SELECT new.id, new.name, new.ingredients, new.text WHERE new.is_visible; "
+    "END",
+]
+
+
+def upgrade():
+    # Keep the earliest of the repeated likes, which would violate the new constraint
+    op.execute('DELETE FROM "like" WHERE id NOT IN ('
+               'SELECT MIN(id) FROM "like" GROUP BY user_id, recipe_id)')
+
+    with op.batch_alter_table('like', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_like_user_id'))
+        batch_op.create_unique_constraint('uq_like_user_id_recipe_id', ['user_id', 'recipe_id'])
+
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('like_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute('UPDATE recipe SET like_count = ('
+               'SELECT COUNT(*) FROM "like" WHERE "like".recipe_id = recipe.id)')
+
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.create_index('ix_recipe_visible_like_count', ['like_count', 'id'], unique=False,
+                              sqlite_where=sa.text('is_visible = 1'),
+                              postgresql_where=sa.text('is_visible'))
+
+
+def downgrade():
+    with op.batch_alter_table('recipe', schema=None) as batch_op:
+        batch_op.drop_index('ix_recipe_visible_like_count')
+        batch_op.drop_column('like_count')
+
+    if op.get_bind().dialect.name == 'sqlite':
+        # Dropping a column recreates the table on SQLite, losing its search triggers
+        for statement in FTS_TRIGGERS:
+            op.execute(statement)
+
+    with op.batch_alter_table('like', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_like_user_id_recipe_id', type_='unique')
+        batch_op.create_index(batch_op.f('ix_like_user_id'), ['user_id'], unique=False)